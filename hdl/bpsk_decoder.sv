@@ -49,6 +49,8 @@ module bpsk_decoder #
     logic matched_filter_tlast;
     logic [C_S00_AXIS_TDATA_WIDTH-1:0] matched_filter_tdata;
     logic [(C_S00_AXIS_TDATA_WIDTH/8)-1:0] matched_filter_tstrb;
+    // The matched filter's own tready just forwards this one, so it's the only backpressure there is.
+    assign s00_axis_tready = matched_filter_tready;
     axis_fir #(.NUM_COEFFS(NUM_COEFFS_PREAMBLE_DETECTOR)) preamble_detection_fir_filter (
         .s00_axis_aclk(s00_axis_aclk),
         .s00_axis_aresetn(s00_axis_aresetn),
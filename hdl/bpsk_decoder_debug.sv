@@ -56,6 +56,8 @@ module bpsk_decoder_debug #
     logic matched_filter_tlast;
     logic [C_S00_AXIS_TDATA_WIDTH-1:0] matched_filter_tdata;
     logic [(C_S00_AXIS_TDATA_WIDTH/8)-1:0] matched_filter_tstrb;
+    // The matched filter's own tready just forwards this one, so it's the only backpressure there is.
+    assign s00_axis_tready = matched_filter_tready;
     axis_fir #(.NUM_COEFFS(NUM_COEFFS_PREAMBLE_DETECTOR)) preamble_detection_fir_filter (
         .s00_axis_aclk(s00_axis_aclk),
         .s00_axis_aresetn(s00_axis_aresetn),
@@ -72,7 +74,6 @@ module bpsk_decoder_debug #
         .m00_axis_tstrb(matched_filter_tstrb)
     );
 
-    assign m01_axis_tready = matched_filter_tready;
     assign m01_axis_tvalid = matched_filter_tvalid;
     assign m01_axis_tlast = matched_filter_tlast;
     assign m01_axis_tdata = matched_filter_tdata;
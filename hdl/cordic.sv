@@ -69,7 +69,7 @@ module cordic #(
     endfunction
 
     initial begin
-        assert(C_CORDIC_FRAC_WIDTH == 16) else $fatal("C_CORDIC_FRAC_WIDTH must be 16, or fix the CORDIC gain const.");
+        assert(C_CORDIC_FRAC_WIDTH == 16) else $fatal(1, "C_CORDIC_FRAC_WIDTH must be 16, or fix the CORDIC gain const.");
     end
 
     function logic [C_CORDIC_FIXED_WIDTH-1:0] abs_scale(
@@ -81,13 +81,9 @@ module cordic_rotate #
                 pstrb[i] <= 0;
             end
 
-            m00_axis_tvalid <= 0;
-            m00_axis_tlast  <= 0;
-            m00_axis_tdata  <= 0;
-            m00_axis_tstrb  <= 0;
+            // m00_axis_* and error come from the always_comb below, the cleared pipeline zeroes them
             // phase <= 0;
             freq <= 0;
-            error <= 0;
         end else begin
 
             if (s00_axis_tvalid && s00_axis_tready) begin
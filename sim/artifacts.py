@@ -0,0 +1,36 @@
+"""
+Test artifacts: arrays captured by a testbench, saved for rendering later.
+
+The testbenches save what they would have plotted with save(), then call
+render.render() on the file only when not HEADLESS. With SIM_HEADLESS=1 (the
+regress.py default) nothing from matplotlib is imported inside the simulator,
+waves are off unless SIM_WAVES=1, and the plots are made afterwards with
+
+    python render.py regress_build        # every artifact under a directory
+
+Artifacts are .npz files named after the test module, written to
+SIM_ARTIFACT_DIR or else the simulator's working directory (the build dir).
+The "kind" entry tells render.py how to draw them.
+"""
+import os
+from pathlib import Path
+import numpy as np
+
+HEADLESS = os.getenv("SIM_HEADLESS", "0") == "1"
+
+def artifact_dir() -> Path:
+    return Path(os.getenv("SIM_ARTIFACT_DIR", "."))
+
+def save(name: str, kind: str, **arrays) -> Path:
+    """Write arrays to <artifact_dir>/<name>.npz and return the path."""
+    path = artifact_dir() / f"{name}.npz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, kind=kind, **arrays)
+    return path
+
+def load(path) -> dict:
+    """Read an artifact back as a dict of arrays, with "kind" as a str."""
+    with np.load(path) as f:
+        data = {key: f[key] for key in f.files}
+    data["kind"] = str(data["kind"])
+    return data
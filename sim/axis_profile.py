@@ -0,0 +1,195 @@
+"""
+Opt-in profiling for the AXIS drivers and monitors in the testbenches.
+
+With SIM_PROFILE=1 every driver and monitor gets a Probe that counts the
+triggers it awaits, the wall time its coroutine spends in Python between a
+wakeup and its next await, the time in monitor callbacks, handshakes,
+handshake stalls and the depth of its transaction queue. Without it they get
+NULL_PROBE, whose methods do nothing and whose wait() hands the trigger straight
+back, so the instrumented code awaits exactly what it awaited before.
+
+The classes use it like this:
+
+    self.profile = axis_profile.probe(name, self)
+    ...
+    wait = self.profile.wait
+    await wait(falling_edge)          # instead of await falling_edge
+    self.profile.stall()              # valid without ready (or the other way round)
+    self.profile.timed(self._recv, data)
+
+and the test calls report(test_file, clock_ns) at its end. That prints a
+summary table, writes it to <name>.profile.json and writes <name>.trace.json,
+a Chrome trace (chrome://tracing, ui.perfetto.dev) with one slice per driver
+transaction and one instant per monitor handshake, capped at
+MAX_TRACE_EVENTS. Both files go to artifacts.artifact_dir().
+
+Whatever part of the test's wall time isn't in the Python columns was spent in
+the simulator and the cocotb scheduler.
+"""
+import json
+import os
+import time
+from collections import Counter
+from cocotb.utils import get_sim_time
+import artifacts
+
+ENABLED = os.getenv("SIM_PROFILE", "0") == "1"
+MAX_TRACE_EVENTS = 200000
+
+class Probe:
+    def __init__(self, name: str, owner):
+        self.name = name
+        self.kind = type(owner).__name__
+        self.triggers = Counter()
+        self.python_time = 0.0 # s between wakeups and the following await
+        self.callback_time = 0.0 # s in timed() calls, the monitor callbacks
+        self.transactions = 0
+        self.stalls = 0
+        self.max_depth = 0
+        self.depth_sum = 0
+        self.depth_samples = 0
+        self._resumed = None # perf_counter at the last wakeup, None while idle
+        self._begin = None # (wall, sim ns, stalls) at the start of a driver transaction
+
+    async def wait(self, trigger):
+        now = time.perf_counter()
+        if self._resumed is not None:
+            self.python_time += now - self._resumed
+        self.triggers[type(trigger).__name__] += 1
+        await trigger
+        self._resumed = time.perf_counter()
+
+    def begin(self, queue_depth: int = 0):
+        """A driver starts a transaction with queue_depth more still queued."""
+        self._resumed = time.perf_counter()
+        self._begin = (self._resumed, get_sim_time("ns"), self.stalls)
+        self.depth(queue_depth)
+
+    def end(self, kind: str = "send"):
+        """The driver's transaction is done, the coroutine goes idle until the next one."""
+        now = time.perf_counter()
+        if self._resumed is not None:
+            self.python_time += now - self._resumed
+        self._resumed = None
+        self.transactions += 1
+        if self._begin is not None:
+            wall, sim_ns, stalls = self._begin
+            _event(dict(name=kind, ph="X", ts=wall * 1e6, dur=(now - wall) * 1e6, pid=0, tid=self.name,
+                        args=dict(sim_start_ns=sim_ns, sim_end_ns=get_sim_time("ns"), stalls=self.stalls - stalls)))
+            self._begin = None
+
+    def handshake(self, queue_depth: int = 0):
+        """A monitor saw valid and ready."""
+        self.transactions += 1
+        self.depth(queue_depth)
+        _event(dict(name="handshake", ph="i", s="t", ts=time.perf_counter() * 1e6, pid=0, tid=self.name,
+                    args=dict(sim_ns=get_sim_time("ns"), queue=queue_depth)))
+
+    def stall(self):
+        self.stalls += 1
+
+    def depth(self, queue_depth: int):
+        self.max_depth = max(self.max_depth, queue_depth)
+        self.depth_sum += queue_depth
+        self.depth_samples += 1
+
+    def timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            spent = time.perf_counter() - start
+            self.callback_time += spent
+            if self._resumed is not None:
+                self._resumed += spent # reported on its own, not as coroutine time
+
+    def summary(self, cycles: float | None) -> dict:
+        return dict(
+            name=self.name, kind=self.kind, triggers=dict(self.triggers), awaits=sum(self.triggers.values()),
+            python_time=self.python_time, callback_time=self.callback_time,
+            python_us_per_cycle=(self.python_time + self.callback_time) / cycles * 1e6 if cycles else None,
+            transactions=self.transactions, stalls=self.stalls, max_queue=self.max_depth,
+            mean_queue=self.depth_sum / self.depth_samples if self.depth_samples else 0.0,
+        )
+
+class _NullProbe:
+    """Stands in for Probe when profiling is off."""
+    def wait(self, trigger):
+        return trigger
+    def begin(self, queue_depth: int = 0):
+        pass
+    def end(self, kind: str = "send"):
+        pass
+    def handshake(self, queue_depth: int = 0):
+        pass
+    def stall(self):
+        pass
+    def depth(self, queue_depth: int):
+        pass
+    def timed(self, fn, *args):
+        return fn(*args)
+
+NULL_PROBE = _NullProbe()
+
+_probes = []
+_trace = []
+_dropped = 0
+_start = None # (wall, sim ns) when the first probe of the test was made
+
+def _event(event):
+    global _dropped
+    if len(_trace) < MAX_TRACE_EVENTS:
+        _trace.append(event)
+    else:
+        _dropped += 1
+
+def probe(name: str, owner):
+    """A Probe for owner (a driver or monitor) if SIM_PROFILE=1, else NULL_PROBE."""
+    global _start
+    if not ENABLED:
+        return NULL_PROBE
+    if _start is None:
+        _start = (time.perf_counter(), get_sim_time("ns"))
+    p = Probe(f"{name} {type(owner).__name__}", owner)
+    _probes.append(p)
+    return p
+
+def format_table(summaries, wall_time: float, cycles: float | None) -> str:
+    lines = [f"{'probe':<24} {'awaits':>8} {'python ms':>10} {'callback ms':>11} {'us/cycle':>9} "
+             f"{'xfers':>7} {'stalls':>7} {'max q':>6} {'mean q':>7}  triggers"]
+    python = 0.0
+    for s in summaries:
+        python += s["python_time"] + s["callback_time"]
+        per_cycle = f"{s['python_us_per_cycle']:9.2f}" if s["python_us_per_cycle"] is not None else f"{'-':>9}"
+        triggers = ", ".join(f"{k} {v}" for k, v in sorted(s["triggers"].items()))
+        lines.append(f"{s['name']:<24} {s['awaits']:8d} {s['python_time'] * 1e3:10.1f} {s['callback_time'] * 1e3:11.1f} "
+                     f"{per_cycle} {s['transactions']:7d} {s['stalls']:7d} {s['max_queue']:6d} {s['mean_queue']:7.2f}  {triggers}")
+    rest = wall_time - python
+    cycle_note = f", {cycles:.0f} cycles ({wall_time / cycles * 1e6:.2f} us/cycle)" if cycles else ""
+    lines.append(f"test wall time {wall_time:.3f} s{cycle_note}: {python:.3f} s in probed Python, "
+                 f"{rest:.3f} s in the simulator, the scheduler and everything else")
+    return "\n".join(lines)
+
+def report(name: str, clock_ns: float | None = None):
+    """Print and save the summary and the trace for the probes made so far, then start over. No-op unless enabled."""
+    global _start, _dropped
+    if not ENABLED or _start is None:
+        return None
+    wall_time = time.perf_counter() - _start[0]
+    cycles = (get_sim_time("ns") - _start[1]) / clock_ns if clock_ns else None
+    summaries = [p.summary(cycles) for p in _probes]
+    print(format_table(summaries, wall_time, cycles))
+
+    out = artifacts.artifact_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    (out / f"{name}.profile.json").write_text(json.dumps(
+        dict(wall_time=wall_time, cycles=cycles, probes=summaries, trace_events_dropped=_dropped), indent=2))
+    (out / f"{name}.trace.json").write_text(json.dumps(dict(traceEvents=_trace, displayTimeUnit="ms")))
+    if _dropped:
+        print(f"trace capped at {MAX_TRACE_EVENTS} events, {_dropped} dropped")
+
+    _probes.clear()
+    _trace.clear()
+    _dropped = 0
+    _start = None
+    return summaries
@@ -0,0 +1,283 @@
+"""
+Shared AXI-Stream helpers for the cocotb testbenches.
+
+AXISStreamSource drives a slave port straight from a NumPy array, memmap or
+generator, one clock per word, from a single coroutine. There is no per-sample
+transaction object: data is pulled from the source in chunks and converted to
+Python ints with one tolist() per chunk.
+
+AXISRecorder is the receive side: it watches a port and writes every handshake
+(tdata, the clock cycle it happened in, and any extra DUT signals) straight into
+preallocated NumPy buffers, read back as arrays once the test is done. With
+sparse=True it sleeps on tvalid (and tready) instead of waking every clock,
+which makes ports that are valid a few times per capture almost free.
+"""
+import itertools
+import numpy as np
+import cocotb
+from cocotb.triggers import RisingEdge, FallingEdge, ReadOnly, ClockCycles
+from cocotb.utils import get_sim_time
+from cocotb_bus.bus import Bus
+from cocotb_bus.monitors import BusMonitor
+
+AXIS_SIGNALS = ['axis_tvalid', 'axis_tready', 'axis_tlast', 'axis_tdata', 'axis_tstrb']
+
+def iter_chunks(data, chunk_size: int = 65536, width: int = 32):
+    """
+    Yield lists of ints from an array, a memmap, or a generator that yields
+    either ints or arrays. Arrays are converted a chunk at a time so a memmap
+    is never read in full. Words are masked to width bits (two's complement
+    for negative values).
+    """
+    mask = (1 << width) - 1
+    if isinstance(data, np.ndarray):
+        for i in range(0, len(data), chunk_size):
+            yield _to_words(data[i:i + chunk_size], mask)
+        return
+    it = iter(data)
+    for first in it:
+        if isinstance(first, np.ndarray):
+            yield from iter_chunks(first, chunk_size, width)
+            continue
+        block = [int(first) & mask]
+        block.extend(int(word) & mask for word in itertools.islice(it, chunk_size - 1))
+        yield block
+
+def _to_words(chunk, mask):
+    chunk = np.asarray(chunk)
+    if np.issubdtype(chunk.dtype, np.signedinteger) and mask < (1 << 64):
+        chunk = chunk.astype(np.int64).astype(np.uint64) & np.uint64(mask)
+    return chunk.tolist()
+
+class AXISStreamSource:
+    """
+    AXI-Stream master (drives an S port) fed from arrays or generators.
+
+    duty is a repeating per-clock pattern of 1/0: 1 offers the next word, 0
+    leaves tvalid low for that clock. (1,) streams every clock, (1, 0) matches
+    the write_single + pause 1 pattern, (1,) + (0,) * 17 matches write_single +
+    pause 16. A word stays on the bus until it is accepted, like any AXIS master.
+    A tready that is not driven (X/Z) counts as ready.
+    """
+    def __init__(self, dut, name, clk, duty=(1,), tstrb=0xF):
+        self.bus = Bus(dut, name, AXIS_SIGNALS)
+        self.clock = clk
+        self.duty = tuple(int(bool(d)) for d in duty)
+        if not any(self.duty):
+            raise ValueError("duty pattern needs at least one active clock")
+        self.sent = 0 # words accepted so far
+        self.bus.axis_tdata.value = 0
+        self.bus.axis_tstrb.value = tstrb
+        self.bus.axis_tlast.value = 0
+        self.bus.axis_tvalid.value = 0
+
+    def start(self, data, last: bool = False, chunk_size: int = 65536):
+        """Start send() in the background and return the task."""
+        return cocotb.start_soon(self.send(data, last, chunk_size))
+
+    async def send(self, data, last: bool = False, chunk_size: int = 65536):
+        """Drive every word in data. If last is set, tlast goes high on the final word."""
+        rising_edge = RisingEdge(self.clock) # make these once and reuse
+        falling_edge = FallingEdge(self.clock)
+        read_only = ReadOnly()
+        tvalid, tready, tdata, tlast = self.bus.axis_tvalid, self.bus.axis_tready, self.bus.axis_tdata, self.bus.axis_tlast
+        pattern = itertools.cycle(self.duty)
+        valid = 0
+
+        chunks = iter_chunks(data, chunk_size, len(tdata))
+        chunk = next(chunks, None)
+        while chunk is not None:
+            next_chunk = next(chunks, None)
+            final = len(chunk) - 1
+            for i, word in enumerate(chunk):
+                # Idle clocks from the duty pattern
+                idle = 0
+                while not next(pattern):
+                    idle += 1
+                if idle:
+                    await falling_edge
+                    tvalid.value = valid = 0
+                    await ClockCycles(self.clock, idle)
+
+                await falling_edge
+                tdata.value = word
+                if last:
+                    tlast.value = int(next_chunk is None and i == final)
+                if not valid:
+                    tvalid.value = valid = 1
+                while True:
+                    await read_only
+                    ready = tready.value
+                    if ready.is_resolvable and not ready.integer:
+                        await rising_edge # stall, hold the word
+                        continue
+                    break
+                await rising_edge
+                self.sent += 1
+            chunk = next_chunk
+
+        await falling_edge
+        tvalid.value = 0
+        tlast.value = 0
+
+class RecordBuffer:
+    """
+    Preallocated (capacity, columns) uint64 table. Rows are written in place
+    at the index reserve() returns, and the capacity doubles when full; with max_length set it becomes a
+    ring buffer that keeps only the newest max_length rows.
+    """
+    def __init__(self, columns: int, capacity: int = 4096, max_length: int | None = None):
+        if max_length is not None:
+            capacity = max_length
+        self.table = np.zeros((max(capacity, 1), columns), dtype=np.uint64)
+        self.max_length = max_length
+        self.count = 0 # rows written in total, including any overwritten by the ring
+
+    def __len__(self):
+        return min(self.count, len(self.table))
+
+    def reserve(self):
+        """Return (table, index) of the next row to write, growing or wrapping first."""
+        table = self.table
+        n = self.count
+        if n >= len(table):
+            if self.max_length is not None:
+                n %= len(table)
+            else:
+                self.table = table = np.concatenate((table, np.zeros_like(table)))
+        self.count += 1
+        return table, n
+
+    def array(self) -> np.ndarray:
+        """The recorded rows, oldest first."""
+        if self.count <= len(self.table):
+            return self.table[:self.count].copy()
+        return np.roll(self.table, -(self.count % len(self.table)), axis=0)
+
+class AXISRecorder(BusMonitor):
+    """
+    Records every ready/valid handshake on an AXIS port into a RecordBuffer.
+
+    Each row holds tdata (split into 64-bit words, least significant first),
+    the clock cycle of the handshake counted from when the recorder started, and
+    the value of each probe signal sampled in the same ReadOnly phase. probes
+    maps names to DUT handles of up to 64 bits, e.g. {'error': dut.error}.
+    Nothing is kept per transaction besides the row; use the tdata, cycle and
+    probe() arrays after the test. Like AXISStreamSource, an undriven tready
+    (X/Z) counts as ready. X/Z values are recorded as 0.
+
+    sparse=True is for ports that are idle most of the time, like the m00
+    squitter output. While tvalid is low the recorder waits for it to rise
+    instead of stepping through every clock, and while tready is low it waits
+    for tready; it goes back to sampling on every falling edge for as long as
+    tvalid stays high. Cycles are then worked out from the sim time, using the
+    clock period measured over the first two falling edges, so the cycle column
+    and cycles are the same as without sparse. Probes are still sampled at the
+    handshake, but only there.
+    """
+    _signals = AXIS_SIGNALS
+
+    def __init__(self, dut, name, clk, probes=None, capacity: int = 4096, max_length: int | None = None,
+                 sparse: bool = False):
+        self.probes = dict(probes or {})
+        for probe, handle in self.probes.items():
+            if len(handle) > 64:
+                raise ValueError(f"probe {probe} is {len(handle)} bits, at most 64 are supported")
+        self._width = len(getattr(dut, f"{name}_axis_tdata"))
+        self._words = max(1, -(-self._width // 64))
+        self.buffer = RecordBuffer(self._words + 1 + len(self.probes), capacity, max_length)
+        self.transactions = 0
+        self.sparse = sparse
+        self._cycles = 0 # clocks seen so far, the same count as the cycle column
+        self._first_edge = None # sim steps of falling edge 0 (sparse only)
+        self._period = None # clock period in sim steps (sparse only)
+        BusMonitor.__init__(self, dut, name, clk)
+
+    @property
+    def cycles(self) -> int:
+        """Clocks seen so far, counted like the cycle column."""
+        if self._period is None:
+            return self._cycles
+        return (get_sim_time() - self._first_edge) // self._period
+
+    def _cycle_now(self) -> int:
+        return round((get_sim_time() - self._first_edge) / self._period)
+
+    def _on_falling_edge(self) -> bool:
+        return (get_sim_time() - self._first_edge) % self._period == 0
+
+    async def _monitor_recv(self):
+        falling_edge = FallingEdge(self.clock) # make these once and reuse
+        read_only = ReadOnly()
+        tvalid, tready, tdata = self.bus.axis_tvalid, self.bus.axis_tready, self.bus.axis_tdata
+        probes = tuple(self.probes.values())
+        words = self._words
+        reserve = self.buffer.reserve
+        probe_columns = tuple(enumerate(probes, words + 1))
+        sparse = self.sparse
+        valid_rise, ready_rise = RisingEdge(tvalid), RisingEdge(tready)
+        cycle = -1
+        woken = False # woke on a tvalid/tready edge that fell on a falling clock edge
+        while True:
+            if not woken:
+                await falling_edge
+            woken = False
+            await read_only
+            if self._period is None:
+                cycle += 1
+                self._cycles = cycle
+                if sparse:
+                    # Step through the first two clocks to learn the period, then count by sim time
+                    if cycle == 0:
+                        self._first_edge = get_sim_time()
+                    else:
+                        self._period = get_sim_time() - self._first_edge
+            else:
+                cycle = self._cycle_now()
+            if not tvalid.value:
+                if sparse and self._period is not None:
+                    await valid_rise # sampled at the next falling edge, or this one if it is one
+                    woken = self._on_falling_edge()
+                continue
+            ready = tready.value
+            if ready.is_resolvable and not ready.integer:
+                if sparse and self._period is not None:
+                    await ready_rise
+                    woken = self._on_falling_edge()
+                continue
+            table, n = reserve()
+            data = _read(tdata)
+            if words == 1:
+                table[n, 0] = data
+            else:
+                for w in range(words):
+                    table[n, w] = (data >> (64 * w)) & 0xFFFFFFFFFFFFFFFF
+            table[n, words] = cycle
+            for column, probe in probe_columns:
+                table[n, column] = _read(probe)
+            self.transactions += 1
+
+    @property
+    def tdata(self) -> np.ndarray:
+        """Recorded tdata as uint64, or (n, words) uint64 for ports wider than 64 bits."""
+        data = self.buffer.array()[:, :self._words]
+        return data[:, 0] if self._words == 1 else data
+
+    @property
+    def cycle(self) -> np.ndarray:
+        """Clock cycle of each handshake."""
+        return self.buffer.array()[:, self._words].astype(np.int64)
+
+    def probe(self, name) -> np.ndarray:
+        """Raw (unsigned) values of a probe signal, see iq_codec.to_signed."""
+        column = self._words + 1 + list(self.probes).index(name)
+        return self.buffer.array()[:, column]
+
+    def tdata_ints(self) -> list:
+        """tdata as Python ints, for ports wider than 64 bits."""
+        data = self.buffer.array()[:, :self._words].tolist()
+        return [sum(word << (64 * w) for w, word in enumerate(row)) for row in data]
+
+def _read(handle):
+    value = handle.value
+    return value.integer if value.is_resolvable else 0
@@ -0,0 +1,184 @@
+"""
+Simulation throughput benchmarks with stored baselines.
+
+Runs the testbenches in BENCHMARKS one after another (never side by side, so
+they don't compete for cores) through regress.run_bench, always rebuilding so
+the build time is measured too. Their stimuli are fixed: the captures on disk
+and the seeded generators. For every bench it reports
+
+    build_time        s, HDL compile (sim_runner's timing.json)
+    test_time         s, the cocotb run on its own
+    sim_cycles        simulated time / the bench's clock period
+    cycles_per_sec    sim_cycles / test_time
+    samples_per_sec   input samples driven / test_time
+    max_rss_mb        peak RSS of the test run, bench and simulator (timing.json)
+
+and compares them with a baseline JSON. Anything worse than the baseline by
+more than the tolerance (default 10%) is flagged and the exit code is 1.
+
+    python benchmark.py --save                 # record bench_baseline.json
+    python benchmark.py                        # compare against it
+    python benchmark.py test_costas -r 3 -t 0.05
+
+With -r the best of the repeats is kept for every metric, which takes out most
+of the noise of a shared machine. --sim verilator (or SIM=verilator) benchmarks
+the Verilator builds; keep a separate baseline for them with -b.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import regress
+
+SIM_PATH = regress.SIM_PATH
+DEFAULT_OUT = SIM_PATH / "bench_build"
+DEFAULT_BASELINE = SIM_PATH / "bench_baseline.json"
+TOLERANCE = 0.10
+
+class Benchmark(NamedTuple):
+    module: str
+    runner: str
+    clock_ns: float # period of the clock the bench starts
+    samples: int # input samples the bench drives
+
+BENCHMARKS = [
+    Benchmark("test_costas", "axis_runner", 10.0, 500),
+    Benchmark("test_bpsk_decode", "adsb_runner", 15.626, len(np.load(SIM_PATH / "real_data_jimmy.npy", mmap_mode="r"))),
+    Benchmark("test_preamble_detect", "adsb_runner", 15.626, len(np.load(SIM_PATH / "real_data_32.npy", mmap_mode="r"))),
+    Benchmark("test_cordic_rotate", "axis_runner", 10.0, 250),
+]
+
+# metric -> True if bigger is better
+METRICS = {
+    "build_time": False,
+    "test_time": False,
+    "cycles_per_sec": True,
+    "samples_per_sec": True,
+    "max_rss_mb": False,
+}
+
+def run_benchmark(bench: Benchmark, out_dir=DEFAULT_OUT, sim: str | None = None) -> dict:
+    """Build and run one bench from scratch and work out its metrics. Failed benches get only "failed"."""
+    env = {"SIM_HEADLESS": "1", "SIM_REBUILD": "1"}
+    if sim:
+        env["SIM"] = sim
+    result = regress.run_bench(regress.Testbench(bench.module, bench.runner), out_dir, env=env)
+    timing_file = result.build_dir / "timing.json"
+    if result.failed or not timing_file.is_file():
+        return dict(failed=True, wall_time=result.wall_time, log=str(result.build_dir / "run.log"))
+    timing = json.loads(timing_file.read_text())
+    sim_cycles = sum(t["sim_time_ns"] for t in result.tests) / bench.clock_ns
+    test_time = timing["test_time"]
+    return dict(
+        failed=False,
+        wall_time=result.wall_time,
+        build_time=timing["build_time"],
+        test_time=test_time,
+        sim_cycles=sim_cycles,
+        cycles_per_sec=sim_cycles / test_time,
+        samples_per_sec=bench.samples / test_time,
+        max_rss_mb=timing["test_max_rss_kb"] / 1024,
+    )
+
+def best_of(runs) -> dict:
+    """Best value of every metric over repeated runs of one bench."""
+    ok = [r for r in runs if not r["failed"]]
+    if not ok:
+        return runs[-1]
+    best = dict(ok[0])
+    for metric, higher in METRICS.items():
+        values = [r[metric] for r in ok]
+        best[metric] = max(values) if higher else min(values)
+    best["repeats"] = len(ok)
+    return best
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    """(module, metric, baseline, current, change) for every metric worse than baseline by more than tolerance."""
+    flagged = []
+    for module, current in results.items():
+        base = baseline.get("benches", {}).get(module)
+        if base is None or base.get("failed") or current.get("failed"):
+            continue
+        for metric, higher in METRICS.items():
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            if (-change if higher else change) > tolerance:
+                flagged.append((module, metric, old, new, change))
+    return flagged
+
+def host_info(sim: str | None = None) -> dict:
+    import cocotb
+    return dict(python=platform.python_version(), cocotb=cocotb.__version__, machine=platform.machine(),
+                processor=platform.processor(), cpus=os.cpu_count(), sim=sim or os.getenv("SIM", "icarus"))
+
+def format_results(results: dict) -> str:
+    lines = [f"{'bench':<22} {'build s':>8} {'test s':>8} {'cycles':>10} {'cycles/s':>10} {'samples/s':>10} {'RSS MB':>7}"]
+    for module, r in results.items():
+        if r["failed"]:
+            lines.append(f"{module:<22} FAILED, see {r['log']}")
+            continue
+        lines.append(f"{module:<22} {r['build_time']:8.2f} {r['test_time']:8.2f} {r['sim_cycles']:10.0f} "
+                     f"{r['cycles_per_sec']:10.0f} {r['samples_per_sec']:10.0f} {r['max_rss_mb']:7.1f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help="benches to run (default: all of BENCHMARKS)")
+    parser.add_argument("-b", "--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("-t", "--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, 0.1 = 10%%")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="runs per bench, the best is kept")
+    parser.add_argument("-o", "--out", type=Path, default=DEFAULT_OUT, help="build directory")
+    parser.add_argument("--sim", default=None, help="simulator (default: $SIM or icarus)")
+    args = parser.parse_args(argv)
+
+    benches = BENCHMARKS
+    if args.modules:
+        known = {b.module: b for b in BENCHMARKS}
+        missing = [m for m in args.modules if m not in known]
+        if missing:
+            parser.error(f"unknown benchmark(s): {', '.join(missing)}")
+        benches = [known[m] for m in args.modules]
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    results = {}
+    for bench in benches:
+        results[bench.module] = best_of([run_benchmark(bench, args.out, args.sim) for _ in range(args.repeat)])
+    print(format_results(results))
+
+    report = dict(created=time.strftime("%Y-%m-%dT%H:%M:%S"), host=host_info(args.sim), benches=results)
+    (args.out / "benchmark.json").write_text(json.dumps(report, indent=2))
+    failed = [m for m, r in results.items() if r["failed"]]
+
+    if args.save:
+        if args.baseline.is_file():
+            # Keep the entries of benches that weren't run this time
+            old = json.loads(args.baseline.read_text()).get("benches", {})
+            report["benches"] = {**old, **results}
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"baseline saved to {args.baseline}")
+        return 1 if failed else 0
+
+    if not args.baseline.is_file():
+        print(f"no baseline at {args.baseline}, run with --save to record one")
+        return 1 if failed else 0
+    baseline = json.loads(args.baseline.read_text())
+    base_sim = baseline.get("host", {}).get("sim")
+    if base_sim and base_sim != report["host"]["sim"]:
+        print(f"note: {args.baseline} was recorded with {base_sim}, this run used {report['host']['sim']}")
+    flagged = compare(results, baseline, args.tolerance)
+    for module, metric, old, new, change in flagged:
+        print(f"SLOWER {module} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    if not flagged:
+        print(f"no metric worse than {args.baseline} by more than {args.tolerance:.0%}")
+    return 1 if flagged or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Bit-exact NumPy model of hdl/bpsk_decoder.sv.
+
+The pipeline is the same as the RTL:
+    axis_fir (512-tap matched filter on the I channel)
+    -> preamble_detector (local max/min above threshold, with polarity)
+    -> sample_decoder (128-bit shift register, first bit sampled 13 samples in)
+
+Everything except the sample_decoder state machine runs on whole arrays. The
+state machine only has to step through trigger positions, which are sparse.
+"""
+from typing import NamedTuple
+from pathlib import Path
+import numpy as np
+import correlator
+
+SAMPLES_PER_SYMBOL = 32
+SQUITTER_LENGTH = 128
+PREAMBLE_DETECTOR_THRESHOLD = 500000 # Same constants as bpsk_decoder_wrapper.v
+DECODER_THRESHOLD = 900 # Wired into sample_decoder but unused, bits come from the sign of the I sample
+
+# sample_decoder loads sample_counter = 3 on trigger and takes the first bit when it reaches
+# SAMPLES_PER_SYMBOL / 2, then every SAMPLES_PER_SYMBOL samples after that.
+FIRST_SAMPLE_COUNT = 3
+FIRST_BIT_OFFSET = SAMPLES_PER_SYMBOL // 2 - FIRST_SAMPLE_COUNT
+PACKET_SPAN = FIRST_BIT_OFFSET + SAMPLES_PER_SYMBOL * (SQUITTER_LENGTH - 1) # start sample -> last bit sample
+
+class DecodeResult(NamedTuple):
+    position: np.ndarray # index of the matched filter peak (preamble_detector lookback_window[1])
+    polarity: np.ndarray # trigger[1], 1 if the peak was negative
+    peak: np.ndarray # matched filter value at the peak
+    start: np.ndarray # index of the first sample the decoder consumed (sample_counter == 3)
+    bits: np.ndarray # (num_squitters, SQUITTER_LENGTH) uint8, first received bit first
+
+def preamble_coeffs(samples_per_symbol: int = SAMPLES_PER_SYMBOL) -> np.ndarray:
+    """ADS-B preamble as +1/-1 taps, the same list the testbenches build by hand."""
+    runs = [(1, 1), (-1, 1), (1, 1), (-1, 4), (1, 1), (-1, 1), (1, 1), (-1, 6)]
+    return np.concatenate([np.full(length * samples_per_symbol, sign, dtype=np.int8) for sign, length in runs])
+
+def pack_coeffs(coeffs) -> int:
+    """Pack int8 taps into the integer driven onto a [N-1:0][7:0] coefficient port."""
+    packed = 0
+    for i, c in enumerate(np.asarray(coeffs, dtype=np.int64)):
+        packed |= (int(c) & 0xFF) << (i * 8)
+    return packed
+
+def to_int32(x) -> np.ndarray:
+    """Wrap integers to 32-bit two's complement like a logic signed [31:0]."""
+    return np.asarray(x, dtype=np.int64).astype(np.uint32).view(np.int32)
+
+def axis_fir(samples, coeffs, method: str = "auto") -> np.ndarray:
+    """
+    m00_axis_tdata of axis_fir after each input sample.
+
+    intmdt_term[N-1] after sample k is sum_i coeffs[i] * x[k - (N-1) + i], so this
+    is a convolution with the reversed taps. The registers start at 0 and every
+    partial sum wraps at 32 bits, which is the same as wrapping the final sum.
+    The +-1 preamble goes through correlator's prefix-sum path (8 runs, so 9
+    edges instead of 512 taps), other taps through FFT or np.convolve; see
+    correlator.correlate.
+    """
+    return correlator.correlate(samples, coeffs, method)
+
+def preamble_detector(filtered, threshold: int = PREAMBLE_DETECTOR_THRESHOLD):
+    """
+    Trigger and polarity for every matched filter sample p, evaluated when p sits
+    in lookback_window[1]. The neighbour comparisons are unsigned (the window is a
+    plain logic vector), only the threshold comparisons are signed.
+    """
+    y = to_int32(filtered)
+    centre = y[:-1]
+    after = y[1:]
+    before = np.concatenate((np.zeros(1, dtype=np.int32), y[:-2]))
+    uc, ua, ub = centre.view(np.uint32), after.view(np.uint32), before.view(np.uint32)
+    local_maximum = (uc > ua) & (uc > ub)
+    local_minimum = (uc < ua) & (uc < ub)
+    threshold = to_int32(threshold)
+    trigger = (local_maximum & (centre >= threshold)) | (local_minimum & (centre <= to_int32(-np.int64(threshold))))
+    polarity = (centre < 0).astype(np.uint8)
+    return trigger, polarity
+
+def schedule_trigger(p: int, idle_from: int, valid_period: int = 1, num_samples: int | None = None):
+    """
+    One step of the sample_decoder state machine: the start sample of the
+    squitter that trigger p begins, or None if the decoder is still busy while
+    p is visible. idle_from is the first clock in which the decoder is back in
+    IDLE (-1 after reset). num_samples is the stream length if it is known.
+    """
+    P = valid_period
+    # Peak p is in lookback_window[1] once sample p+1 has passed through
+    # the FIR and the detector, i.e. from clock (p+1)*P + 2 until the next shift.
+    k = p + 1
+    visible_until = np.inf if num_samples is not None and k >= num_samples - 1 else (k + 1) * P + 1
+    if visible_until < idle_from:
+        return None
+    clock = max(k * P + 2, idle_from)
+    return -(-(clock + 1) // P) # first sample clocked in while RECORDING
+
+def decoder_schedule(trigger_positions, num_samples: int, valid_period: int = 1):
+    """
+    The sample_decoder state machine on its own: which triggers start a squitter.
+
+    trigger_positions are the sorted indices where preamble_detector fires and
+    num_samples is the length of the stream. Returns (positions, starts) for
+    every squitter that completes: the trigger index and the first sample the
+    decoder consumed.
+    """
+    n = num_samples
+    positions = []
+    starts = []
+    idle_from = -1 # first clock in which the decoder is back in IDLE
+    for p in np.asarray(trigger_positions).tolist():
+        start = schedule_trigger(p, idle_from, valid_period, n)
+        if start is None:
+            continue
+        last = start + PACKET_SPAN
+        if last >= n:
+            break
+        positions.append(p)
+        starts.append(start)
+        idle_from = last * valid_period + 1
+    return np.array(positions, dtype=np.int64), np.array(starts, dtype=np.int64)
+
+def bit_offsets() -> np.ndarray:
+    """Sample offsets of every bit from the decoder's start sample."""
+    return FIRST_BIT_OFFSET + SAMPLES_PER_SYMBOL * np.arange(SQUITTER_LENGTH)
+
+def slice_bits(samples, starts, polarity) -> np.ndarray:
+    """Bits of the squitters starting at starts: the sign of each sampled I value, flipped by polarity."""
+    x = np.asarray(samples)
+    starts = np.asarray(starts, dtype=np.int64)
+    sign = (x[starts[:, None] + bit_offsets()[None, :]] >= 0).astype(np.uint8)
+    return sign ^ np.asarray(polarity, dtype=np.uint8)[:, None]
+
+def sample_decoder(samples, trigger, polarity, valid_period: int = 1):
+    """
+    Step the sample_decoder state machine through the trigger positions.
+
+    valid_period is the number of clocks between input samples (1 for a
+    continuous stream, 2 for the write_single + pause pattern in
+    test_bpsk_decode.py). It matters because trigger is combinational and
+    IDLE looks at it every clock, not every sample.
+
+    Returns (position, start, bits) for every squitter that completes.
+    """
+    x = np.asarray(samples)
+    positions, starts = decoder_schedule(np.flatnonzero(trigger), len(x), valid_period)
+    bits = slice_bits(x, starts, np.asarray(polarity, dtype=np.uint8)[positions])
+    return positions, starts, bits
+
+def squitter_ints(bits) -> list:
+    """m00_axis_tdata as Python ints (first received bit is the MSB)."""
+    packed = np.packbits(np.asarray(bits, dtype=np.uint8), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
+
+def bpsk_decode(samples, coeffs=None, threshold: int = PREAMBLE_DETECTOR_THRESHOLD, valid_period: int = 1) -> DecodeResult:
+    """
+    Run the whole bpsk_decoder on the I channel (int16 samples, i.e.
+    s00_axis_tdata[15:0]).
+    """
+    if coeffs is None:
+        coeffs = preamble_coeffs()
+    x = np.clip(np.asarray(samples, dtype=np.int64), -32768, 32767).astype(np.int16)
+    filtered = axis_fir(x, coeffs)
+    trigger, polarity = preamble_detector(filtered, threshold)
+    positions, starts, bits = sample_decoder(x, trigger, polarity, valid_period)
+    return DecodeResult(positions, polarity[positions], filtered[positions], starts, bits)
+
+if __name__ == "__main__":
+    # python bpsk_model.py [capture.npy | real.npy imag.npy]
+    import sys
+    from capture import Capture
+    from iq_codec import unpack_iq
+    proj_path = Path(__file__).resolve().parent.parent
+    paths = sys.argv[1:] or [proj_path / "sim" / "real_data_jimmy.npy", proj_path / "sim" / "imag_data_jimmy.npy"]
+    real_data, _ = unpack_iq(Capture(*paths).read())
+    result = bpsk_decode(real_data, valid_period=2)
+    print("Received squitters:")
+    print(squitter_ints(result.bits))
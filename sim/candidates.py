@@ -0,0 +1,140 @@
+"""
+Preamble candidate index for long captures.
+
+scan() runs the matched filter (correlator's prefix-sum path) and the
+preamble_detector rule over a capture one chunk at a time and keeps only the
+samples where trigger fires: their position, polarity and filter peak. The
+result is bit-identical to bpsk_model.preamble_detector on the whole capture.
+save() and load() keep it in a small .npz next to the recording, so bit slicing,
+threshold studies and RTL replay don't have to filter the capture again.
+
+    python candidates.py real_data_jimmy.npy imag_data_jimmy.npy -o jimmy.idx.npz
+
+A lower threshold gives a superset of candidates, so one scan at a low threshold
+serves every study at higher ones (CandidateIndex.above()).
+"""
+import argparse
+import sys
+from typing import NamedTuple
+from pathlib import Path
+import numpy as np
+import bpsk_model
+from capture import Capture
+from iq_codec import unpack_iq
+
+class CandidateIndex(NamedTuple):
+    position: np.ndarray # int64 sample index of the filter peak (preamble end)
+    polarity: np.ndarray # uint8, 1 if the peak was negative
+    peak: np.ndarray # int32 matched filter value at position
+    num_samples: int # length of the scanned capture
+    threshold: int
+    coeffs: np.ndarray # int8 taps used for the scan
+
+    def above(self, threshold: int) -> "CandidateIndex":
+        """The candidates a scan at a higher threshold would have found."""
+        if threshold < self.threshold:
+            raise ValueError(f"index was built at threshold {self.threshold}, can't lower it to {threshold}")
+        keep = (self.peak >= threshold) | (self.peak <= -threshold)
+        return self._replace(position=self.position[keep], polarity=self.polarity[keep], peak=self.peak[keep],
+                             threshold=threshold)
+
+class Window(NamedTuple):
+    start: int # first capture sample, lead-in included
+    stop: int # one past the last capture sample
+    candidates: int # candidate positions inside
+
+def plan_windows(index: CandidateIndex, margin: int = 64) -> list:
+    """
+    Capture ranges that cover every candidate: taps - 1 samples of lead-in to
+    fill the matched filter before the preamble, then the whole squitter, plus
+    margin on both sides. Overlapping ranges are merged, so the decoder sees
+    back-to-back candidates the same way it would in the full stream.
+    """
+    lead = len(index.coeffs) - 1 + margin
+    # trigger -> decoder start is at most 3 samples at any valid period, see bpsk_model.decoder_schedule
+    tail = 4 + int(bpsk_model.bit_offsets()[-1]) + 1 + margin
+    windows = []
+    for p in index.position.tolist():
+        start, stop = max(0, p - lead), min(index.num_samples, p + tail)
+        if windows and start <= windows[-1].stop:
+            last = windows[-1]
+            windows[-1] = Window(last.start, max(last.stop, stop), last.candidates + 1)
+        else:
+            windows.append(Window(start, stop, 1))
+    return windows
+
+def _i_channel(capture: Capture, start: int, stop: int) -> np.ndarray:
+    """I samples [start, stop) of the capture, with zeros before sample 0 (empty filter registers)."""
+    lead = max(0, -start)
+    i, _ = unpack_iq(capture.read(max(start, 0), stop))
+    return np.concatenate((np.zeros(lead, dtype=np.int16), i)) if lead else i
+
+def scan(capture: Capture, coeffs=None, threshold: int = bpsk_model.PREAMBLE_DETECTOR_THRESHOLD,
+         chunk_size: int = 1 << 20) -> CandidateIndex:
+    """Find every trigger in the capture, chunk_size samples at a time."""
+    coeffs = bpsk_model.preamble_coeffs() if coeffs is None else np.asarray(coeffs, dtype=np.int8)
+    taps = len(coeffs)
+    n = len(capture)
+    positions, polarities, peaks = [], [], []
+    for pos in range(0, n, chunk_size):
+        end = min(pos + chunk_size, n)
+        # Filter outputs for [pos - 2, end): enough to judge every centre in [pos - 1, end - 1).
+        # The last sample has no successor and is never a candidate, like in preamble_detector.
+        x = _i_channel(capture, pos - 2 - (taps - 1), end)
+        y = bpsk_model.axis_fir(x, coeffs)[taps - 1:]
+        trigger, polarity = bpsk_model.preamble_detector(y, threshold)
+        # preamble_detector treats y[0] as having a zero before it; drop it, its real predecessor is in the last chunk
+        hits = np.flatnonzero(trigger[1:]) + 1
+        positions.append(hits + pos - 2)
+        polarities.append(polarity[hits])
+        peaks.append(y[hits])
+    position = np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64)
+    keep = position >= 0
+    return CandidateIndex(position[keep].astype(np.int64),
+                          np.concatenate(polarities)[keep].astype(np.uint8) if positions else np.zeros(0, np.uint8),
+                          np.concatenate(peaks)[keep].astype(np.int32) if positions else np.zeros(0, np.int32),
+                          n, int(threshold), coeffs)
+
+def save(path, index: CandidateIndex) -> Path:
+    path = Path(path)
+    np.savez(path, position=index.position, polarity=index.polarity, peak=index.peak,
+             num_samples=index.num_samples, threshold=index.threshold, coeffs=index.coeffs)
+    return path
+
+def load(path) -> CandidateIndex:
+    with np.load(path) as f:
+        return CandidateIndex(f["position"], f["polarity"], f["peak"], int(f["num_samples"]),
+                              int(f["threshold"]), f["coeffs"])
+
+def decode(capture: Capture, index: CandidateIndex, valid_period: int = 1) -> bpsk_model.DecodeResult:
+    """
+    bpsk_model.bpsk_decode from an index: the decoder state machine runs on the
+    candidate positions and only the bit sample windows are read from the capture.
+    """
+    positions, starts = bpsk_model.decoder_schedule(index.position, index.num_samples, valid_period)
+    rows = np.searchsorted(index.position, positions)
+    polarity = index.polarity[rows]
+    span = int(bpsk_model.bit_offsets()[-1]) + 1
+    bits = np.empty((len(starts), bpsk_model.SQUITTER_LENGTH), dtype=np.uint8)
+    for row, start in enumerate(starts.tolist()):
+        window = _i_channel(capture, start, start + span)
+        bits[row] = bpsk_model.slice_bits(window, [0], polarity[row:row + 1])[0]
+    return bpsk_model.DecodeResult(positions, polarity, index.peak[rows], starts, bits)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a preamble candidate index for a capture.")
+    parser.add_argument("capture", type=Path, help="capture .npy (complex, or the real half of a split capture)")
+    parser.add_argument("imag", type=Path, nargs="?", help="imag half of a split capture")
+    parser.add_argument("-o", "--out", type=Path, help="index file (default: <capture>.idx.npz)")
+    parser.add_argument("-t", "--threshold", type=int, default=bpsk_model.PREAMBLE_DETECTOR_THRESHOLD)
+    parser.add_argument("--chunk", type=int, default=1 << 20, help="samples per chunk")
+    args = parser.parse_args(argv)
+
+    capture = Capture(args.capture, args.imag)
+    index = scan(capture, threshold=args.threshold, chunk_size=args.chunk)
+    out = save(args.out or args.capture.with_suffix(".idx.npz"), index)
+    print(f"{len(index.position)} candidates in {index.num_samples} samples (threshold {index.threshold}) -> {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Memory-mapped reader for IQ captures.
+
+Handles the capture formats in sim/:
+    adsb_squitters_fake_50dbm_64MSPS_iq.np   one complex128 .npy file
+    real_data_32.npy + imag_data_32.npy      split real/imag int64 .npy files
+    headerless binary                        pass dtype=
+
+Nothing is loaded up front. chunks() slices the memmap a chunk at a time and
+converts it to the hardware's packed int16 IQ (see iq_codec), so RAM use is
+bounded by the chunk size no matter how big the recording is.
+
+    capture = Capture("real_data_jimmy.npy", "imag_data_jimmy.npy")
+    for chunk in capture.chunks(1 << 20, overlap=511):
+        ...  # chunk.i[chunk.new:] are the samples not seen in an earlier chunk
+    source.start(capture.words())  # AXISStreamSource
+"""
+from typing import NamedTuple
+from pathlib import Path
+import numpy as np
+from iq_codec import RAW_SCALE, pack_iq, pack_complex, unpack_iq
+
+class CaptureChunk(NamedTuple):
+    offset: int # capture index of words[0]
+    new: int # words[new:] were not part of an earlier chunk (the rest is overlap)
+    words: np.ndarray # packed uint32 IQ
+    i: np.ndarray # int16 view of words
+    q: np.ndarray # int16 view of words
+
+def open_array(path, dtype=None) -> np.ndarray:
+    """Memory-map a .npy file (any extension), or a headerless file of dtype."""
+    path = Path(path)
+    if dtype is not None:
+        return np.memmap(path, dtype=dtype, mode="r")
+    return np.load(path, mmap_mode="r")
+
+class Capture:
+    """
+    A recording opened as a memmap. Pass imag_path for split real/imag files.
+    scale is applied before saturating to int16 (RAW_SCALE for ADC counts).
+    """
+    def __init__(self, path, imag_path=None, scale=RAW_SCALE, dtype=None):
+        self.data = open_array(path, dtype)
+        self.imag = open_array(imag_path, dtype) if imag_path is not None else None
+        if self.imag is not None and len(self.imag) != len(self.data):
+            raise ValueError(f"real and imag files have different lengths ({len(self.data)} vs {len(self.imag)})")
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.data)
+
+    def read(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Samples [start, stop) as packed uint32 IQ words."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        real = self.data[start:stop]
+        if np.iscomplexobj(real):
+            return pack_complex(real, self.scale)
+        imag = self.imag[start:stop] if self.imag is not None else np.zeros(len(real), dtype=np.int16)
+        if self.scale != RAW_SCALE:
+            real = real * self.scale
+            imag = imag * self.scale
+        return pack_iq(real, imag)
+
+    def chunks(self, chunk_size: int = 1 << 20, overlap: int = 0, start: int = 0, stop: int | None = None):
+        """
+        Yield CaptureChunk for [start, stop) in steps of chunk_size. Every chunk
+        after the first also carries the overlap samples before it, e.g.
+        overlap = taps - 1 lets a FIR run on each chunk on its own.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for pos in range(start, stop, chunk_size):
+            lead = min(overlap, pos - start)
+            words = self.read(pos - lead, min(pos + chunk_size, stop))
+            i, q = unpack_iq(words)
+            yield CaptureChunk(pos - lead, lead, words, i, q)
+
+    def words(self, chunk_size: int = 1 << 16, start: int = 0, stop: int | None = None):
+        """Packed words chunk by chunk, for AXISStreamSource."""
+        for chunk in self.chunks(chunk_size, 0, start, stop):
+            yield chunk.words
@@ -0,0 +1,64 @@
+"""
+Checkpoints for the streaming models, so a long decode can stop and pick up
+where it left off.
+
+The streaming models keep their state between chunks and hand it out as a
+dict of arrays and numbers with state(), and take it back with restore():
+
+    decimator.Decimator         filter history, input count
+    pipeline.FirStage           filter history (lowpass, matched filter)
+    pipeline.DetectorStage      the last two filter outputs (lookback window)
+    pipeline.DecoderStage       idle clock, scheduled squitters and their samples
+    costas_model.CostasFixed    freq, phase and the phases still in the pipeline
+
+A checkpoint is one .npz holding several of those states, each key stored as
+"<name>/<key>", plus a JSON "meta" entry. No pickles: it loads with
+allow_pickle=False. save() writes a temporary file and renames it over the
+old checkpoint, so a crash while saving leaves the previous one in place.
+
+    checkpoint.save("run.ckpt.npz", dict(fir=fir.state(), costas=loop.state()), meta=dict(position=n))
+    states, meta = checkpoint.load("run.ckpt.npz")
+    fir.restore(states["fir"])
+
+Pipeline.run(checkpoint_path=...) uses this to checkpoint the whole receiver.
+"""
+import json
+import os
+from pathlib import Path
+import numpy as np
+
+FORMAT = 1
+_META = "meta"
+
+def save(path, states: dict, meta: dict | None = None) -> Path:
+    """Write {name: state dict} and meta (JSON-able) to path, replacing it atomically."""
+    path = Path(path)
+    arrays = {}
+    for name, state in states.items():
+        if "/" in name:
+            raise ValueError(f"state name {name!r} can't contain '/'")
+        for key, value in state.items():
+            arrays[f"{name}/{key}"] = np.asarray(value)
+    arrays[_META] = np.array(json.dumps(dict(meta or {}, format=FORMAT)))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+    return path
+
+def load(path) -> tuple:
+    """(states, meta) as saved by save(). 0-d arrays come back as 0-d arrays, restore() converts them."""
+    states = {}
+    with np.load(path, allow_pickle=False) as f:
+        meta = json.loads(str(f[_META]))
+        for key in f.files:
+            if key == _META:
+                continue
+            name, _, field = key.partition("/")
+            states.setdefault(name, {})[field] = f[key]
+    if meta.get("format") != FORMAT:
+        raise ValueError(f"{path} is checkpoint format {meta.get('format')}, expected {FORMAT}")
+    return states, meta
@@ -0,0 +1,132 @@
+"""
+Array-wide CORDIC kernels.
+
+Every function takes arrays (or scalars) and runs each CORDIC iteration as one
+array operation over all vectors. The angle tables are built once at import.
+
+Float:
+    rotate(x, y, angle_deg)       rotation mode (cordic_demo.py)
+    vector(x, y)                  vectoring mode (the model in test_costas.py)
+Fixed point, bit-exact with the RTL (16-bit angles, 65536 = 360 degrees):
+    rotate_fixed(x, y, angle)     cordic_rotate.sv and the front end of costas.sv
+    vector_fixed(x, y)            cordic.sv (checked by test_cordic.py)
+"""
+import numpy as np
+
+# Float tables
+MAX_ITERATIONS = 30
+ANGLES_DEG = np.degrees(np.arctan(2.0 ** -np.arange(MAX_ITERATIONS)))
+GAIN = np.cumprod(np.sqrt(1 + 2.0 ** (-2 * np.arange(MAX_ITERATIONS)))) # GAIN[n-1] is the gain after n iterations
+K = 0.6072529350088814 # 1/gain for infinite iterations
+
+# Fixed point tables, copied from the RTL
+STAGES = 16
+C_CORDIC_GAIN = 39796 # 0.607 in 0.16 fixed point
+ROTATE_ANGLES = np.array([8192, 4836, 2555, 1297, 651, 326, 163, 81, 41, 20, 10, 5, 3, 1, 1, 0], dtype=np.int64) # cordic_rotate.sv, costas.sv
+VECTOR_ANGLES = np.array([8191, 4835, 2555, 1297, 651, 325, 162, 81, 40, 20, 10, 5, 2, 1, 0, 0], dtype=np.int64) # cordic.sv
+VECTOR_WIDTH = 16 + 16 + 1 # C_CORDIC_FIXED_WIDTH in cordic.sv
+
+def wrap(v, bits: int):
+    """Wrap integers to a signed two's complement width."""
+    half = 1 << (bits - 1)
+    return ((v + half) & ((1 << bits) - 1)) - half
+
+def rotate(x, y, angle_deg, iterations: int = 25):
+    """Rotate (x, y) by angle_deg, gain removed. Same algorithm as cordic_demo.cordic_rotate."""
+    x, y, z = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64),
+                                  np.asarray(angle_deg, dtype=np.float64))
+    # Normalize angle to (-180, 180], then fold into +-90 by negating the vector
+    z = 180 - np.mod(180 - z, 360)
+    flip = np.abs(z) > 90
+    x = np.where(flip, -x, x)
+    y = np.where(flip, -y, y)
+    z = np.where(z > 90, z - 180, np.where(z < -90, z + 180, z))
+
+    for i in range(iterations):
+        d = np.where(z >= 0, 1.0, -1.0)
+        scale = 2.0 ** -i
+        x, y = x - d * y * scale, y + d * x * scale
+        z = z - d * ANGLES_DEG[i]
+    return x * K, y * K
+
+def vector(x, y, iterations: int = 16):
+    """
+    Vectoring mode as modelled in test_costas.py: returns (z, magnitude)
+    where z is the accumulated angle in degrees (folded into [0, 360) for
+    vectors in the left half plane) and magnitude has the gain removed.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    invert = x < 0
+    x = np.where(invert, -x, x)
+    y = np.where(invert, -y, y)
+    z = np.zeros_like(x)
+    for i in range(iterations):
+        d = np.where(y > 0, 1.0, -1.0)
+        scale = 2.0 ** -i
+        x, y = x + d * y * scale, y - d * x * scale
+        z = z - d * ANGLES_DEG[i]
+    z = np.where(invert, np.mod(z + 180, 360), z)
+    return z, x / GAIN[iterations - 1]
+
+def rotate_fixed(x, y, angle):
+    """
+    Pipelined rotation from cordic_rotate.sv / costas.sv.
+
+    x and y are signed 16-bit inputs, angle is the rotation in 16-bit units
+    (unwrapped, compared at 32 bits like the RTL). Vectors are pre-scaled by
+    C_CORDIC_GAIN and folded into +-90 degrees before the 16 stages. Returns
+    (final_x, final_y), the 32-bit px/py of the last stage >>> 16; the output
+    word is {final_y[15:0], final_x[15:0]}.
+    """
+    x, y, angle = np.broadcast_arrays(np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64),
+                                      np.asarray(angle, dtype=np.int64))
+    flip = (angle > 16384) | (angle < -16384)
+    sign = np.where(flip, -1, 1)
+    px = sign * x * C_CORDIC_GAIN
+    py = sign * y * C_CORDIC_GAIN
+    pz = wrap(np.where(flip, angle + 32768, angle), 16)
+
+    for i in range(STAGES):
+        up = pz > 0
+        dx = py >> i
+        dy = px >> i
+        px = wrap(np.where(up, px - dx, px + dx), 32)
+        py = wrap(np.where(up, py + dy, py - dy), 32)
+        pz = wrap(np.where(up, pz - ROTATE_ANGLES[i], pz + ROTATE_ANGLES[i]), 16)
+    return px >> 16, py >> 16
+
+def _rnd2zerodiv(v, i):
+    """rnd2zerodiv in cordic.sv: shifts the magnitude, so negative values round toward zero too."""
+    return np.where(v < 0, -((-v) >> i), v >> i)
+
+def _abs_scale(v):
+    """abs_scale in cordic.sv: the negation is 16 bits wide, so -32768 stays negative."""
+    return wrap(np.where(v < 0, -v, v), 16) * C_CORDIC_GAIN
+
+def vector_fixed(x, y):
+    """
+    Pipelined vectoring from cordic.sv: returns (magnitude, angle), the unsigned
+    16-bit fields [15:0] and [31:16] of m00_axis_tdata.
+
+    x and y are signed 16-bit inputs. Vectors with x < 0 are negated (in 16
+    bits) and get 180 degrees taken off the angle at the end; both components
+    then go through abs_scale, so the sign of y is dropped. The 16 stages run
+    at VECTOR_WIDTH bits, the magnitude is bits [31:16] of the last x.
+    """
+    x, y = np.broadcast_arrays(wrap(np.asarray(x, dtype=np.int64), 16), wrap(np.asarray(y, dtype=np.int64), 16))
+    flips = x < 0
+    xi = wrap(_abs_scale(wrap(np.where(flips, -x, x), 16)), VECTOR_WIDTH)
+    yi = wrap(_abs_scale(wrap(np.where(flips, -y, y), 16)), VECTOR_WIDTH)
+    zi = np.zeros_like(xi)
+
+    for i in range(STAGES):
+        down = yi < 0
+        dx = _rnd2zerodiv(yi, i)
+        dy = _rnd2zerodiv(xi, i)
+        xi, yi = (wrap(np.where(down, xi - dx, xi + dx), VECTOR_WIDTH),
+                  wrap(np.where(down, yi + dy, yi - dy), VECTOR_WIDTH))
+        zi = wrap(np.where(down, zi - VECTOR_ANGLES[i], zi + VECTOR_ANGLES[i]), VECTOR_WIDTH)
+
+    magnitude = (xi >> 16) & 0xFFFF
+    angle = np.where(flips, zi - 32768, zi) & 0xFFFF
+    return magnitude, angle
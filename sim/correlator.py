@@ -0,0 +1,101 @@
+"""
+Fast integer correlators with the same output as hdl/axis_fir.sv.
+
+axis_fir's output after sample k is sum_i coeffs[i] * x[k - (N-1) + i], with
+x = 0 before the first sample, wrapped to int32. Three ways to get it:
+
+    boxcar   coefficients as runs of equal values (the +-1 preamble is 8 runs,
+             each a multiple of 32 taps long). Correlating x with the taps is
+             correlating the prefix sums of x with the taps' first difference,
+             which is only non-zero where a run starts or ends, so a sample
+             costs O(edges) instead of O(N): 9 edges for the 512-tap preamble.
+             The sum wraps at 32 bits anyway, so the prefix sums are int32 too.
+    fft      overlap-save FFT for arbitrary int8 taps, rounded back to integers.
+             Exact while the float error stays under 0.5, which holds for int16
+             samples and int8 taps at any length used here.
+    direct   np.convolve, the reference.
+
+correlate() picks boxcar when the taps change value at most every other tap
+(the preamble, lowpass.lowpass_coeffs), fft for other long filters and direct
+otherwise. Every path is bit-identical.
+"""
+import numpy as np
+
+def _to_int32(x):
+    return np.asarray(x, dtype=np.int64).astype(np.uint32).view(np.int32)
+
+def run_lengths(coeffs):
+    """Run-length encode taps: returns (values, lengths) with values[r] repeated lengths[r] times."""
+    c = np.asarray(coeffs, dtype=np.int64)
+    if len(c) == 0:
+        return c, c
+    edges = np.flatnonzero(np.diff(c)) + 1
+    starts = np.concatenate(([0], edges))
+    lengths = np.diff(np.concatenate((starts, [len(c)])))
+    return c[starts], lengths
+
+def _edges(coeffs) -> np.ndarray:
+    """edges[j] = coeffs[j - 1] - coeffs[j] for j in 0..N, with zeros outside the taps."""
+    c = np.asarray(coeffs, dtype=np.int64)
+    return -np.diff(c, prepend=0, append=0)
+
+def boxcar_correlate(samples, values, lengths) -> np.ndarray:
+    """axis_fir output for run-length encoded taps, from prefix sums of the input."""
+    x = np.asarray(samples)
+    edges = _edges(np.repeat(np.asarray(values, dtype=np.int64), np.asarray(lengths, dtype=np.int64)))
+    n = len(x)
+    taps = len(edges) - 1
+    # prefix[taps + k] = x[0] + ... + x[k]; the zeros in front model the empty registers
+    prefix = np.zeros(taps + n, dtype=np.int32)
+    np.cumsum(x, dtype=np.int32, out=prefix[taps:]) # wraps, like everything below
+    out = np.zeros(n, dtype=np.int32)
+    for j in np.flatnonzero(edges).tolist():
+        edge = int(edges[j])
+        if edge == 1:
+            out += prefix[j:j + n]
+        elif edge == -1:
+            out -= prefix[j:j + n]
+        else:
+            out += np.int32(edge) * prefix[j:j + n]
+    return out
+
+def fft_correlate(samples, coeffs, block: int | None = None) -> np.ndarray:
+    """axis_fir output by overlap-save FFT. block is the FFT length (default 8x the taps, a power of 2)."""
+    x = np.asarray(samples, dtype=np.float64)
+    h = np.asarray(coeffs, dtype=np.float64)[::-1]
+    taps = len(h)
+    n = len(x)
+    if block is None:
+        block = 1 << int(np.ceil(np.log2(8 * taps)))
+    if block < 2 * taps:
+        raise ValueError(f"block {block} is too short for {taps} taps")
+    step = block - taps + 1
+    H = np.fft.rfft(h, block)
+
+    padded = np.concatenate((np.zeros(taps - 1), x, np.zeros(step)))
+    out = np.empty(n, dtype=np.int64)
+    for start in range(0, n, step):
+        y = np.fft.irfft(np.fft.rfft(padded[start:start + block]) * H, block)
+        count = min(step, n - start)
+        out[start:start + count] = np.rint(y[taps - 1:taps - 1 + count])
+    return _to_int32(out)
+
+def direct_correlate(samples, coeffs) -> np.ndarray:
+    x = np.asarray(samples, dtype=np.int64)
+    h = np.asarray(coeffs, dtype=np.int64)[::-1]
+    return _to_int32(np.convolve(x, h)[:len(x)])
+
+def correlate(samples, coeffs, method: str = "auto") -> np.ndarray:
+    """axis_fir output for samples and int8 coeffs, by method 'boxcar', 'fft', 'direct' or 'auto'."""
+    coeffs = np.asarray(coeffs)
+    if method == "auto":
+        if 2 * np.count_nonzero(_edges(coeffs)) <= len(coeffs):
+            return boxcar_correlate(samples, *run_lengths(coeffs))
+        method = "fft" if len(coeffs) >= 64 and len(samples) >= 4 * len(coeffs) else "direct"
+    if method == "boxcar":
+        return boxcar_correlate(samples, *run_lengths(coeffs))
+    if method == "fft":
+        return fft_correlate(samples, coeffs)
+    if method == "direct":
+        return direct_correlate(samples, coeffs)
+    raise ValueError(f"unknown method {method!r}")
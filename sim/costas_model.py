@@ -0,0 +1,201 @@
+"""
+Costas loop models.
+
+costas_loop runs the floating point second order loop from costas_sim.py over
+a batch of configurations at once. The time axis is still a recurrence, but
+every step is a single array operation across the batch, so sweeping thousands
+of (alpha, beta, freq_offset, noise) settings costs about the same number of
+Python steps as running one.
+
+costas_fixed is a bit-exact model of hdl/costas.sv (same CORDIC table, gain,
+shifts and pipeline latency) that runs many independent streams the same way.
+CostasFixed is the same model as a stream that can be fed in chunks and
+checkpointed.
+"""
+from typing import NamedTuple
+import numpy as np
+import cordic
+
+class CostasResult(NamedTuple):
+    out: np.ndarray # derotated samples
+    error: np.ndarray
+    freq: np.ndarray
+    phase: np.ndarray # phase after the update, before wrapping to [0, 2pi) (same as phase_log)
+
+def costas_loop(samples, alpha, beta) -> CostasResult:
+    """
+    Run the 2nd order BPSK Costas loop.
+
+    samples is (num_samples,) or (batch, num_samples). alpha and beta are scalars
+    or (batch,) arrays and are broadcast against the batch axis. Every output is
+    (batch, num_samples).
+    """
+    samples = np.atleast_2d(np.asarray(samples, dtype=np.complex64))
+    alpha = np.asarray(alpha, dtype=np.float64)
+    beta = np.asarray(beta, dtype=np.float64)
+    batch = np.broadcast_shapes(samples.shape[:1], alpha.shape, beta.shape)[0]
+    samples = np.broadcast_to(samples, (batch, samples.shape[1]))
+    alpha = np.broadcast_to(alpha, (batch,))
+    beta = np.broadcast_to(beta, (batch,))
+
+    N = samples.shape[1]
+    out = np.empty((batch, N), dtype=np.complex64)
+    error_log = np.empty((batch, N), dtype=np.float64)
+    freq_log = np.empty((batch, N), dtype=np.float64)
+    phase_log = np.empty((batch, N), dtype=np.float64)
+
+    phase = np.zeros(batch)
+    freq = np.zeros(batch)
+    two_pi = 2 * np.pi
+    for i in range(N):
+        out[:, i] = samples[:, i] * np.exp(-1j * phase) # adjust the input sample by the inverse of the estimated phase offset
+        error = (out[:, i].real * out[:, i].imag).astype(np.float64) # error formula for 2nd order Costas Loop (BPSK)
+        # Advance the loop (recalc phase and freq offset)
+        freq += beta * error
+        phase += freq + alpha * error
+        error_log[:, i] = error
+        freq_log[:, i] = freq
+        phase_log[:, i] = phase
+        np.mod(phase, two_pi, out=phase)
+    return CostasResult(out, error_log, freq_log, phase_log)
+
+def generate_bpsk_batch(
+    num_samples: int,
+    freq_offset_hz,
+    noise_std=0.0,
+    samples_per_symbol: int = 1,
+    fs: float = 1_000_000.0,
+    seed: int | None = None,
+):
+    """
+    Batched version of generate_bpsk_with_freq_offset: one row per entry of the
+    broadcast (freq_offset_hz, noise_std) arrays. Each row gets its own symbols
+    and noise.
+    """
+    freq_offset_hz, noise_std = np.broadcast_arrays(np.atleast_1d(np.asarray(freq_offset_hz, dtype=np.float64)),
+                                                    np.atleast_1d(np.asarray(noise_std, dtype=np.float64)))
+    batch = len(freq_offset_hz)
+    rng = np.random.default_rng(seed)
+
+    num_symbols = int(np.ceil(num_samples / samples_per_symbol))
+    symbols = rng.choice([-1.0, +1.0], size=(batch, num_symbols))
+    bpsk_sequence = np.repeat(symbols, samples_per_symbol, axis=1)[:, :num_samples]
+
+    n = np.arange(num_samples)
+    phase = 2 * np.pi * freq_offset_hz[:, None] * n[None, :] / fs
+    iq = bpsk_sequence * np.exp(1j * phase)
+    noise = (rng.standard_normal((batch, num_samples)) + 1j * rng.standard_normal((batch, num_samples)))
+    iq += noise * noise_std[:, None]
+    return iq.astype(np.complex64)
+
+def costas_sweep(alpha, beta, freq_offset_hz, noise_std=0.0, num_samples: int = 250, fs: float = 19e3, seed: int | None = 0) -> CostasResult:
+    """
+    Run one Costas loop per configuration. All four parameters are broadcast
+    together, so passing a meshgrid of each sweeps the full grid in one call.
+    """
+    alpha, beta, freq_offset_hz, noise_std = (a.ravel() for a in np.broadcast_arrays(alpha, beta, freq_offset_hz, noise_std))
+    samples = generate_bpsk_batch(num_samples, freq_offset_hz, noise_std, fs=fs, seed=seed)
+    return costas_loop(samples, alpha, beta)
+
+# Fixed point model of hdl/costas.sv
+STAGES = cordic.STAGES
+# A sample accepted in clock c leaves stage STAGES in clock c + STAGES + 1 and its phase
+# update is visible to the input stage from clock c + STAGES + 2.
+PHASE_LATENCY = STAGES + 2
+
+class CostasFixedResult(NamedTuple):
+    x: np.ndarray # final_x[15:0], m00_axis_tdata[15:0]
+    y: np.ndarray # final_y[15:0], m00_axis_tdata[31:16]
+    error: np.ndarray
+    freq: np.ndarray # new_freq
+    phase: np.ndarray # new_phase
+
+class CostasFixed:
+    """
+    Bit-exact costas.sv as a stream: process() takes the next samples of every
+    channel and carries freq, phase and the last lag phases (the ones still in
+    the CORDIC pipeline) over to the next call. state() and restore() hand that
+    over as plain arrays, see checkpoint.py.
+    """
+    def __init__(self, channels: int = 1, valid_period: int = 1):
+        self.channels = channels
+        self.valid_period = valid_period
+        self.lag = -(-PHASE_LATENCY // valid_period)
+        self.reset()
+
+    def reset(self):
+        self.freq = np.zeros(self.channels, dtype=np.int64)
+        self.phase = np.zeros(self.channels, dtype=np.int64)
+        self.recent = np.zeros((self.channels, self.lag), dtype=np.int64) # phases of the last lag samples, oldest first
+        self.position = 0 # samples processed so far
+
+    def state(self) -> dict:
+        return dict(freq=self.freq.copy(), phase=self.phase.copy(), recent=self.recent.copy(), position=self.position,
+                    valid_period=self.valid_period)
+
+    def restore(self, state):
+        if int(state["valid_period"]) != self.valid_period or np.shape(state["freq"]) != (self.channels,):
+            raise ValueError("state is from a Costas loop with a different valid_period or channel count")
+        self.freq = np.array(state["freq"], dtype=np.int64)
+        self.phase = np.array(state["phase"], dtype=np.int64)
+        self.recent = np.array(state["recent"], dtype=np.int64)
+        self.position = int(state["position"])
+
+    def process(self, x, y) -> CostasFixedResult:
+        x = np.atleast_2d(np.asarray(x, dtype=np.int64))
+        y = np.atleast_2d(np.asarray(y, dtype=np.int64))
+        x, y = np.broadcast_arrays(x, y)
+        channels, N = x.shape
+        if channels != self.channels:
+            raise ValueError(f"expected {self.channels} channels, got {channels}")
+        lag = self.lag
+
+        out_x = np.empty((channels, N), dtype=np.int16)
+        out_y = np.empty((channels, N), dtype=np.int16)
+        error_log = np.empty((channels, N), dtype=np.int32)
+        freq_log = np.empty((channels, N), dtype=np.int32)
+        # phases[:, lag + k] is the phase after sample k, the ones before are carried over
+        phases = np.empty((channels, lag + N), dtype=np.int64)
+        phases[:, :lag] = self.recent
+
+        freq = self.freq
+        phase = self.phase
+        for k in range(N):
+            # The input stage rotates by -phase, folding into the right half plane past +-90 degrees.
+            used_phase = phases[:, k]
+            final_x, final_y = cordic.rotate_fixed(x[:, k], y[:, k], -used_phase)
+            error = cordic.wrap(final_x * final_y, 32)
+            beta_error = cordic.wrap(error * 20, 32) >> 10
+            freq = cordic.wrap(freq + beta_error, 32)
+            unscaled_new_phase = cordic.wrap(freq + (error >> 1), 32)
+            phase_inc = cordic.wrap((unscaled_new_phase * 11) >> 10, 16)
+            phase = cordic.wrap(phase + phase_inc, 16)
+
+            out_x[:, k] = cordic.wrap(final_x, 16)
+            out_y[:, k] = cordic.wrap(final_y, 16)
+            error_log[:, k] = error
+            freq_log[:, k] = freq
+            phases[:, lag + k] = phase
+
+        self.freq = np.asarray(freq, dtype=np.int64)
+        self.phase = np.asarray(phase, dtype=np.int64)
+        self.recent = phases[:, N:].copy()
+        self.position += N
+        return CostasFixedResult(out_x, out_y, error_log, freq_log, phases[:, lag:].astype(np.int16))
+
+def costas_fixed(x, y, valid_period: int = 1) -> CostasFixedResult:
+    """
+    Bit-exact costas.sv on one or more independent streams.
+
+    x and y are the signed 16-bit I and Q inputs, shaped (num_samples,) or
+    (channels, num_samples). Each time step is one array operation over the
+    channel axis.
+
+    valid_period is the number of clocks between accepted samples (1 for a
+    continuous stream, 18 for the write_single + pause 16 pattern in
+    test_costas.py). The loop state is always updated in sample order, but
+    the phase fed into the CORDIC comes from ceil(PHASE_LATENCY / valid_period)
+    samples back, because the pipeline is STAGES deep.
+    """
+    x, y = np.broadcast_arrays(np.atleast_2d(x), np.atleast_2d(y))
+    return CostasFixed(len(x), valid_period).process(x, y)
@@ -1,6 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation, PillowWriter
+from costas_model import costas_loop
 
 rng = np.random.default_rng(0)
 
@@ -12,7 +13,7 @@ def generate_bpsk_with_freq_offset(
     noise_std: float = 0.0,
     seed: int | None = None,
 ):
-    rng = np.random.default_rng(0)
+    rng = np.random.default_rng(seed)
 
     num_symbols = int(np.ceil(num_samples / samples_per_symbol))
     symbols = rng.choice([-1.0, +1.0], size=num_symbols)
@@ -41,7 +42,8 @@ samples = generate_bpsk_with_freq_offset(
     samples_per_symbol=1,
     freq_offset_hz=300,   # simulate a 200 Hz offset
     fs=sample_rate,
-    noise_std=0
+    noise_std=0,
+    seed=0
 )
 
 
@@ -70,40 +72,20 @@ plt.show()
 # anim.save(gif_path, writer=PillowWriter(fps=20))
 
 
-N = len(samples)
-phase = 0
-freq = 0
 # These next two params is what to adjust, to make the feedback loop faster or slower (which impacts stability)
 alpha = 0.5
 beta = 0.02
-out = np.zeros(N, dtype=np.complex64)
-freq_log = []
-error_log = []
-phase_log = []
-phase_change_log = []
-for i in range(N):
-    out[i] = samples[i] * np.exp(-1j*phase) # adjust the input sample by the inverse of the estimated phase offset
-    error = np.real(out[i]) * np.imag(out[i]) # This is the error formula for 2nd order Costas Loop (e.g. for BPSK)
-
-    # Advance the loop (recalc phase and freq offset)
-    freq += (beta * error)
-    freq_log.append(freq) # convert from angular velocity to Hz for logging
-
-
-    phase_change_log.append(freq + (alpha * error))
-
-    phase += freq + (alpha * error)
-    phase_log.append(phase)
-    error_log.append(error)
-
-    if i < 5:
-        print(f"original {samples[i]:.6f} rot {out[i]:.6f}, error {error_log[i]:.6f}, freq {freq_log[i]:.6f}, phase {phase_log[i]:.6f}")
-
-    # Optional: Adjust phase so its always between 0 and 2pi, recall that phase wraps around every 2pi
-    while phase >= 2*np.pi:
-        phase -= 2*np.pi
-    while phase < 0:
-        phase += 2*np.pi
+# costas_model.costas_sweep runs a whole grid of these at once
+result = costas_loop(samples, alpha, beta)
+out = result.out[0]
+error_log = result.error[0]
+freq_log = result.freq[0]
+phase_log = result.phase[0]
+phase_change_log = freq_log + alpha * error_log
+N = len(samples)
+
+for i in range(5):
+    print(f"original {samples[i]:.6f} rot {out[i]:.6f}, error {error_log[i]:.6f}, freq {freq_log[i]:.6f}, phase {phase_log[i]:.6f}")
 x = out
 
 print(samples[0])
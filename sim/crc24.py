@@ -0,0 +1,129 @@
+"""
+ADS-B CRC-24 parity check and 1/2-bit error correction, on arrays of squitters.
+
+The decoder emits 128-bit frames, first received bit in the MSB; an ADS-B
+extended squitter is the first 112 of them, 88 data bits then 24 parity bits.
+The syndrome of a message is CRC-24 of the data bytes XOR the parity field,
+i.e. the remainder of the whole 112-bit message divided by the generator; it is
+0 for an intact message.
+
+The CRC runs a byte at a time through a 256-entry table, one byte column at a
+time over the whole batch, so the Python loop is 11 steps long whatever the
+number of squitters. CRC-24 is linear, so the syndrome of a damaged message
+only depends on which bits flipped. _error_table() lists the syndrome of every
+1-bit and 2-bit error pattern once, and correct() looks the syndromes of a batch
+up in it with one searchsorted. Syndromes that more than one pattern produces
+are left out, those messages are reported as uncorrectable.
+
+    result = correct(squitter_ints)   # or DecodeResult.bits
+    good = result.message[result.errors >= 0]
+"""
+from functools import lru_cache
+from itertools import combinations
+from typing import NamedTuple
+import numpy as np
+import bpsk_model
+
+GENERATOR = 0x1FFF409 # x^24 + x^23 + ... + x^3 + 1, the Mode S parity polynomial
+MESSAGE_BITS = 112 # extended squitter
+PARITY_BITS = 24
+
+def _make_table() -> np.ndarray:
+    table = np.zeros(256, dtype=np.uint32)
+    for byte in range(256):
+        crc = byte << 16
+        for _ in range(8):
+            crc = (crc << 1) ^ GENERATOR if crc & 0x800000 else crc << 1
+        table[byte] = crc & 0xFFFFFF
+    return table
+
+_TABLE = _make_table()
+
+class CrcResult(NamedTuple):
+    message: np.ndarray # (n, message_bits // 8) uint8, corrected where possible
+    syndrome: np.ndarray # uint32 before correction, 0 if the parity matched
+    errors: np.ndarray # int8, bits corrected (0, 1 or 2), -1 if the message could not be repaired
+
+def message_bytes(squitters, message_bits: int = MESSAGE_BITS, frame_bits: int = bpsk_model.SQUITTER_LENGTH) -> np.ndarray:
+    """
+    First message_bits of each frame as (n, message_bits // 8) uint8. squitters
+    is a list of frame ints (m00_axis_tdata, squitter_ints) or an (n, frame_bits)
+    bit array (DecodeResult.bits).
+    """
+    if isinstance(squitters, np.ndarray) and squitters.ndim == 2:
+        return np.packbits(squitters[:, :message_bits].astype(np.uint8), axis=1)
+    shift = frame_bits - message_bits
+    data = b"".join((int(s) >> shift).to_bytes(message_bits // 8, "big") for s in squitters)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, message_bits // 8)
+
+def crc24(data) -> np.ndarray:
+    """CRC-24 (Mode S generator, no reflection, zero init) of every row of an (n, k) uint8 array."""
+    data = np.asarray(data, dtype=np.uint8)
+    crc = np.zeros(len(data), dtype=np.uint32)
+    for column in data.T:
+        crc = ((crc << 8) & 0xFFFFFF) ^ _TABLE[(crc >> 16) ^ column]
+    return crc
+
+def syndrome(messages) -> np.ndarray:
+    """Data CRC XOR parity for every row of (n, bytes) messages, 0 if intact."""
+    messages = np.asarray(messages, dtype=np.uint8)
+    data, parity = messages[:, :-PARITY_BITS // 8], messages[:, -PARITY_BITS // 8:].astype(np.uint32)
+    return crc24(data) ^ (parity[:, 0] << 16 | parity[:, 1] << 8 | parity[:, 2])
+
+def check(squitters, message_bits: int = MESSAGE_BITS) -> np.ndarray:
+    """True for every squitter whose parity matches."""
+    return syndrome(message_bytes(squitters, message_bits)) == 0
+
+@lru_cache(maxsize=None)
+def _error_table(message_bits: int = MESSAGE_BITS, max_errors: int = 2):
+    """
+    (syndromes, positions): sorted syndromes of every error pattern of up to
+    max_errors bits that no other such pattern shares, and the bit positions
+    (0 = first bit of the message) it flips, -1 padded.
+    """
+    nbytes = message_bits // 8
+    single = np.zeros((message_bits, nbytes), dtype=np.uint8)
+    single[np.arange(message_bits), np.arange(message_bits) // 8] = 0x80 >> (np.arange(message_bits) % 8)
+    single_syndromes = syndrome(single)
+
+    patterns = [np.arange(message_bits)[:, None]]
+    syndromes = [single_syndromes]
+    if max_errors >= 2:
+        pairs = np.array(list(combinations(range(message_bits), 2)), dtype=np.int64)
+        patterns.append(pairs)
+        syndromes.append(single_syndromes[pairs[:, 0]] ^ single_syndromes[pairs[:, 1]])
+    if max_errors > 2:
+        raise ValueError("only 1 and 2-bit errors are tabulated")
+
+    positions = np.full((sum(len(p) for p in patterns), max_errors), -1, dtype=np.int64)
+    row = 0
+    for p in patterns:
+        positions[row:row + len(p), :p.shape[1]] = p
+        row += len(p)
+    syndromes = np.concatenate(syndromes)
+    order = np.argsort(syndromes, kind="stable")
+    syndromes, positions = syndromes[order], positions[order]
+    _, first, counts = np.unique(syndromes, return_index=True, return_counts=True)
+    unique = first[counts == 1]
+    return syndromes[unique], positions[unique]
+
+def correct(squitters, max_errors: int = 2, message_bits: int = MESSAGE_BITS) -> CrcResult:
+    """Check every squitter and repair the ones with max_errors or fewer flipped bits."""
+    message = message_bytes(squitters, message_bits).copy()
+    s = syndrome(message)
+    errors = np.zeros(len(message), dtype=np.int8)
+    bad = np.flatnonzero(s)
+    if len(bad) == 0 or max_errors == 0:
+        errors[bad] = -1
+        return CrcResult(message, s, errors)
+
+    table, positions = _error_table(message_bits, max_errors)
+    at = np.minimum(np.searchsorted(table, s[bad]), len(table) - 1)
+    found = table[at] == s[bad]
+    errors[bad[~found]] = -1
+    rows, flips = bad[found], positions[at[found]]
+    errors[rows] = np.count_nonzero(flips >= 0, axis=1)
+    for column in flips.T:
+        hit = column >= 0
+        np.bitwise_xor.at(message, (rows[hit], column[hit] // 8), (0x80 >> (column[hit] % 8)).astype(np.uint8))
+    return CrcResult(message, s, errors)
@@ -0,0 +1,123 @@
+"""
+Polyphase decimating FIR for int8 taps (lowpass.lowpass_coeffs by default).
+
+Output m is the axis_fir output after input sample m * rate, i.e.
+sum_i coeffs[i] * x[m*rate - (N-1) + i] with zeros before the first sample, so
+rate 1 is exactly axis_fir and every other rate keeps one output in rate of it.
+The taps are split into rate phases of ceil(N / rate) taps and each phase runs
+on its own 1-in-rate slice of the input, so nothing is computed for the
+outputs that are dropped: the cost per input sample is N / rate multiplies.
+
+exact=True gives the fixed-point result: the sum wraps to int32 like the RTL
+and, with shift, is shifted right and saturated to int16. It is computed in
+float64 when the sums provably stay below 2^53 (always the case for int16
+samples), which is exact and faster than int64. exact=False gives the float64
+sum scaled by 2^-shift, with no wrapping, rounding or saturation.
+
+A Decimator keeps the last N - 1 inputs and the input count, so a stream can be
+fed in chunks of any size, including ones that don't divide by the rate.
+state() and restore() hand those over as plain arrays (see checkpoint.py).
+
+    lp = Decimator(rate=4, shift=LOWPASS_SHIFT)
+    for chunk in capture.chunks():
+        y = lp.process(chunk.i)
+"""
+import numpy as np
+import correlator
+import lowpass
+
+RATES = (1, 2, 4, 8) # rates the reduced-rate decoder studies use, any positive integer works
+LOWPASS_SHIFT = 7 # lowpass_coeffs sum to 103, >> 7 keeps the gain just under 1
+_FLOAT_EXACT = 2 ** 53
+
+class Decimator:
+    def __init__(self, coeffs=lowpass.lowpass_coeffs, rate: int = 1, exact: bool = True, shift: int | None = None):
+        if rate < 1:
+            raise ValueError(f"rate must be a positive integer, got {rate}")
+        self.coeffs = np.asarray(coeffs, dtype=np.int8)
+        self.rate = int(rate)
+        self.exact = exact
+        self.shift = shift
+        taps = len(self.coeffs)
+        self.phase_taps = -(-taps // self.rate)
+        # phases[j, p] = coeffs[j*rate + p], zero padded to a whole number of rows
+        padded = np.zeros(self.phase_taps * self.rate, dtype=np.int64)
+        padded[:taps] = self.coeffs
+        self.phases = padded.reshape(self.phase_taps, self.rate)
+        self.reset()
+
+    def reset(self):
+        """Back to empty registers, as before the first sample."""
+        self.history = np.zeros(max(len(self.coeffs) - 1, 0), dtype=np.float64 if not self.exact else np.int64)
+        self.position = 0 # inputs consumed so far
+        self._dtype = np.dtype(np.int8) # widest sample type seen, decides whether float64 is exact
+
+    def state(self) -> dict:
+        return dict(history=self.history.copy(), position=self.position, dtype=self._dtype.str, rate=self.rate,
+                    taps=len(self.coeffs))
+
+    def restore(self, state):
+        if int(state["rate"]) != self.rate or int(state["taps"]) != len(self.coeffs):
+            raise ValueError("state is from a Decimator with a different rate or number of taps")
+        self.history = np.array(state["history"], dtype=self.history.dtype)
+        self.position = int(state["position"])
+        self._dtype = np.dtype(str(state["dtype"]))
+
+    @property
+    def delay(self) -> float:
+        """Group delay of the linear phase taps, in input samples."""
+        return (len(self.coeffs) - 1) / 2
+
+    def process(self, x) -> np.ndarray:
+        """Filter the next chunk of the stream and return the outputs that fall in it."""
+        x = np.asarray(x)
+        if self.exact and x.dtype.kind not in "iu":
+            raise TypeError(f"exact decimation needs integer samples, got {x.dtype}")
+        taps = len(self.coeffs)
+        R = self.rate
+        pos = self.position
+        self._dtype = np.result_type(self._dtype, x.dtype)
+        ext = np.concatenate((self.history, x)) # ext[a] is input pos - (taps - 1) + a
+        first = -pos % R # offset in x of the first input that has an output
+        outputs = max(0, -(-(len(x) - first) // R))
+
+        if taps > 1:
+            self.history = ext[len(ext) - (taps - 1):]
+        self.position += len(x)
+        if outputs == 0:
+            return self._finish(np.zeros(0, dtype=np.float64 if self._use_float() else np.int64))
+
+        # Output for input k uses ext[k - pos : k - pos + taps]
+        rows = outputs + self.phase_taps - 1
+        window = ext[first:first + rows * R]
+        dtype = np.float64 if self._use_float() else np.int64
+        block = np.zeros(rows * R, dtype=dtype)
+        block[:len(window)] = window
+        block = block.reshape(rows, R)
+        y = np.zeros(outputs, dtype=dtype)
+        phases = self.phases.astype(dtype)
+        for p in range(R):
+            if phases[:, p].any():
+                y += np.correlate(block[:, p], phases[:, p], "valid")
+        return self._finish(y)
+
+    def _use_float(self) -> bool:
+        if not self.exact:
+            return True
+        if self._dtype.itemsize > 4:
+            return False
+        bound = int(np.iinfo(self._dtype).max + 1) * int(np.abs(self.coeffs.astype(np.int64)).sum())
+        return bound < _FLOAT_EXACT
+
+    def _finish(self, y) -> np.ndarray:
+        if not self.exact:
+            return y * 2.0 ** -self.shift if self.shift else y
+        y = correlator._to_int32(np.rint(y) if y.dtype.kind == "f" else y)
+        if self.shift is None:
+            return y
+        return np.clip(y.astype(np.int64) >> self.shift, -32768, 32767).astype(np.int16)
+
+def decimate(samples, coeffs=lowpass.lowpass_coeffs, rate: int = 1, exact: bool = True,
+             shift: int | None = None) -> np.ndarray:
+    """Decimate a whole array in one go (a fresh Decimator)."""
+    return Decimator(coeffs, rate, exact, shift).process(samples)
@@ -0,0 +1,77 @@
+"""
+Packing and unpacking of the 32-bit IQ words used on every AXIS port:
+I (or x) in [15:0], Q (or y) in [31:16], both signed 16-bit.
+
+All functions take whole arrays (scalars work too and come back as NumPy
+scalars). Packing writes int16 I/Q pairs into one buffer and views it as
+uint32, and unpacking a uint32 array returns int16 views into it, so neither
+direction copies the capture more than once.
+
+Scaling conventions used by the testbenches:
+    RAW_SCALE            ADC samples, test_bpsk_decode.py
+    COSTAS_INPUT_SCALE   x1000 into costas (test_costas.py)
+    COSTAS_OUTPUT_SCALE  costas outputs read back as /GAIN (1 << 10)
+    Q15_SCALE            2^15 both ways (test_cordic_rotate.py)
+"""
+import numpy as np
+
+RAW_SCALE = 1
+COSTAS_INPUT_SCALE = 1000
+COSTAS_OUTPUT_SCALE = 1 << 10
+Q15_SCALE = 1 << 15
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+def _scalar(a):
+    """Return 0-d arrays as NumPy scalars, anything else unchanged."""
+    return a[()] if isinstance(a, np.ndarray) and a.ndim == 0 else a
+
+def to_signed(x, bits: int = 32):
+    """Reinterpret the low bits of x as a signed two's complement value (twos_to_int, uint32_to_int32)."""
+    x = np.asarray(x)
+    if bits in (8, 16, 32, 64) and x.dtype.kind == "u" and x.dtype.itemsize * 8 == bits:
+        return _scalar(x.view(np.dtype(f"i{bits // 8}")))
+    x = x.astype(np.int64) & ((1 << bits) - 1)
+    return _scalar(np.where(x >= (1 << (bits - 1)), x - (1 << bits), x))
+
+def iq_pairs(words) -> np.ndarray:
+    """
+    (..., 2) int16 array of a uint32 word array: [..., 0] is I (bits 15:0), [..., 1]
+    is Q (bits 31:16). A view on little endian hosts, a native copy elsewhere.
+    """
+    words = np.ascontiguousarray(words, dtype="<u4")
+    return words.view("<i2").reshape(words.shape + (2,)).astype(np.int16, copy=False)
+
+def pack_iq(i, q) -> np.ndarray:
+    """
+    Pack integer I/Q into uint32 words, saturating to int16 (format_input,
+    format_iq_data on integer data).
+    """
+    i, q = np.broadcast_arrays(np.asarray(i), np.asarray(q))
+    pairs = np.empty(i.shape + (2,), dtype="<i2")
+    np.clip(i, INT16_MIN, INT16_MAX, out=pairs[..., 0], casting="unsafe")
+    np.clip(q, INT16_MIN, INT16_MAX, out=pairs[..., 1], casting="unsafe")
+    return _scalar(pairs.view("<u4").reshape(i.shape).astype(np.uint32, copy=False))
+
+def pack_complex(iq, scale=RAW_SCALE) -> np.ndarray:
+    """
+    Pack complex samples as int(clip(iq * scale)) per component, i.e. saturate
+    then truncate toward zero, the same as format_iq_data / format_costas_sample_data.
+    """
+    iq = np.asarray(iq) * scale
+    return pack_iq(iq.real, iq.imag) # the float -> int16 cast after clipping truncates
+
+def unpack_iq(words):
+    """Split words into signed (I, Q) (parse_input). uint32 arrays come back as int16 views."""
+    words = np.asarray(words)
+    if words.dtype == np.uint32 and words.ndim > 0:
+        pairs = iq_pairs(words)
+        return pairs[..., 0], pairs[..., 1]
+    words = words.astype(np.int64)
+    return to_signed(words, 16), to_signed(words >> 16, 16)
+
+def unpack_complex(words, scale=COSTAS_OUTPUT_SCALE):
+    """Words to complex I + jQ divided by scale (decode_costas_data)."""
+    i, q = unpack_iq(words)
+    return _scalar(np.asarray(i) / scale + 1j * (np.asarray(q) / scale))
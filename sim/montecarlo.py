@@ -0,0 +1,193 @@
+"""
+Monte Carlo bit and packet error rates for the bpsk_decoder chain.
+
+Each trial is one burst (ADS-B preamble + SQUITTER_LENGTH random BPSK bits, at
+SAMPLES_PER_SYMBOL samples per symbol) in complex noise, with a carrier offset
+and a timing offset. The I channel is quantized to int16 and decoded with
+bpsk_model, the bit-exact model of the RTL. Bursts of a batch are laid end to
+end with noise gaps in between and decoded as one continuous stream, so a false
+trigger in the noise can cost the decoder the real burst, same as in hardware.
+
+A sweep is split into (point, batch) tasks that run on a process pool. Every
+task gets its own child of one SeedSequence, so the result only depends on the
+seed and the batch size, not on the number of workers.
+
+    python montecarlo.py                      # small SNR sweep, prints a table
+
+SNR is per sample on the I channel: amplitude^2 / noise_std^2, with noise_std
+the standard deviation of each of I and Q.
+
+The rates depend as much on the carrier phase, the amplitude and the carrier
+offset as on the SNR. Only I is decoded, so the burst arrives at amplitude *
+cos(phase), and the matched filter threshold only separates the peak from its
+sidelobes inside a narrow band of amplitudes (see AMPLITUDE). Every burst gets a
+random carrier phase by default (phase=None), which is what a receiver sees; at
+20 dB that detects roughly one burst in ten, while phase=0.0 at AMPLITUDE
+detects all of them, amplitude=2000 at phase=0.0 almost none, and a 50 kHz
+offset none at all. Quote the phase, amplitude and offset with any result.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import numpy as np
+import bpsk_model
+from bpsk_model import SAMPLES_PER_SYMBOL, SQUITTER_LENGTH, PREAMBLE_DETECTOR_THRESHOLD
+
+FS = 64e6 # capture sample rate (adsb_squitters_fake_50dbm_64MSPS_iq.np)
+# int16 counts. The detector fires on any local extreme past the threshold, and the +-1 preamble
+# has autocorrelation sidelobes up to 497/512 of the peak, so only amplitudes between
+# 500000/512 (peak reaches the threshold) and 500000/497 (sidelobes stay under it) decode cleanly.
+# That is the amplitude on I, so it only holds at carrier phase 0.
+AMPLITUDE = 990
+GAP = 1024 # noise samples before each burst, more than the 512-tap filter
+
+class Trials(NamedTuple):
+    trials: int
+    detected: int # bursts with a squitter decoded at the right position
+    packet_errors: int # missed bursts plus bursts with any bit wrong
+    bit_errors: int # over detected bursts
+    bits: int # bits compared, detected * SQUITTER_LENGTH
+
+class SweepPoint(NamedTuple):
+    snr_db: float
+    freq_offset_hz: float
+    timing_offset: float
+    trials: int
+    detection: float
+    ber: float
+    ber_ci: tuple # (low, high)
+    per: float
+    per_ci: tuple
+
+def wilson_interval(k, n, z: float = 1.96):
+    """Wilson score interval for k successes in n trials (95% by default)."""
+    if n == 0:
+        return (0.0, 1.0)
+    p = k / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return (max(0.0, float(centre - half)), min(1.0, float(centre + half)))
+
+def burst_waveform(bits) -> np.ndarray:
+    """+1/-1 baseband for the preamble followed by bits (1 -> +1), one row per burst."""
+    bits = np.atleast_2d(bits)
+    preamble = np.broadcast_to(bpsk_model.preamble_coeffs().astype(np.float64), (len(bits), 512))
+    data = np.repeat(2.0 * bits - 1.0, SAMPLES_PER_SYMBOL, axis=1)
+    return np.concatenate((preamble, data), axis=1)
+
+def make_stream(bits, snr_db, freq_offset_hz=0.0, timing_offset=0.0, clock_offset_ppm=0.0, phase=None,
+                rng=None, amplitude=AMPLITUDE, fs=FS, gap=GAP):
+    """
+    int16 I channel with one burst per row of bits, each after gap noise samples.
+
+    timing_offset delays each burst by a (possibly fractional) number of samples,
+    clock_offset_ppm stretches it like a transmitter clock error, both by linear
+    interpolation of the waveform. phase is the carrier phase at the start of
+    each burst, None (the default) for a random phase per burst. Returns
+    (samples, peaks), the index of the last preamble sample of every burst.
+    """
+    rng = np.random.default_rng(rng)
+    bits = np.atleast_2d(bits)
+    base = burst_waveform(bits)
+    burst_len = base.shape[1]
+    frame = gap + burst_len + int(np.ceil(abs(timing_offset))) + int(burst_len * abs(clock_offset_ppm) * 1e-6) + 2
+    n = np.arange(frame - gap)
+    t = n * (1 + clock_offset_ppm * 1e-6) - timing_offset # transmitter time of each receiver sample
+    phases = rng.uniform(0, 2 * np.pi, len(bits)) if phase is None else np.full(len(bits), phase)
+
+    grid = np.arange(burst_len)
+    stream = np.zeros((len(bits), frame), dtype=np.complex128)
+    for row in range(len(bits)):
+        stream[row, gap:] = np.interp(t, grid, base[row], left=0.0, right=0.0)
+    carrier = np.exp(1j * (2 * np.pi * freq_offset_hz * np.arange(frame) / fs + phases[:, None]))
+    stream *= amplitude * carrier
+
+    noise_std = amplitude / np.sqrt(10 ** (np.asarray(snr_db, dtype=np.float64) / 10))
+    stream += noise_std * (rng.standard_normal(stream.shape) + 1j * rng.standard_normal(stream.shape))
+    samples = np.clip(np.rint(stream.real), -32768, 32767).astype(np.int16).ravel()
+
+    # Sample where the burst's last preamble sample lands, rounded to the nearest
+    last_preamble = (511 + timing_offset) / (1 + clock_offset_ppm * 1e-6)
+    peaks = np.arange(len(bits)) * frame + gap + int(np.rint(last_preamble))
+    return samples, peaks
+
+def run_trials(num_trials, snr_db, freq_offset_hz=0.0, timing_offset=0.0, clock_offset_ppm=0.0, phase=None,
+               seed=None, threshold=PREAMBLE_DETECTOR_THRESHOLD, amplitude=AMPLITUDE, fs=FS) -> Trials:
+    """Decode num_trials random bursts and count errors against what was sent."""
+    rng = np.random.default_rng(seed)
+    bits = rng.integers(0, 2, size=(num_trials, SQUITTER_LENGTH), dtype=np.uint8)
+    samples, peaks = make_stream(bits, snr_db, freq_offset_hz, timing_offset, clock_offset_ppm, phase, rng,
+                                 amplitude, fs)
+    result = bpsk_model.bpsk_decode(samples, threshold=threshold)
+
+    # Match each burst to the decode triggered closest to its preamble end
+    tolerance = SAMPLES_PER_SYMBOL // 2
+    detected = 0
+    packet_errors = 0
+    bit_errors = 0
+    if len(result.position):
+        nearest = np.clip(np.searchsorted(result.position, peaks), 1, len(result.position)) - 1
+        candidates = np.stack((nearest, np.minimum(nearest + 1, len(result.position) - 1)))
+        distance = np.abs(result.position[candidates] - peaks)
+        pick = candidates[np.argmin(distance, axis=0), np.arange(num_trials)]
+        found = np.min(distance, axis=0) <= tolerance
+        errors = np.count_nonzero(result.bits[pick] != bits, axis=1)[found]
+        detected = int(np.count_nonzero(found))
+        bit_errors = int(errors.sum())
+        packet_errors = num_trials - detected + int(np.count_nonzero(errors))
+    else:
+        packet_errors = num_trials
+    return Trials(num_trials, detected, packet_errors, bit_errors, detected * SQUITTER_LENGTH)
+
+def _run_task(args):
+    kwargs, num_trials, seed = args
+    return run_trials(num_trials, seed=seed, **kwargs)
+
+def sweep(snr_db, freq_offset_hz=0.0, timing_offset=0.0, num_trials: int = 1000, batch: int = 200,
+          seed: int = 0, workers: int | None = None, **kwargs) -> list:
+    """
+    Error rates over the broadcast grid of snr_db, freq_offset_hz and
+    timing_offset, num_trials bursts per point in batches of batch. Extra
+    keyword arguments (clock_offset_ppm, phase, amplitude, threshold, ...) go
+    to run_trials; phase defaults to random per burst. Returns one SweepPoint per grid point, in grid order.
+    """
+    grid = [a.ravel() for a in np.broadcast_arrays(snr_db, freq_offset_hz, timing_offset)]
+    points = list(zip(*(g.tolist() for g in grid)))
+    sizes = [batch] * (num_trials // batch) + ([num_trials % batch] if num_trials % batch else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(points) * len(sizes))
+    tasks = []
+    for i, (snr, freq, timing) in enumerate(points):
+        point_kwargs = dict(kwargs, snr_db=snr, freq_offset_hz=freq, timing_offset=timing)
+        tasks.extend((point_kwargs, size, seeds[i * len(sizes) + j]) for j, size in enumerate(sizes))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        counts = list(map(_run_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(_run_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+
+    results = []
+    for i, point in enumerate(points):
+        total = Trials(*np.sum(counts[i * len(sizes):(i + 1) * len(sizes)], axis=0).tolist())
+        ber = total.bit_errors / total.bits if total.bits else float("nan")
+        per = total.packet_errors / total.trials
+        results.append(SweepPoint(*point, total.trials, total.detected / total.trials,
+                                  ber, wilson_interval(total.bit_errors, total.bits),
+                                  per, wilson_interval(total.packet_errors, total.trials)))
+    return results
+
+def format_table(points) -> str:
+    lines = [f"{'SNR dB':>7} {'offset Hz':>10} {'timing':>7} {'trials':>7} {'detect':>7} "
+             f"{'BER':>10} {'BER 95% CI':>23} {'PER':>7} {'PER 95% CI':>17}"]
+    for p in points:
+        lines.append(f"{p.snr_db:7.1f} {p.freq_offset_hz:10.0f} {p.timing_offset:7.2f} {p.trials:7d} {p.detection:7.3f} "
+                     f"{p.ber:10.2e} [{p.ber_ci[0]:9.2e}, {p.ber_ci[1]:9.2e}] {p.per:7.3f} "
+                     f"[{p.per_ci[0]:.3f}, {p.per_ci[1]:.3f}]")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    points = sweep(snr_db=np.arange(0, 25, 4), num_trials=400)
+    print(f"amplitude {AMPLITUDE}, random carrier phase per burst, no carrier or timing offset")
+    print(format_table(points))
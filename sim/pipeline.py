@@ -0,0 +1,507 @@
+"""
+Streaming software receiver, a fallback for when the FPGA isn't there.
+
+Stages, one worker thread each, linked by bounded queues:
+
+    source      capture chunks (memmap reads, I channel)
+    lowpass     lowpass.lowpass_coeffs FIR (correlator), >> LOWPASS_SHIFT back to int16
+    matched     512-tap preamble matched filter (correlator)
+    detector    preamble_detector trigger logic
+    decoder     sample_decoder bit slicer, emits squitters
+
+Every stage keeps the state it needs between blocks (filter history, the last
+two filter outputs, the decoder's idle clock and unfinished squitters), so the
+result does not depend on the chunk size. With lowpass=False the output is
+bit-identical to bpsk_model.bpsk_decode on the whole capture; with the lowpass
+it matches bpsk_decode on the lowpass output, with positions moved back by the
+filter delay so they refer to capture samples.
+
+The lowpass scales the signal by its gain, sum(lowpass_coeffs) / 2**LOWPASS_SHIFT
+(103 / 128), and the matched filter output with it, so the detector threshold is
+scaled by the same gain. threshold is always given at the capture's scale, the
+one bpsk_decoder_wrapper.v uses.
+
+The heavy work in each stage is NumPy on whole blocks, which releases the GIL,
+so the stages overlap on a multi-core machine. The two filters are the heavy
+stages; with workers > 1 each of them hands its blocks, with the taps - 1
+samples before them, to that many threads and puts the outputs back in order.
+The bounded queues keep memory flat: a slow stage backs the source up instead
+of buffering the capture.
+
+With a checkpoint path the source sends a marker down the queues every
+checkpoint_every samples; each stage adds its state() to it as it passes, and
+the sink saves those together with the squitters so far (checkpoint.py). A run
+given an existing checkpoint restores the stages and carries on from the
+marker, and ends with the same result as one that never stopped.
+
+    python pipeline.py real_data_jimmy.npy imag_data_jimmy.npy
+    python pipeline.py capture.npy --no-lowpass --chunk 16384
+    python pipeline.py capture.npy --workers 4     # threads per filter stage
+    python pipeline.py capture.npy --store day.sq     # also keep them (squitter_store.py)
+    python pipeline.py capture.npy --checkpoint day.ckpt.npz   # rerun the same line to resume
+"""
+import argparse
+import collections
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from pathlib import Path
+import numpy as np
+import bpsk_model
+import checkpoint
+import correlator
+import crc24
+import lowpass
+from capture import Capture
+from decimator import LOWPASS_SHIFT
+from squitter_store import SquitterStore
+
+FS = 64e6 # capture sample rate the FPGA runs at
+QUEUE_DEPTH = 8 # blocks between two stages
+CHECKPOINT_EVERY = 1 << 24 # samples, about a quarter of a second at FS
+_DONE = None # end of stream marker on the queues
+
+class _Mark(NamedTuple):
+    """Checkpoint marker: every block before it is in the states of the stages it has passed."""
+    position: int # samples from the run's start that came before the marker
+    states: dict
+
+class Block(NamedTuple):
+    start: int # stream index of samples[0]
+    samples: np.ndarray # int16 I channel
+    filtered: np.ndarray | None = None # matched filter output for samples
+    triggers: np.ndarray | None = None # stream indices where preamble_detector fired
+    polarity: np.ndarray | None = None # per trigger
+    peak: np.ndarray | None = None # per trigger
+
+class StageStats(NamedTuple):
+    name: str
+    blocks: int
+    busy: float # seconds spent in the stage's own work
+    max_depth: int # deepest the input queue got
+    mean_depth: float # input queue depth averaged over the blocks taken from it
+    workers: int = 1 # threads the blocks were spread over, busy is summed over them
+
+class PipelineStats(NamedTuple):
+    samples: int
+    wall_time: float
+    samples_per_sec: float
+    realtime: float # samples_per_sec / FS, > 1 keeps up with the FPGA's input rate
+    stages: list
+
+class FirStage:
+    """
+    axis_fir on a stream: keeps the last taps - 1 inputs as history for the next
+    block. With shift the output is >> shift and saturated to int16 (the lowpass).
+    """
+    def __init__(self, coeffs, shift: int | None = None):
+        self.coeffs = np.asarray(coeffs, dtype=np.int8)
+        self.shift = shift
+        self.history = np.zeros(0, dtype=np.int16)
+
+    def extend(self, x) -> np.ndarray:
+        """x with the history in front, all that apply() needs; moves the history on."""
+        ext = np.concatenate((self.history, x))
+        keep = len(self.coeffs) - 1
+        self.history = ext[-keep:] if keep else self.history
+        return ext
+
+    def apply(self, ext, n: int) -> np.ndarray:
+        """Output for the last n samples of ext. Uses no state, so blocks can run on any thread."""
+        y = correlator.correlate(ext, self.coeffs)[len(ext) - n:]
+        if self.shift is None:
+            return y
+        y >>= self.shift
+        return np.clip(y, -32768, 32767, out=y).astype(np.int16)
+
+    def filter(self, x) -> np.ndarray:
+        return self.apply(self.extend(x), len(x))
+
+    def state(self) -> dict:
+        return dict(history=self.history.copy())
+
+    def restore(self, state):
+        self.history = np.array(state["history"])
+
+class _FilterStage:
+    """
+    A FirStage as a pipeline stage, writing its output to the block's field.
+    prepare() has to see the blocks in order, compute() can run on any thread
+    (see _worker).
+    """
+    field = None
+
+    def prepare(self, block):
+        return block, self.fir.extend(block.samples)
+
+    def compute(self, job):
+        block, ext = job
+        return [block._replace(**{self.field: self.fir.apply(ext, len(block.samples))})]
+
+    def process(self, block):
+        return self.compute(self.prepare(block))
+
+    def finish(self):
+        return []
+
+    def state(self) -> dict:
+        return self.fir.state()
+
+    def restore(self, state):
+        self.fir.restore(state)
+
+class LowpassStage(_FilterStage):
+    name = "lowpass"
+    field = "samples"
+
+    def __init__(self, coeffs=lowpass.lowpass_coeffs, shift: int = LOWPASS_SHIFT):
+        self.fir = FirStage(coeffs, shift)
+
+class MatchedFilterStage(_FilterStage):
+    name = "matched"
+    field = "filtered"
+
+    def __init__(self, coeffs=None):
+        self.fir = FirStage(bpsk_model.preamble_coeffs() if coeffs is None else coeffs)
+
+class DetectorStage:
+    """
+    preamble_detector across blocks. A centre needs the sample after it, so the
+    last output of a block is judged with the next one; the last two outputs
+    are carried over for that.
+    """
+    name = "detector"
+
+    def __init__(self, threshold: int = bpsk_model.PREAMBLE_DETECTOR_THRESHOLD):
+        self.threshold = threshold
+        self.tail = np.zeros(0, dtype=np.int32)
+
+    def process(self, block):
+        y = np.concatenate((self.tail, block.filtered))
+        base = block.start - len(self.tail)
+        trigger, polarity = bpsk_model.preamble_detector(y, self.threshold)
+        # tail[0] was judged with the previous block, preamble_detector would see a zero before it here
+        skip = max(len(self.tail) - 1, 0)
+        hits = np.flatnonzero(trigger[skip:]) + skip
+        self.tail = y[-2:]
+        return [block._replace(triggers=hits + base, polarity=polarity[hits], peak=y[hits])]
+
+    def finish(self):
+        return []
+
+    def state(self) -> dict:
+        return dict(tail=self.tail.copy(), threshold=self.threshold)
+
+    def restore(self, state):
+        if int(state["threshold"]) != self.threshold:
+            raise ValueError("state is from a detector with a different threshold")
+        self.tail = np.array(state["tail"])
+
+class DecoderStage:
+    """
+    sample_decoder across blocks. The state machine (bpsk_model.schedule_trigger)
+    only needs trigger positions, so a squitter is scheduled as soon as its
+    trigger arrives and sliced once the block holding its last bit comes in.
+    Squitters still waiting at the end of the stream never completed.
+    """
+    name = "decoder"
+
+    def __init__(self, valid_period: int = 1):
+        self.valid_period = valid_period
+        self.idle_from = -1
+        self.pending = [] # (position, polarity, peak, start) waiting for samples
+        self.buffer = np.zeros(0, dtype=np.int16)
+        self.base = 0 # stream index of buffer[0]
+
+    def process(self, block):
+        self.buffer = np.concatenate((self.buffer, block.samples))
+        for p, polarity, peak in zip(block.triggers.tolist(), block.polarity.tolist(), block.peak.tolist()):
+            start = bpsk_model.schedule_trigger(p, self.idle_from, self.valid_period)
+            if start is not None:
+                self.pending.append((p, polarity, peak, start))
+                self.idle_from = (start + bpsk_model.PACKET_SPAN) * self.valid_period + 1
+
+        end = self.base + len(self.buffer)
+        ready = [s for s in self.pending if s[3] + bpsk_model.PACKET_SPAN < end]
+        self.pending = self.pending[len(ready):]
+        out = []
+        if ready:
+            position, polarity, peak, start = (np.array(c, dtype=np.int64) for c in zip(*ready))
+            bits = bpsk_model.slice_bits(self.buffer, start - self.base, polarity)
+            out.append(bpsk_model.DecodeResult(position, polarity.astype(np.uint8), peak.astype(np.int32), start, bits))
+
+        # Later triggers are past this block's second to last sample, so their squitters start after it
+        keep = min([s[3] for s in self.pending] + [end - 2])
+        self.buffer = self.buffer[keep - self.base:]
+        self.base = keep
+        return out
+
+    def finish(self):
+        return []
+
+    def state(self) -> dict:
+        return dict(valid_period=self.valid_period, idle_from=self.idle_from, base=self.base, buffer=self.buffer.copy(),
+                    pending=np.array(self.pending, dtype=np.int64).reshape(-1, 4))
+
+    def restore(self, state):
+        if int(state["valid_period"]) != self.valid_period:
+            raise ValueError("state is from a decoder with a different valid_period")
+        self.idle_from = int(state["idle_from"])
+        self.base = int(state["base"])
+        self.buffer = np.array(state["buffer"])
+        self.pending = [tuple(p) for p in np.asarray(state["pending"]).tolist()]
+
+def _timed(stage, job):
+    t = time.perf_counter()
+    out = stage.compute(job)
+    return out, time.perf_counter() - t
+
+def _worker(stage, inbox, outbox, stats, errors, workers: int = 1):
+    """
+    Run stage on every block from inbox. With workers > 1 the stage's compute()
+    goes to a pool of that many threads, at most 2 * workers blocks in flight,
+    and the outputs are put out in stream order.
+    """
+    blocks = 0
+    busy = 0.0
+    max_depth = 0
+    depth_sum = 0
+    item = None
+    pool = ThreadPoolExecutor(workers, thread_name_prefix=stage.name) if workers > 1 else None
+    pending = collections.deque() # futures of the blocks in flight, oldest first
+
+    def flush(limit):
+        nonlocal busy
+        while pending and (len(pending) > limit or pending[0].done()):
+            out, took = pending.popleft().result()
+            busy += took
+            for o in out:
+                outbox.put(o)
+
+    try:
+        while True:
+            depth = inbox.qsize()
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Mark):
+                flush(0) # the blocks before the marker go out before it
+                item.states[stage.name] = stage.state()
+                outbox.put(item)
+                continue
+            blocks += 1
+            max_depth = max(max_depth, depth)
+            depth_sum += depth
+            t = time.perf_counter()
+            if pool is None:
+                out = stage.process(item)
+                busy += time.perf_counter() - t
+                for o in out:
+                    outbox.put(o)
+            else:
+                job = stage.prepare(item)
+                busy += time.perf_counter() - t
+                pending.append(pool.submit(_timed, stage, job))
+                flush(2 * workers)
+        flush(0)
+        for o in stage.finish():
+            outbox.put(o)
+    except BaseException as e:
+        errors.append(e)
+        # Keep draining so the stage upstream never blocks on a full queue
+        while item is not _DONE:
+            item = inbox.get()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        outbox.put(_DONE)
+        stats[stage.name] = StageStats(stage.name, blocks, busy, max_depth, depth_sum / max(blocks, 1),
+                                       workers if pool is not None else 1)
+
+class Pipeline:
+    """
+    The receiver chain as worker threads. run() streams a Capture through it and
+    returns (DecodeResult, PipelineStats).
+    """
+    def __init__(self, lowpass_coeffs=lowpass.lowpass_coeffs, lowpass_shift: int = LOWPASS_SHIFT,
+                 coeffs=None, threshold: int = bpsk_model.PREAMBLE_DETECTOR_THRESHOLD, valid_period: int = 1,
+                 chunk_size: int = 1 << 16, queue_depth: int = QUEUE_DEPTH, workers: int = 1):
+        self.lowpass_coeffs = lowpass_coeffs # None to skip the lowpass, like bpsk_decoder.sv
+        self.lowpass_shift = lowpass_shift
+        self.coeffs = coeffs
+        self.threshold = threshold # at the capture's scale, see detector_threshold
+        self.valid_period = valid_period
+        self.chunk_size = chunk_size
+        self.queue_depth = queue_depth
+        self.workers = workers # threads per filter stage
+
+    @property
+    def delay(self) -> int:
+        """Samples the lowpass delays the stream by (its group delay)."""
+        return 0 if self.lowpass_coeffs is None else (len(self.lowpass_coeffs) - 1) // 2
+
+    @property
+    def detector_threshold(self) -> int:
+        """threshold scaled by the lowpass gain, for the matched filter output after the lowpass."""
+        if self.lowpass_coeffs is None:
+            return int(self.threshold)
+        return int(self.threshold) * int(np.sum(self.lowpass_coeffs)) >> self.lowpass_shift
+
+    def config(self, start: int = 0, stop: int | None = None) -> dict:
+        """Everything a checkpoint has to agree with to be resumed, as JSON-able values."""
+        coeffs = bpsk_model.preamble_coeffs() if self.coeffs is None else self.coeffs
+        return dict(lowpass=None if self.lowpass_coeffs is None else np.asarray(self.lowpass_coeffs).tolist(),
+                    lowpass_shift=self.lowpass_shift,
+                    coeffs=hashlib.sha256(np.asarray(coeffs, dtype=np.int8).tobytes()).hexdigest(),
+                    threshold=int(self.threshold), valid_period=self.valid_period, start=start, stop=stop)
+
+    def stages(self) -> list:
+        stages = [] if self.lowpass_coeffs is None else [LowpassStage(self.lowpass_coeffs, self.lowpass_shift)]
+        return stages + [MatchedFilterStage(self.coeffs), DetectorStage(self.detector_threshold),
+                         DecoderStage(self.valid_period)]
+
+    def run(self, capture: Capture, start: int = 0, stop: int | None = None, on_squitters=None,
+            checkpoint_path=None, checkpoint_every: int = CHECKPOINT_EVERY):
+        """
+        Decode capture[start:stop]. on_squitters, if given, is called from the
+        decoder thread with each DecodeResult as it comes out. With
+        checkpoint_path the run is checkpointed there every checkpoint_every
+        samples (at the next block edge) and, if the file already exists,
+        resumed from it; on_squitters then only sees the squitters after it.
+        """
+        stages = self.stages()
+        config = self.config(start, stop)
+        results = []
+        position = 0 # samples from start already in the restored state
+        if checkpoint_path is not None and Path(checkpoint_path).is_file():
+            states, meta = checkpoint.load(checkpoint_path)
+            if meta["config"] != config:
+                raise ValueError(f"{checkpoint_path} was made with different pipeline settings or range")
+            for stage in stages:
+                stage.restore(states[stage.name])
+            done = bpsk_model.DecodeResult(*(states["results"][f] for f in bpsk_model.DecodeResult._fields))
+            if len(done.position):
+                results.append(done)
+            position = meta["position"]
+
+        queues = [queue.Queue(self.queue_depth) for _ in range(len(stages) + 1)]
+        stats = {}
+        errors = []
+        threads = [threading.Thread(target=_worker, name=stage.name, daemon=True,
+                                    args=(stage, queues[i], queues[i + 1], stats, errors,
+                                          self.workers if isinstance(stage, _FilterStage) else 1))
+                   for i, stage in enumerate(stages)]
+        samples = 0
+        begin = time.perf_counter()
+        for t in threads:
+            t.start()
+
+        def save(mark):
+            meta = dict(config=config, position=mark.position)
+            checkpoint.save(checkpoint_path, dict(mark.states, results=_concat(results)._asdict()), meta)
+
+        def collect():
+            try:
+                while (item := queues[-1].get()) is not _DONE:
+                    if isinstance(item, _Mark):
+                        save(item)
+                        continue
+                    results.append(item)
+                    if on_squitters is not None:
+                        on_squitters(item)
+            except BaseException as e:
+                errors.append(e)
+                while queues[-1].get() is not _DONE:
+                    pass
+        sink = threading.Thread(target=collect, name="sink", daemon=True)
+        sink.start()
+
+        source_busy = 0.0
+        blocks = 0
+        since_mark = 0
+        try:
+            t = time.perf_counter()
+            for chunk in capture.chunks(self.chunk_size, start=start + position, stop=stop):
+                block = Block(chunk.offset - start, chunk.i)
+                source_busy += time.perf_counter() - t
+                queues[0].put(block)
+                samples += len(chunk.i)
+                blocks += 1
+                since_mark += len(chunk.i)
+                if checkpoint_path is not None and since_mark >= checkpoint_every:
+                    queues[0].put(_Mark(position + samples, {}))
+                    since_mark = 0
+                if errors:
+                    break
+                t = time.perf_counter()
+        finally:
+            queues[0].put(_DONE)
+            sink.join()
+        wall_time = time.perf_counter() - begin
+        if errors:
+            raise errors[0]
+
+        result = _concat(results)
+        if self.delay:
+            result = result._replace(position=result.position - self.delay, start=result.start - self.delay)
+        rate = samples / wall_time if wall_time else float("inf")
+        stage_stats = [StageStats("source", blocks, source_busy, 0, 0.0)] + [stats[s.name] for s in stages]
+        return result, PipelineStats(samples, wall_time, rate, rate / FS, stage_stats)
+
+def _concat(results) -> bpsk_model.DecodeResult:
+    if not results:
+        return bpsk_model.DecodeResult(np.zeros(0, np.int64), np.zeros(0, np.uint8), np.zeros(0, np.int32),
+                                       np.zeros(0, np.int64),
+                                       np.zeros((0, bpsk_model.SQUITTER_LENGTH), np.uint8))
+    return bpsk_model.DecodeResult(*(np.concatenate(field) for field in zip(*results)))
+
+def format_stats(stats: PipelineStats) -> str:
+    lines = [f"{stats.samples} samples in {stats.wall_time:.3f} s: {stats.samples_per_sec / 1e6:.1f} MSPS "
+             f"({stats.realtime:.2f}x real time at {FS / 1e6:.0f} MSPS)",
+             f"{'stage':<10} {'blocks':>7} {'workers':>8} {'busy s':>8} {'MSPS':>8} {'max queue':>10} {'mean queue':>11}"]
+    for s in stats.stages:
+        # busy is summed over the workers, which run side by side
+        msps = stats.samples * s.workers / s.busy / 1e6 if s.busy else float("inf")
+        lines.append(f"{s.name:<10} {s.blocks:7d} {s.workers:8d} {s.busy:8.3f} {msps:8.1f} {s.max_depth:10d} "
+                     f"{s.mean_depth:11.2f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode squitters from a capture in software.")
+    parser.add_argument("capture", type=Path, help="capture .npy (complex, or the real half of a split capture)")
+    parser.add_argument("imag", type=Path, nargs="?", help="imag half of a split capture")
+    parser.add_argument("--no-lowpass", action="store_true", help="matched filter straight on the capture, like the RTL")
+    parser.add_argument("-t", "--threshold", type=int, default=bpsk_model.PREAMBLE_DETECTOR_THRESHOLD,
+                        help="preamble threshold at the capture's scale, scaled down with the lowpass gain")
+    parser.add_argument("--chunk", type=int, default=1 << 16, help="samples per block")
+    parser.add_argument("--queue", type=int, default=QUEUE_DEPTH, help="blocks per queue")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 1) // 2, 1),
+                        help="threads for each of the two filter stages (default: half the cores)")
+    parser.add_argument("--store", type=Path, help="also append the squitters to this squitter_store directory")
+    parser.add_argument("--checkpoint", type=Path, help="checkpoint file, resumed from if it exists")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="samples between checkpoints")
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline(lowpass_coeffs=None if args.no_lowpass else lowpass.lowpass_coeffs, threshold=args.threshold,
+                        chunk_size=args.chunk, queue_depth=args.queue, workers=args.workers)
+    if args.checkpoint is not None and args.checkpoint.is_file():
+        print(f"resuming from {args.checkpoint}", file=sys.stderr)
+    result, stats = pipeline.run(Capture(args.capture, args.imag), checkpoint_path=args.checkpoint,
+                                 checkpoint_every=args.checkpoint_every)
+    if args.store is not None:
+        SquitterStore(args.store).append_result(result)
+    crc = crc24.correct(result.bits)
+    status = {0: "ok", 1: "fixed 1", 2: "fixed 2", -1: "bad crc"}
+    for position, squitter, errors in zip(result.position.tolist(), bpsk_model.squitter_ints(result.bits),
+                                          crc.errors.tolist()):
+        print(f"{position:12d} {squitter:032x} {status[errors]}")
+    print(format_stats(stats), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Parallel regression over every cocotb testbench in sim/.
+
+A testbench is any module here with a @cocotb.test and a *_runner(build_dir=...)
+function (see sim_runner.py). Each one runs in its own Python process with its
+own build directory, regress_build/<module>/, so builds and simulations never
+share files and the whole suite takes about as long as the slowest bench once
+there are enough cores.
+
+    python regress.py                     # everything, one job per core
+    python regress.py -j 2 test_costas test_counter
+    python regress.py --render            # also draw the saved artifacts afterwards
+
+Benches run headless (SIM_HEADLESS=1, see artifacts.py): no plotting inside the
+simulator and no waves, with the captured arrays saved next to results.xml.
+--gui restores the interactive plots, --waves turns FST dumps back on.
+--sim picks the simulator (SIM, see sim_runner.py); under verilator each bench
+gets an equal share of the cores for its threads unless SIM_THREADS is set.
+
+Per bench the output directory holds run.log (build and sim output) and
+results.xml. regress_build/results.xml merges every bench's test suites and
+regress_build/timing.json has the wall time of each bench and the wall/sim
+time of every test.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+
+SIM_PATH = Path(__file__).resolve().parent
+DEFAULT_OUT = SIM_PATH / "regress_build"
+
+_RUNNER_RE = re.compile(r"^def (\w+_runner)\(build_dir", re.M)
+
+class Testbench(NamedTuple):
+    module: str
+    runner: str # name of the module's *_runner function
+
+class BenchResult(NamedTuple):
+    module: str
+    returncode: int
+    wall_time: float # build + sim, seconds
+    tests: list # one dict per testcase in results.xml
+    build_dir: Path
+    max_rss: int = 0 # peak resident set of the test run (bench and simulator, not the build), kB, from timing.json
+
+    @property
+    def failed(self):
+        return self.returncode != 0 or not self.tests or any(not t["passed"] for t in self.tests)
+
+def discover(path=SIM_PATH) -> list:
+    """Every module in path with a cocotb test and a *_runner(build_dir) entry point."""
+    benches = []
+    for file in sorted(Path(path).glob("*.py")):
+        source = file.read_text()
+        match = _RUNNER_RE.search(source)
+        if "@cocotb.test" in source and match:
+            benches.append(Testbench(file.stem, match.group(1)))
+    return benches
+
+def parse_results(results_xml: Path) -> list:
+    """Testcases in a cocotb results.xml as dicts (name, passed, time, sim_time_ns, ratio_time)."""
+    if not results_xml.is_file():
+        return []
+    tests = []
+    for case in ET.parse(results_xml).iter("testcase"):
+        tests.append(dict(
+            name=f"{case.get('classname')}.{case.get('name')}",
+            passed=case.find("failure") is None and case.find("error") is None,
+            skipped=case.find("skipped") is not None,
+            time=float(case.get("time", 0)),
+            sim_time_ns=float(case.get("sim_time_ns", 0)),
+            ratio_time=float(case.get("ratio_time", 0)),
+        ))
+    return tests
+
+def run_bench(bench: Testbench, out_dir=DEFAULT_OUT, env=None) -> BenchResult:
+    """Build and run one testbench in a fresh interpreter, logging to <out_dir>/<module>/run.log."""
+    build_dir = (Path(out_dir) / bench.module).resolve()
+    build_dir.mkdir(parents=True, exist_ok=True)
+    results_xml = build_dir / "results.xml"
+    results_xml.unlink(missing_ok=True)
+    timing_file = build_dir / "timing.json"
+    timing_file.unlink(missing_ok=True)
+    code = f"import {bench.module}; {bench.module}.{bench.runner}(build_dir={str(build_dir)!r})"
+    start = time.perf_counter()
+    with open(build_dir / "run.log", "w") as log:
+        returncode = subprocess.call([sys.executable, "-c", code], cwd=SIM_PATH, stdout=log, stderr=subprocess.STDOUT,
+                                     env={**os.environ, **(env or {})})
+    wall_time = time.perf_counter() - start
+    # sim_runner measures the test run on its own, the process rusage here would include the compilers
+    max_rss = json.loads(timing_file.read_text()).get("test_max_rss_kb", 0) if timing_file.is_file() else 0
+    return BenchResult(bench.module, returncode, wall_time, parse_results(results_xml), build_dir, max_rss)
+
+def run_all(benches, jobs=None, out_dir=DEFAULT_OUT, env=None, on_result=None) -> list:
+    """
+    Run benches jobs at a time (default one per core). Every bench is its own
+    subprocess, the pool threads only wait on them. Results are in bench order.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_bench, bench, out_dir, env): bench for bench in benches}
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.module] = result
+            if on_result is not None:
+                on_result(result)
+    return [results[bench.module] for bench in benches]
+
+def write_reports(results, out_dir=DEFAULT_OUT, total_time=None):
+    """Merge every bench's results.xml into out_dir/results.xml and write out_dir/timing.json."""
+    out_dir = Path(out_dir)
+    merged = ET.Element("testsuites", name="regress")
+    for result in results:
+        results_xml = result.build_dir / "results.xml"
+        if results_xml.is_file():
+            merged.extend(ET.parse(results_xml).getroot().iter("testsuite"))
+        else:
+            # No results.xml means the build or the simulator died, record it as a failing suite
+            suite = ET.SubElement(merged, "testsuite", name=result.module)
+            case = ET.SubElement(suite, "testcase", classname=result.module, name="build", time=repr(result.wall_time))
+            ET.SubElement(case, "error", message=f"exit code {result.returncode}, see {result.build_dir / 'run.log'}")
+    ET.ElementTree(merged).write(out_dir / "results.xml", encoding="UTF-8", xml_declaration=True)
+
+    timing = dict(
+        total_time=total_time,
+        benches={r.module: dict(returncode=r.returncode, wall_time=r.wall_time, max_rss=r.max_rss, failed=r.failed,
+                                tests=r.tests)
+                 for r in results},
+    )
+    (out_dir / "timing.json").write_text(json.dumps(timing, indent=2))
+
+def _print_result(result):
+    status = "FAIL" if result.failed else "PASS"
+    passed = sum(t["passed"] for t in result.tests)
+    print(f"{status} {result.module:<28} {passed}/{len(result.tests)} tests {result.wall_time:8.1f} s", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help="testbench modules to run (default: all discovered)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="parallel benches (default: number of cores)")
+    parser.add_argument("-o", "--out", type=Path, default=DEFAULT_OUT, help="output directory")
+    parser.add_argument("--gui", action="store_true", help="do not run headless (plots open from inside the tests)")
+    parser.add_argument("--waves", action="store_true", help="dump waves even when headless")
+    parser.add_argument("--sim", default=None, help="simulator, e.g. icarus or verilator (default: $SIM or icarus)")
+    parser.add_argument("--render", action="store_true", help="render the saved artifacts once the benches finish")
+    parser.add_argument("-l", "--list", action="store_true", help="list the discovered testbenches and exit")
+    args = parser.parse_args(argv)
+
+    benches = discover()
+    if args.modules:
+        known = {b.module: b for b in benches}
+        missing = [m for m in args.modules if m not in known]
+        if missing:
+            parser.error(f"unknown testbench(es): {', '.join(missing)}")
+        benches = [known[m] for m in args.modules]
+    if args.list:
+        for bench in benches:
+            print(f"{bench.module}.{bench.runner}")
+        return 0
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    env = {"SIM_HEADLESS": "0" if args.gui else "1"}
+    if args.waves:
+        env["SIM_WAVES"] = "1"
+    if args.sim:
+        env["SIM"] = args.sim
+    if env.get("SIM", os.getenv("SIM")) == "verilator" and "SIM_THREADS" not in os.environ:
+        jobs = min(args.jobs or os.cpu_count() or 1, len(benches))
+        env["SIM_THREADS"] = str(max(1, (os.cpu_count() or 1) // max(jobs, 1)))
+    results = run_all(benches, args.jobs, args.out, env=env, on_result=_print_result)
+    total_time = time.perf_counter() - start
+    write_reports(results, args.out, total_time)
+
+    if args.render:
+        import render
+        render.main([str(args.out)])
+
+    failed = [r.module for r in results if r.failed]
+    bench_time = sum(r.wall_time for r in results)
+    print(f"{len(results) - len(failed)}/{len(results)} benches passed in {total_time:.1f} s "
+          f"({bench_time:.1f} s of bench time), reports in {args.out}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Renders artifacts saved by the testbenches (see artifacts.py).
+
+    python render.py sim_build/test_costas.npz        # writes test_costas.png (+ .gif)
+    python render.py regress_build                    # every .npz under the directory
+    python render.py --show sim_build/test_costas.npz # open the windows instead
+
+The testbenches call render() with show=True themselves when not headless,
+which gives the same figures the old in-test plotting code did.
+"""
+import argparse
+import sys
+from pathlib import Path
+import numpy as np
+import artifacts
+
+def filter_output(data, show=False, out=None):
+    """Matched filter output (test_preamble_detect, test_bpsk_decode_debug)."""
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    plt.plot(data["filter_output"], 'o-')
+    plt.title("Filtered Output with Preamble Detection")
+    plt.xlabel("Sample Index")
+    plt.ylabel("Filtered Value")
+    plt.grid()
+    _finish(fig, show, out)
+
+def costas(data, show=False, out=None, frames=250):
+    """IQ animation plus error, frequency and phase traces (test_costas)."""
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation, writers
+    dut_iq, dut_error, dut_freq, dut_phase = data["dut_iq"], data["dut_error"], data["dut_freq"], data["dut_phase"]
+
+    fig, ((ax_iq, ax_error), (ax_freq, ax_phase)) = plt.subplots(2, 2, figsize=(10, 8))
+    ax_iq.set_xlim(-1.5, 1.5)
+    ax_iq.set_ylim(-1.5, 1.5)
+    ax_iq.set_xlabel("I")
+    ax_iq.set_ylabel("Q")
+    ax_iq.set_title("IQ Plot")
+    scatter = ax_iq.scatter([], [])
+
+    ax_error.set_title("Error")
+    ax_error.set_xlabel("Sample Index")
+    ax_error.set_ylabel("err")
+    ax_error.plot(np.arange(len(dut_error)), dut_error)
+
+    ax_freq.set_title("Frequency")
+    ax_freq.set_xlabel("Sample Index")
+    ax_freq.set_ylabel("Hz")
+    ax_freq.plot(np.arange(len(dut_freq)), dut_freq)
+
+    ax_phase.set_title("Phase")
+    ax_phase.set_xlabel("Sample Index")
+    ax_phase.set_ylabel("Phase (radians)")
+    ax_phase.plot(np.arange(len(dut_phase)), dut_phase)
+
+    # update animation frame
+    def update(frame):
+        # update IQ scatter (sliding window)
+        window = dut_iq[frame:(frame+1)]
+        scatter.set_offsets(np.column_stack((window.real, window.imag)))
+        return scatter
+
+    anim = FuncAnimation(fig, update, frames=min(frames, len(dut_iq)), interval=30, blit=False)
+    if out is not None and writers.is_available("pillow"):
+        anim.save(Path(out).with_suffix(".gif"), writer="pillow")
+    _finish(fig, show, out)
+
+RENDERERS = {
+    "filter_output": filter_output,
+    "costas": costas,
+}
+
+def _finish(fig, show, out):
+    import matplotlib.pyplot as plt
+    if out is not None:
+        fig.savefig(Path(out).with_suffix(".png"))
+    if show:
+        plt.show()
+    plt.close(fig)
+
+def render(path, show=False, out=None):
+    """Draw one artifact. out defaults to the artifact path (without .npz) unless showing."""
+    path = Path(path)
+    data = artifacts.load(path)
+    if out is None and not show:
+        out = path.with_suffix("")
+    RENDERERS[data["kind"]](data, show=show, out=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render testbench artifacts (.npz) to images.")
+    parser.add_argument("paths", nargs="+", type=Path, help="artifact files or directories to search")
+    parser.add_argument("--show", action="store_true", help="show the figures instead of writing files")
+    args = parser.parse_args(argv)
+
+    if not args.show:
+        import matplotlib
+        matplotlib.use("Agg")
+    files = []
+    for path in args.paths:
+        files.extend(sorted(path.rglob("*.npz")) if path.is_dir() else [path])
+    for file in files:
+        try:
+            kind = artifacts.load(file)["kind"]
+        except (KeyError, ValueError):
+            continue # not an artifact
+        if kind in RENDERERS:
+            render(file, show=args.show)
+            print(f"rendered {file} ({kind})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
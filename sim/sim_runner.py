@@ -0,0 +1,221 @@
+"""
+Build-and-test helper shared by every testbench's *_runner() and by regress.py.
+
+Each testbench only lists its sources, toplevel and timescale; this module
+picks the simulator (SIM, icarus by default or vivado for VICOCO benches),
+builds into build_dir and runs the cocotb test there. Giving each run its own
+build_dir is what lets regress.py run testbenches side by side.
+
+Builds are cached per build_dir. build_key() hashes everything that goes into
+the compiled model (simulator, toplevel, source file contents, parameters,
+timescale, flags, waves); after a successful build the key is written to
+<build_dir>/build_key, and the next run with the same key goes straight to the
+test, as long as the simulator's build output (build_output()) is still there.
+Simulators without a known build output always build. Editing only Python testbench code never recompiles the HDL. Set
+SIM_REBUILD=1 or pass always=True to force a build.
+
+Every run also writes <build_dir>/timing.json with the build time (null when
+the cached build was used), the time the test run took and the peak RSS of the
+test run in kB, for benchmark.py and regress.py. The test runs in a forked child
+so that peak covers the bench and the simulator only, never the compilers of
+the build before it.
+
+Waves default to on, or off under SIM_HEADLESS=1 (see artifacts.py). SIM_WAVES=0/1
+overrides either.
+
+SIM=verilator compiles the design to C++ with VERILATOR_ARGS on top of the
+testbench's build_args: -O3, warnings reported but not fatal (the benches pass
+-Wall for Icarus), the testbench timescale for files without one, FST instead of
+VCD waves, and --threads SIM_THREADS (default: up to 4, one per core). The C++
+build runs with one make job per core. Long captures through the 512-tap
+axis_fir are where this pays off the most against Icarus.
+
+    SIM=verilator python regress.py
+    SIM=verilator SIM_THREADS=2 python test_bpsk_decode.py
+
+trace= (or SIM_TRACE_SCOPES / SIM_TRACE_WINDOWS) replaces the full dump with a
+wavetrace.TraceConfig: only the listed scopes, only inside the windows. It is on
+whatever waves says, and the run fails if the dump ends up without any value
+changes.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from pathlib import Path
+import wavetrace
+
+PROJ_PATH = Path(__file__).resolve().parent.parent
+SIM_PATH = PROJ_PATH / "sim"
+HDL_PATH = PROJ_PATH / "hdl"
+
+def get_runner(sim: str, vicoco: bool = False):
+    if vicoco:
+        from vicoco.vivado_runner import get_runner
+    else:
+        from cocotb.runner import get_runner
+    return get_runner(sim)
+
+BUILD_KEY_FILE = "build_key"
+TIMING_FILE = "timing.json"
+VERILATOR_ARGS = ("-O3", "-Wno-fatal")
+MAX_THREADS = 4 # more than this only adds synchronization for designs this size
+
+def verilator_threads() -> int:
+    return int(os.getenv("SIM_THREADS", min(os.cpu_count() or 1, MAX_THREADS)))
+
+def sim_build_args(sim: str, build_args, timescale, waves: bool) -> list:
+    """build_args plus whatever the simulator needs on top of them."""
+    args = [str(a) for a in build_args]
+    if sim == "verilator":
+        args += VERILATOR_ARGS
+        if timescale:
+            args += ["--timescale", "/".join(timescale)]
+        threads = verilator_threads()
+        if threads > 1:
+            args += ["--threads", str(threads)]
+        if waves:
+            args.append("--trace-fst")
+    return args
+
+def run_test(runner, **kwargs):
+    """
+    runner.test(**kwargs) in a forked child. Returns (results, peak RSS in kB of
+    the child and the simulator it ran); exceptions are raised here again.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            outcome = (True, runner.test(**kwargs))
+        except BaseException as e:
+            outcome = (False, e)
+        try:
+            payload = pickle.dumps(outcome)
+        except Exception:
+            payload = pickle.dumps((False, RuntimeError(repr(outcome[1]))))
+        with os.fdopen(write_fd, "wb") as pipe:
+            pipe.write(payload)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as pipe:
+        payload = pipe.read()
+    # wait4 for the rusage: the child's maxrss covers the simulator it waited on
+    _, status, usage = os.wait4(pid, 0)
+    if not payload:
+        raise RuntimeError(f"test process exited with {os.waitstatus_to_exitcode(status)} before reporting")
+    ok, value = pickle.loads(payload)
+    if not ok:
+        raise value
+    return value, usage.ru_maxrss
+
+def build_output(sim: str, hdl_toplevel: str, build_dir: Path) -> Path | None:
+    """What the cocotb runner's build() leaves for test() to run, None if unknown for sim."""
+    if sim == "icarus":
+        return build_dir / "sim.vvp"
+    if sim == "verilator":
+        return build_dir / hdl_toplevel
+    return None
+
+def build_key(sim: str, sources, hdl_toplevel: str, timescale, build_args, parameters, waves: bool,
+              trace: wavetrace.TraceConfig | None = None) -> str:
+    """sha256 over the simulator settings and the contents of every source file."""
+    import cocotb
+    h = hashlib.sha256()
+    settings = dict(sim=sim, cocotb=cocotb.__version__, hdl_toplevel=hdl_toplevel,
+                    timescale=list(timescale) if timescale else None, build_args=[str(a) for a in build_args],
+                    parameters={str(k): str(v) for k, v in sorted(parameters.items())}, waves=bool(waves),
+                    sources=[Path(src).name for src in sources], trace=trace._asdict() if trace else None)
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    for src in sources:
+        h.update(Path(src).read_bytes())
+    return h.hexdigest()
+
+def run(
+    test_module: str,
+    sources,
+    hdl_toplevel: str,
+    timescale=('1ns', '1ps'),
+    build_args=("-Wall",),
+    parameters=None,
+    build_dir="sim_build",
+    waves: bool | None = None,
+    vicoco: bool = False,
+    sim: str | None = None,
+    always: bool = False,
+    trace: wavetrace.TraceConfig | None = None,
+) -> Path:
+    """
+    Build sources for hdl_toplevel into build_dir, unless the cached build there
+    has the same build_key, and run test_module. Returns the results.xml path.
+    """
+    sim = sim or os.getenv("SIM", "vivado" if vicoco else "icarus")
+    for path in (SIM_PATH / "model", HDL_PATH, SIM_PATH):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+    if waves is None:
+        waves = os.getenv("SIM_WAVES", "0" if os.getenv("SIM_HEADLESS", "0") == "1" else "1") == "1"
+    build_dir = Path(build_dir)
+    parameters = dict(parameters or {})
+    runner = get_runner(sim, vicoco)
+    trace = trace or (None if vicoco else wavetrace.from_env())
+    plusargs = []
+    if trace:
+        # The trace files replace the runner's own dump of everything
+        trace_sources, trace_args, plusargs = wavetrace.write(trace, sim, hdl_toplevel, build_dir)
+        sources = list(sources) + trace_sources
+        build_args = list(build_args) + trace_args
+        waves = sim == "verilator" # Verilator still needs --trace, the configuration file does the selecting
+    build_args = sim_build_args(sim, build_args, timescale, waves)
+    if sim == "verilator":
+        os.environ.setdefault("MAKEFLAGS", f"-j{os.cpu_count() or 1}") # the runner's make of the generated C++
+
+    key = build_key(sim, sources, hdl_toplevel, timescale, build_args, parameters, waves, trace)
+    key_file = build_dir / BUILD_KEY_FILE
+    always = always or os.getenv("SIM_REBUILD", "0") == "1"
+    # The Vivado runner keeps project state from build(), so only the cocotb runners are cached
+    output = build_output(sim, hdl_toplevel, build_dir)
+    cached = (not always and not vicoco and output is not None and output.is_file()
+              and key_file.is_file() and key_file.read_text() == key)
+    build_time = None
+    if cached:
+        print(f"INFO: {hdl_toplevel} is up to date in {build_dir}, skipping build")
+    else:
+        key_file.unlink(missing_ok=True) # a failed build must not leave a stale key behind
+        start = time.perf_counter()
+        runner.build(
+            sources=sources,
+            hdl_toplevel=hdl_toplevel,
+            always=True,
+            build_args=list(build_args),
+            parameters=parameters,
+            build_dir=build_dir,
+            timescale=timescale,
+            waves=waves
+        )
+        build_time = time.perf_counter() - start
+        key_file.write_text(key)
+    start = time.perf_counter()
+    results, test_max_rss = run_test(
+        runner,
+        hdl_toplevel=hdl_toplevel,
+        hdl_toplevel_lang="verilog", # the runner only works it out in build(), which a cached run skips
+        test_module=test_module,
+        test_args=[],
+        plusargs=plusargs,
+        build_dir=build_dir,
+        results_xml=str((build_dir / "results.xml").resolve()),
+        waves=waves
+    )
+    timing = dict(build_time=build_time, test_time=time.perf_counter() - start, test_max_rss_kb=test_max_rss)
+    (build_dir / TIMING_FILE).write_text(json.dumps(timing))
+    if trace and not wavetrace.has_changes(wavetrace.dump_path(hdl_toplevel, build_dir)):
+        raise ValueError(f"the trace of {hdl_toplevel} has no value changes, check its scopes and windows: {trace}")
+    return results
@@ -0,0 +1,198 @@
+"""
+Append-only columnar store for decoded squitters.
+
+A store is a directory with one fixed-width binary file per column, plus
+meta.json with the record count:
+
+    frame       16 x uint8   128-bit frame as received (m00_axis_tdata, MSB first)
+    time        int64        sample index of the preamble peak (DecodeResult.position)
+    polarity    uint8
+    peak        int32        matched filter value at the peak
+    crc         int8         crc24 status: bits corrected (0, 1, 2) or -1 if the parity failed
+    icao        uint32       address field (message bits 9-32) after CRC correction
+
+Columns are opened as memmaps, so a query only touches the pages it needs.
+append() writes the new rows to the end of every column and only then bumps
+the count in meta.json, so a crash mid-append leaves a valid store (the partial
+tail is cut off on the next append).
+
+Secondary indexes are sorted copies written next to the columns:
+icao_sorted/icao_order (rows grouped by address, in append order within an
+address) and, only when appends weren't in time order, time_sorted/time_order.
+They are rebuilt on the first query after an append. A lookup is a binary
+search on a memmap, so "all messages from X between t0 and t1" costs a few page
+reads plus the matching rows, not a scan.
+
+    store = SquitterStore("day.sq")
+    store.append_result(result, time_offset=chunk_start)
+    rows = store.query(icao=0x4840D6, start=t0, stop=t1)
+    store.read(rows)["frame"]
+"""
+import json
+from pathlib import Path
+import numpy as np
+import bpsk_model
+import crc24
+
+COLUMNS = {
+    "frame": (np.uint8, (16,)),
+    "time": (np.int64, ()),
+    "polarity": (np.uint8, ()),
+    "peak": (np.int32, ()),
+    "crc": (np.int8, ()),
+    "icao": (np.uint32, ()),
+}
+INDEXES = {
+    "icao_sorted": np.uint32,
+    "icao_order": np.int64,
+    "time_sorted": np.int64,
+    "time_order": np.int64,
+}
+META = "meta.json"
+
+def icao_address(messages) -> np.ndarray:
+    """AA field (bits 9-32) of (n, >= 4) message bytes."""
+    m = np.asarray(messages, dtype=np.uint32)
+    return m[:, 1] << 16 | m[:, 2] << 8 | m[:, 3]
+
+class SquitterStore:
+    def __init__(self, path, sample_rate: float = 64e6):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = self.path / META
+        if meta.is_file():
+            self.meta = json.loads(meta.read_text())
+        else:
+            self.meta = dict(count=0, sample_rate=sample_rate, time_sorted=True, last_time=None, indexed=0)
+            self._write_meta()
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def sample_rate(self) -> float:
+        return self.meta["sample_rate"]
+
+    def _write_meta(self):
+        tmp = self.path / (META + ".tmp")
+        tmp.write_text(json.dumps(self.meta, indent=2))
+        tmp.replace(self.path / META)
+
+    def _map(self, file, dtype, shape, count, mode="r") -> np.ndarray:
+        if count == 0:
+            return np.zeros((0,) + shape, dtype=dtype)
+        return np.memmap(self.path / file, dtype=dtype, mode=mode, shape=(count,) + shape)
+
+    def column(self, name) -> np.ndarray:
+        """Read-only memmap of a column."""
+        dtype, shape = COLUMNS[name]
+        return self._map(f"{name}.bin", dtype, shape, len(self))
+
+    def append(self, frames, time, polarity=None, peak=None) -> int:
+        """
+        Add squitters: frames as frame ints or an (n, 128) bit array, time as
+        their sample positions. CRC status and ICAO address are worked out here.
+        Returns the number of rows added.
+        """
+        time = np.asarray(time, dtype=np.int64)
+        n = len(time)
+        if n == 0:
+            return 0
+        crc = crc24.correct(frames)
+        if isinstance(frames, np.ndarray) and frames.ndim == 2:
+            frame = np.packbits(frames.astype(np.uint8), axis=1)
+        else:
+            frame = np.frombuffer(b"".join(int(f).to_bytes(16, "big") for f in frames), dtype=np.uint8).reshape(-1, 16)
+        columns = dict(
+            frame=frame,
+            time=time,
+            polarity=np.zeros(n, np.uint8) if polarity is None else polarity,
+            peak=np.zeros(n, np.int32) if peak is None else peak,
+            crc=crc.errors,
+            icao=icao_address(crc.message),
+        )
+        count = len(self)
+        for name, (dtype, shape) in COLUMNS.items():
+            data = np.ascontiguousarray(columns[name], dtype=dtype)
+            if data.shape != (n,) + shape:
+                raise ValueError(f"{name} has shape {data.shape}, expected {(n,) + shape}")
+            with open(self.path / f"{name}.bin", "ab") as f:
+                f.truncate(count * data.itemsize * int(np.prod(shape, dtype=np.int64)))
+                f.write(data.tobytes())
+
+        last = self.meta["last_time"]
+        in_order = bool(np.all(time[1:] >= time[:-1]) and (last is None or time[0] >= last))
+        self.meta.update(count=count + n, time_sorted=self.meta["time_sorted"] and in_order,
+                         last_time=int(time.max()) if last is None else max(last, int(time.max())))
+        self._write_meta()
+        return n
+
+    def append_result(self, result: bpsk_model.DecodeResult, time_offset: int = 0) -> int:
+        """append() a DecodeResult, its positions moved by time_offset (e.g. where the decoded chunk starts)."""
+        return self.append(result.bits, result.position + time_offset, result.polarity, result.peak)
+
+    def build_indexes(self):
+        """Sort the icao (and, if needed, time) columns into the index files."""
+        count = len(self)
+        icao = np.asarray(self.column("icao"))
+        order = np.argsort(icao, kind="stable")
+        self._write_index("icao_order", order)
+        self._write_index("icao_sorted", icao[order])
+        if not self.meta["time_sorted"]:
+            time = np.asarray(self.column("time"))
+            order = np.argsort(time, kind="stable")
+            self._write_index("time_order", order)
+            self._write_index("time_sorted", time[order])
+        self.meta["indexed"] = count
+        self._write_meta()
+
+    def _write_index(self, name, data):
+        tmp = self.path / f"{name}.bin.tmp"
+        np.ascontiguousarray(data, dtype=INDEXES[name]).tofile(tmp)
+        tmp.replace(self.path / f"{name}.bin")
+
+    def _index(self, name) -> np.ndarray:
+        if self.meta["indexed"] != len(self):
+            self.build_indexes()
+        return self._map(f"{name}.bin", INDEXES[name], (), len(self))
+
+    def time_range(self, start=None, stop=None) -> np.ndarray:
+        """Rows with start <= time < stop, in time order."""
+        if self.meta["time_sorted"]:
+            time = self.column("time")
+            lo = 0 if start is None else int(np.searchsorted(time, start, "left"))
+            hi = len(time) if stop is None else int(np.searchsorted(time, stop, "left"))
+            return np.arange(lo, hi, dtype=np.int64)
+        time = self._index("time_sorted")
+        lo = 0 if start is None else int(np.searchsorted(time, start, "left"))
+        hi = len(time) if stop is None else int(np.searchsorted(time, stop, "left"))
+        return np.array(self._index("time_order")[lo:hi])
+
+    def by_icao(self, icao: int) -> np.ndarray:
+        """Rows from one address, in append order."""
+        keys = self._index("icao_sorted")
+        lo, hi = np.searchsorted(keys, [icao, icao + 1], "left")
+        return np.array(self._index("icao_order")[lo:hi])
+
+    def query(self, icao: int | None = None, start=None, stop=None, valid_only: bool = False) -> np.ndarray:
+        """Rows matching an address and/or a time window [start, stop), optionally only ones that passed the CRC."""
+        if icao is None:
+            rows = self.time_range(start, stop)
+        else:
+            rows = self.by_icao(icao)
+            if start is not None or stop is not None:
+                time = self.column("time")[rows]
+                keep = np.ones(len(rows), dtype=bool)
+                if start is not None:
+                    keep &= time >= start
+                if stop is not None:
+                    keep &= time < stop
+                rows = rows[keep]
+        if valid_only and len(rows):
+            rows = rows[self.column("crc")[rows] >= 0]
+        return rows
+
+    def read(self, rows) -> dict:
+        """Every column at rows, as in-memory arrays."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return {name: np.asarray(self.column(name)[rows]) for name in COLUMNS}
@@ -3,6 +3,14 @@ VICOCO = False
 
 import cocotb
 import lowpass
+import bpsk_model
+import crc24
+from iq_codec import to_signed
+import axis_profile
+from axis_stream import AXISStreamSource, AXISRecorder
+from capture import Capture
+import artifacts
+import render
 import os
 import random
 import sys
@@ -10,6 +18,7 @@ from math import log
 import numpy
 import logging
 from pathlib import Path
+import sim_runner
 from cocotb.clock import Clock
 from cocotb.triggers import Timer, ClockCycles, RisingEdge, FallingEdge, ReadOnly,with_timeout
 from cocotb.utils import get_sim_time as gst
@@ -17,7 +26,6 @@ if VICOCO:
     from vicoco.vivado_runner import get_runner
 else:
     from cocotb.runner import get_runner
-    import matplotlib.pyplot as plt
 
 #new!!!
 from cocotb_bus.bus import Bus
@@ -30,32 +38,18 @@ test_file = os.path.basename(__file__).replace(".py","")
 
 proj_path = Path(__file__).resolve().parent.parent
 
-def format_iq_data(iq: np.complex64):
-    x = int(np.clip(iq.real, -32768, 32767))
-    y = int(np.clip(iq.imag, -32768, 32767))
-
-    # convert to 16-bit unsigned containers
-    x &= 0xFFFF
-    y &= 0xFFFF
-
-    # print(hex(x), hex(y))
-
-    return (y << 16) | x
-
-def uint32_to_int32(x):
-    x = x & 0xFFFFFFFF  # ensure 32-bit
-    return x if x < 0x80000000 else x - 0x100000000
-
 class AXISMonitor(BusMonitor):
     """
     monitors axi streaming bus
     """
     transactions = 0 #use this variable to track good ready/valid handshakes
-    def __init__(self, dut, name, clk, callback=None):
+    def __init__(self, dut, name, clk, callback=None, sparse=False):
         self._signals = ['axis_tvalid','axis_tready','axis_tlast','axis_tdata','axis_tstrb']
         BusMonitor.__init__(self, dut, name, clk, callback=callback)
         self.clock = clk
         self.transactions = 0
+        self.sparse = sparse # sleep until tvalid (or tready) rises instead of waking every clock
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
     async def _monitor_recv(self):
         """
         Monitor receiver
@@ -63,25 +57,43 @@ class AXISMonitor(BusMonitor):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
+        valid_rise = RisingEdge(self.bus.axis_tvalid)
+        ready_rise = RisingEdge(self.bus.axis_tready)
+        woken = False
         while True:
-            await rising_edge
-            await falling_edge #sometimes see in AXI shit
-            await read_only  #readonly (the postline)
+            if not woken:
+                await wait(rising_edge)
+                await wait(falling_edge) #sometimes see in AXI shit
+            elif self.clock.value:
+                # woke on a DUT output after a rising edge, sample at the falling edge as usual.
+                # Woken in the low half it was the testbench at a falling edge, sample right away.
+                await wait(falling_edge)
+            woken = False
+            await wait(read_only)  #readonly (the postline)
             valid = self.bus.axis_tvalid.value
             ready = self.bus.axis_tready.value
             last = self.bus.axis_tlast.value
             data = self.bus.axis_tdata.value #.signed_integer
             if valid and ready:
                 self.transactions+=1
-                thing = dict(data=data.signed_integer,last=last,name=self.name,count=self.transactions,time=gst())
-                #print(f"{self.name}: {thing}")
-                self._recv(data)
+                self.profile.handshake(len(self._recvQ))
+                self.profile.timed(self._recv, data)
+            elif valid:
+                self.profile.stall()
+                if self.sparse:
+                    await wait(ready_rise)
+                    woken = True
+            elif self.sparse:
+                await wait(valid_rise)
+                woken = True
 
 class AXISDriver(BusDriver):
     def __init__(self, dut, name, clk, role="M"):
         self._signals = ['axis_tvalid', 'axis_tready', 'axis_tlast', 'axis_tdata','axis_tstrb']
         BusDriver.__init__(self, dut, name, clk)
         self.clock = clk
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
         if role=='M':
             self.role = role
             self.bus.axis_tdata.value = 0
@@ -98,26 +110,29 @@ class AXISDriver(BusDriver):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
+        self.profile.begin(len(self._sendQ))
         if self.role == 'M':
             if value.get("type") == "write_single":
-                await falling_edge #wait until after a rising edge has passed.
+                await wait(falling_edge) #wait until after a rising edge has passed.
                 self.bus.axis_tdata.value = value.get('contents').get('data')
                 self.bus.axis_tstrb.value = 0xF
                 self.bus.axis_tlast.value = value.get('contents').get('last')
                 self.bus.axis_tvalid.value = 1 #set valid to be 1
-                await read_only
+                await wait(read_only)
                 if self.bus.axis_tready.value == 0: #ifnot there...
-                    await RisingEdge(self.bus.axis_tready) #wait until it does go high
-                await rising_edge
+                    self.profile.stall()
+                    await wait(RisingEdge(self.bus.axis_tready)) #wait until it does go high
+                await wait(rising_edge)
                 #self.bus.axis_tvalid.value = 0 #set to 0 and be done.
             elif value.get("type") == "pause":
-                await falling_edge
+                await wait(falling_edge)
                 self.bus.axis_tvalid.value = 0 #set to 0 and be done.
-                await ClockCycles(self.clock,value.get("duration",1))
+                await wait(ClockCycles(self.clock,value.get("duration",1)))
             elif value.get("type") == "write_burst":
                 data = value.get("contents").get("data")
                 for i in range(len(data)):
-                    await falling_edge
+                    await wait(falling_edge)
                     self.bus.axis_tdata.value = int(data[i])
                     if i == len(data)-1:
                         self.bus.axis_tlast.value = 1
@@ -125,34 +140,38 @@ class AXISDriver(BusDriver):
                         self.bus.axis_tlast.value = 0
                     self.bus.axis_tvalid.value = 1
                     if self.bus.axis_tready.value == 0:
-                        await RisingEdge(self.bus.axis_tready)
-                    await rising_edge
+                        self.profile.stall()
+                        await wait(RisingEdge(self.bus.axis_tready))
+                    await wait(rising_edge)
                 #self.bus.axis_tvalid.value = 0
                 #self.bus.axis_tlast.value = 0
             else:
                 pass
         elif self.role == 'S':
             if value.get("type") == "pause":
-                await falling_edge
+                await wait(falling_edge)
                 self.bus.axis_tready.value = 0 #set to 0 and be done.
-                await ClockCycles(self.clock,value.get("duration",1))
+                await wait(ClockCycles(self.clock,value.get("duration",1)))
             elif value.get("type") == "read_single":
-                await falling_edge #wait until after a rising edge has passed.
+                await wait(falling_edge) #wait until after a rising edge has passed.
                 self.bus.axis_tready.value = 1 #set valid to be 1
-                await read_only
+                await wait(read_only)
                 if self.bus.axis_tvalid.value == 0: #ifnot there...
-                    await RisingEdge(self.bus.axis_tvalid) #wait until it does go high
-                await rising_edge
+                    self.profile.stall()
+                    await wait(RisingEdge(self.bus.axis_tvalid)) #wait until it does go high
+                await wait(rising_edge)
                 self.bus.axis_tready.value = 0 #set to 0 and be done.
             elif value.get("type") == "read_burst":
                 for i in range(value.get("duration",1)):
-                    await falling_edge #wait until after a rising edge has passed.
+                    await wait(falling_edge) #wait until after a rising edge has passed.
                     self.bus.axis_tready.value = 1 #set valid to be 1
-                    await read_only
+                    await wait(read_only)
                     if self.bus.axis_tvalid.value == 0: #ifnot there...
-                        await RisingEdge(self.bus.axis_tvalid) #wait until it does go high
-                    await rising_edge
+                        self.profile.stall()
+                        await wait(RisingEdge(self.bus.axis_tvalid)) #wait until it does go high
+                    await wait(rising_edge)
                 self.bus.axis_tready.value = 0 #set to 0 and be done.
+        self.profile.end(value.get("type"))
 
 async def reset(clk,rst, cycles_held = 3,polarity=1):
     rst.value = polarity
@@ -171,12 +190,11 @@ async def reset(clk,rst, cycles_held = 3,polarity=1):
 async def test_a(dut):
     """cocotb test for AXIS FIR15"""
     received_squitters = []
-    filter_output = []
 
     inm = AXISMonitor(dut,'s00',dut.s00_axis_aclk)
-    outm = AXISMonitor(dut,'m00',dut.s00_axis_aclk, callback = lambda x: received_squitters.append(x.integer))
-    outm2 = AXISMonitor(dut,'m01',dut.s00_axis_aclk, callback = lambda x: filter_output.append(uint32_to_int32(x.integer)))
-    ind = AXISDriver(dut,'s00',dut.s00_axis_aclk,"M") #M driver for S port
+    outm = AXISMonitor(dut,'m00',dut.s00_axis_aclk, callback = lambda x: received_squitters.append(x.integer), sparse=True) # a few squitters per capture
+    filter_rec = AXISRecorder(dut,'m01',dut.s00_axis_aclk, capacity=1 << 16) # matched filter output, one row per sample
+    ind = AXISStreamSource(dut,'s00',dut.s00_axis_aclk,duty=(1,0)) #one sample every other clock, same as write_single + pause 1
     outd = AXISDriver(dut,'m00',dut.s00_axis_aclk,"S") #S driver for M port
    
     # Load coefficients (ADS-B preamble)
@@ -205,78 +223,54 @@ async def test_a(dut):
     # dut.preamble_detector_threshold.value = 500000
     # dut.decoder_threshold.value = 900
 
-    real_data = np.load(proj_path / "sim" / "real_data_jimmy.npy")
-    imag_data = np.load(proj_path / "sim" / "imag_data_jimmy.npy")
-
-    # real_data = -real_data  
-
-    packed_data = np.zeros((len(real_data),), dtype = np.uint32)
-    for i in range(len(real_data)):
-        packed_data[i] = format_iq_data(complex(real_data[i], imag_data[i]))
+    # Streamed from the memmap chunk by chunk, the I channel is only read in full for the model check
+    capture = Capture(proj_path / "sim" / "real_data_jimmy.npy", proj_path / "sim" / "imag_data_jimmy.npy")
+    real_data = capture.data
 
     cocotb.start_soon(Clock(dut.s00_axis_aclk, 15626, units="ps").start()) # 64 MHz clock, plus 1 ps so that /2 is even for simulator issues
     await reset(dut.s00_axis_aclk, dut.s00_axis_aresetn,2,0)
 
-    for i in range(len(packed_data)):
-        ind.append({'type': 'write_single', 'contents': {'data': int(packed_data[i]), 'last':0}})
-        ind.append({'type': 'pause', 'duration': 1})
-
     # Write the example ADC data.
-    # data = {'type':'write_burst', "contents": {"data": packed_data}}
-    # ind.append(data)
+    feed = ind.start(capture.words())
     pause = {"type": "pause","duration": 1}
-    ind.append(pause)
 
     # Read the processed data.
     data = {'type':'read_burst', "duration": 3}
     outd.append(data)
     outd.append(pause)
 
-    await ClockCycles(dut.s00_axis_aclk,  (len(real_data) + len(preamble) + 100))
+    await feed # the whole capture, one sample every other clock
+    await ClockCycles(dut.s00_axis_aclk, len(preamble) + 100) # the last squitter drains out
+    axis_profile.report(test_file, clock_ns=15.626) # SIM_PROFILE=1 only
+
+    filter_output = to_signed(filter_rec.tdata, 32).tolist()
 
     print("Received squitters:")
     print(received_squitters)
+    crc = crc24.correct(received_squitters)
+    print(f"CRC-24: {np.count_nonzero(crc.errors == 0)} intact, {np.count_nonzero(crc.errors > 0)} corrected, "
+          f"{np.count_nonzero(crc.errors < 0)} failed")
+
+    # The testbench feeds one sample every other clock (write_single + pause).
+    # The whole capture went in, so every squitter of the model decode has to come out.
+    expected_squitters = bpsk_model.squitter_ints(bpsk_model.bpsk_decode(real_data, valid_period=2).bits)
+    assert received_squitters, "no squitters out of the decoder"
+    assert received_squitters == expected_squitters, "squitters do not match bpsk_model"
+    expected_filter_output = bpsk_model.axis_fir(real_data, preamble).tolist()
+    assert filter_output == expected_filter_output[:len(filter_output)], "matched filter output does not match bpsk_model"
 
-    if not VICOCO:
-        plt.figure()
-        plt.plot(filter_output, 'o-')
-        plt.title("Filtered Output with Preamble Detection")
-        plt.xlabel("Sample Index")
-        plt.ylabel("Filtered Value")
-        plt.grid()
-        plt.show()
+    path = artifacts.save(test_file, "filter_output", filter_output=filter_output)
+    if not VICOCO and not artifacts.HEADLESS:
+        render.render(path, show=True)
 
-def adsb_runner():
-    """Simulate the ADSB decoder using the Python runner."""
-    hdl_toplevel_lang = os.getenv("HDL_TOPLEVEL_LANG", "verilog")
-    if VICOCO:
-        sim = os.getenv("SIM", "vivado")
-    else:
-        sim = os.getenv("SIM", "icarus")
-    sys.path.append(str(proj_path / "sim" / "model"))
-    sys.path.append(str(proj_path / "hdl" ))
+def adsb_runner(build_dir="sim_build"):
+    """Simulate the ADSB decoder using the shared runner (sim_runner.py)."""
     sources = [proj_path / "hdl" / "axis_fir.sv", proj_path / "hdl" / "preamble_detector.sv", proj_path / "hdl" / "bpsk_decoder_debug.sv", proj_path / "hdl" / "sample_decoder.sv", proj_path / "hdl" / "bpsk_decoder_debug_wrapper.v"]
-    #sources = [proj_path / "hdl" / "j_math.sv"]
-    build_test_args = ["-Wall"]
-    parameters = {} #!!!
-    sys.path.append(str(proj_path / "sim"))
-    runner = get_runner(sim)
     hdl_toplevel = "bpsk_decoder_debug_wrapper"
-    runner.build(
-        sources=sources,
-        hdl_toplevel=hdl_toplevel,
-        always=True,
-        build_args=build_test_args,
-        parameters=parameters,
-        timescale = ('1ps','1fs'),
-        waves=True
-    )
-    run_test_args = []
-    runner.test(
-        hdl_toplevel=hdl_toplevel,
-        test_module=test_file,
-        test_args=run_test_args,
-        waves=True
-    )
+    build_test_args = ["-Wall"]
+    parameters = {}
+    return sim_runner.run(test_file, sources, hdl_toplevel, timescale=('1ps','1fs'), build_args=build_test_args,
+                          parameters=parameters, build_dir=build_dir, vicoco=VICOCO)
+
 if __name__ == "__main__":
     adsb_runner()
@@ -5,18 +5,20 @@ import sys
 import math
 import logging
 from pathlib import Path
+import sim_runner
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.utils import get_sim_time as gst
 from cocotb.runner import get_runner
 from cocotb_bus.bus import Bus
-import matplotlib.pyplot as plt
 from cocotb_bus.drivers import BusDriver
 from cocotb_bus.monitors import Monitor
 from cocotb_bus.monitors import BusMonitor
 from cocotb_bus.scoreboard import Scoreboard
 import numpy as np
-from matplotlib.animation import FuncAnimation, PillowWriter
+import axis_profile
+import cordic
+from iq_codec import pack_complex, unpack_complex, unpack_iq, Q15_SCALE
 from cocotb.triggers import Timer, ClockCycles, RisingEdge, FallingEdge, ReadOnly
 
 # global data recording
@@ -33,7 +35,7 @@ def generate_bpsk_with_freq_offset(
     noise_std: float = 0.0,
     seed: int | None = None,
 ):
-    rng = np.random.default_rng(0)
+    rng = np.random.default_rng(seed)
 
     num_symbols = int(np.ceil(num_samples / samples_per_symbol))
     symbols = rng.choice([-1.0, +1.0], size=num_symbols)
@@ -61,47 +63,13 @@ samples = generate_bpsk_with_freq_offset(
     samples_per_symbol=1,
     freq_offset_hz=300,   # simulate a 200 Hz offset
     fs=sample_rate,
-    noise_std=0.0
+    noise_std=0.0,
+    seed=0
 )
  
 #cheap way to get the name of current file for runner:
 test_file = os.path.basename(__file__).replace(".py","")
             
-def format_input(x: int, y: int) -> int:
-    x_16 = x & 0xFFFF
-    y_16 = y & 0xFFFF
-    return (y_16 << 16) | x_16
-
-def format_costas_sample_data(iq: np.complex64):
-    scale = 1 << 15         # 32768
-    x = int(np.clip(iq.real * scale, -32768, 32767))
-    y = int(np.clip(iq.imag * scale, -32768, 32767))
-
-    # convert to 16-bit unsigned containers
-    x &= 0xFFFF
-    y &= 0xFFFF
-
-    # print(hex(x), hex(y))
-
-    return (y << 16) | x
-
-def twos_to_int(x):
-    x &= 0xFFFF
-    if x & 0x8000:
-        return x - 0x10000    
-    else:
-        return x
-
-def decode_costas_data(val: int):
-    return complex(twos_to_int(val) / (2 ** 15), twos_to_int(val >> 16) / (2 ** 15))
-
-def parse_input(value: int) -> tuple[int, int]:
-    x_16 = value & 0xFFFF
-    y_16 = (value >> 16) & 0xFFFF
-    x = x_16 - 0x10000 if x_16 & 0x8000 else x_16
-    y = y_16 - 0x10000 if y_16 & 0x8000 else y_16
-    return x, y
-
 class AXIS_Monitor(BusMonitor):
     """
     monitors axi streaming bus
@@ -114,6 +82,7 @@ class AXIS_Monitor(BusMonitor):
         self.transactions = 0
         self.dut = dut
         self.name = name
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
     async def _monitor_recv(self):
         """
         Monitor receiver
@@ -121,11 +90,12 @@ class AXIS_Monitor(BusMonitor):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
         while True:
             #await rising_edge #can either wait for just edge...
             #or you can also wait for falling edge/read_only (see note in lab)
-            await falling_edge #sometimes see in AXI shit
-            await read_only  #readonly (the postline)
+            await wait(falling_edge) #sometimes see in AXI shit
+            await wait(read_only)  #readonly (the postline)
             valid = self.bus.axis_tvalid.value
             ready = self.bus.axis_tready.value
             last = self.bus.axis_tlast.value
@@ -138,10 +108,10 @@ class AXIS_Monitor(BusMonitor):
                     dut_freq.append(float(self.dut.freq.value) / (2 ** 30))
                     dut_phase.append(int(self.dut.phase.value) * 2 * np.pi / (2 ** 16))
                 self.transactions+=1
-                thing = dict(data=data.signed_integer,last=last,
-                             name=self.name,count=self.transactions)
-                # self.dut._log.info(f"{self.name}: {thing}")
-                self._recv(data.signed_integer)
+                self.profile.handshake(len(self._recvQ))
+                self.profile.timed(self._recv, data.signed_integer)
+            elif valid:
+                self.profile.stall()
 
 
 class AXIS_Driver(BusDriver):
@@ -150,6 +120,7 @@ class AXIS_Driver(BusDriver):
         BusDriver.__init__(self, dut, name, clk)
         self.clock = clk
         self.dut = dut
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
 
 class S_AXIS_Driver(BusDriver):
     def __init__(self, dut, name, clk):
@@ -160,16 +131,19 @@ class S_AXIS_Driver(BusDriver):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
+        self.profile.begin(len(self._sendQ))
         if value.get("type") == "pause":
-            await falling_edge
+            await wait(falling_edge)
             self.bus.axis_tready.value = 0 #set to 0 and be done.
             for i in range(value.get("duration",1)):
-                await rising_edge
+                await wait(rising_edge)
         else: #read command
-            await falling_edge
+            await wait(falling_edge)
             self.bus.axis_tready.value = 1
             for i in range(value.get("duration",1)):
-                await rising_edge
+                await wait(rising_edge)
+        self.profile.end(value.get("type"))
 
 class M_AXIS_Driver(AXIS_Driver):
     """AXI-Stream Master Driver (source)"""
@@ -183,15 +157,18 @@ class M_AXIS_Driver(AXIS_Driver):
 
     async def _driver_send(self, value, sync=True):
         """Send transactions respecting AXIS handshake (tvalid/tready)."""
+        wait = self.profile.wait
+        self.profile.begin(len(self._sendQ))
         if value.get("type") == "pause":
-            await FallingEdge(self.clock)
+            await wait(FallingEdge(self.clock))
             self.bus.axis_tvalid.value = 0
             self.bus.axis_tlast.value = 0
             for _ in range(value.get("duration", 1)):
-                await RisingEdge(self.clock)
+                await wait(RisingEdge(self.clock))
+            self.profile.end("pause")
             return
 
-        await FallingEdge(self.clock)
+        await wait(FallingEdge(self.clock))
         arr = value["contents"]["data"] if value.get("type") != "write_single" else [value["contents"]["data"]]
         for i, data_word in enumerate(arr):
             self.bus.axis_tdata.value = int(data_word)
@@ -200,66 +177,37 @@ class M_AXIS_Driver(AXIS_Driver):
 
             # Wait for handshake (tready == 1)
             while True:
-                await RisingEdge(self.clock)
-                await ReadOnly()
+                await wait(RisingEdge(self.clock))
+                await wait(ReadOnly())
                 if self.bus.axis_tready.value:
                     break
+                self.profile.stall()
 
         # Deassert tvalid after sending all data
-        await FallingEdge(self.clock)
+        await wait(FallingEdge(self.clock))
         self.bus.axis_tvalid.value = 0
         self.bus.axis_tlast.value = 0
+        self.profile.end(value.get("type"))
 
 
-cordic_angles = [180/3.14159*math.atan(2**(-i)) for i in range(17)]
+PHASE = 8192 # the constant rotation in cordic_rotate.sv, 45 degrees
 
 sig_in = [] #just for convenience
 sig_out_exp = [] #contains list of expected outputs (Growing)
 sig_out_act = [] #contains list of expected outputs (Growing)
 def cordic_model(val):
     sig_in.append(val)
-    
-    x, y = parse_input(val)
-    z = 0
-    invert = x < 0
-    if invert:
-        x = -x
-        y = -y
-    for i in range(16):
-        if y > 0:
-            xn = x + 1/(2**i)*y
-            yn = y - 1/(2**i)*x
-            zn = z - cordic_angles[i]
-        else: 
-            xn = x - 1/(2**i)*y
-            yn = y + 1/(2**i)*x
-            zn = z + cordic_angles[i]
-        x, y, z = xn, yn, zn
-    if invert:
-        z = (z + 180) % 360
-    sig_out_exp.append((z, x / 1.646))
+    x, y = unpack_iq(val)
+    final_x, final_y = cordic.rotate_fixed(x, y, PHASE)
+    sig_out_exp.append((int(cordic.wrap(final_x, 16)), int(cordic.wrap(final_y, 16)))) # {final_y[15:0], final_x[15:0]}
 
 
 class CordicScoreboard(Scoreboard):
 
     def compare(self, got, exp, log, strict_type=True):
-        # exp_angle, exp_magnitude = exp
-        # got_angle = (360 * (got >> 16) / 2**16) % 360
-        # got_magnitude = got & 65535
-
-        # angle_error = abs(exp_angle - got_angle) / exp_angle
-        # magnitude_error = abs(exp_magnitude - got_magnitude) / exp_magnitude
-        
-        # if angle_error > 0.005:
-        #     log.error("Received angle different than expected")
-        #     assert False
-        # if magnitude_error > 0.01:
-        #     log.error(f"Expected magnitude {exp_magnitude} but got {got_magnitude}")
-        #     assert False
-        dut_iq.append(decode_costas_data(got))
-
-        print(decode_costas_data(got))
-        
+        dut_iq.append(unpack_complex(got, Q15_SCALE))
+        got_xy = tuple(int(v) for v in unpack_iq(got))
+        assert got_xy == exp, f"cordic_rotate gave {got_xy}, rotate_fixed expects {exp}"
 
 async def reset(clk, reset_n, duration=2, active=0):
     """Drive reset for `duration` cycles."""
@@ -285,17 +233,20 @@ async def test_a(dut):
 
     #feed the driver on the M Side:
 
-    ind.append({'type':'write_single', "contents":{"data": format_costas_sample_data(complex(1, 0)),"last":0}})
-    ind.append({'type':'write_single', "contents":{"data": format_costas_sample_data(complex(0, 1)),"last":0}})
-    ind.append({'type':'write_single', "contents":{"data": format_costas_sample_data(complex(-1, 0)),"last":0}})
-    ind.append({'type':'write_single', "contents":{"data": format_costas_sample_data(complex(0, -1)),"last":0}})
+    ind.append({'type':'write_single', "contents":{"data": int(pack_complex(complex(1, 0), Q15_SCALE)),"last":0}})
+    ind.append({'type':'write_single', "contents":{"data": int(pack_complex(complex(0, 1), Q15_SCALE)),"last":0}})
+    ind.append({'type':'write_single', "contents":{"data": int(pack_complex(complex(-1, 0), Q15_SCALE)),"last":0}})
+    ind.append({'type':'write_single', "contents":{"data": int(pack_complex(complex(0, -1), Q15_SCALE)),"last":0}})
     
     #feed the driver on the S Side:
     #always be ready to receive data:
     outd.append({'type':'read', "duration":100})
 
     await ClockCycles(dut.s00_axis_aclk, 100)
+    axis_profile.report(test_file, clock_ns=10) # SIM_PROFILE=1 only
     #if transaction counts on input and output don't match, raise an issue!
+    assert inm.transactions == outm.transactions == 4, f"{inm.transactions} samples in, {outm.transactions} out"
+    assert not sig_out_exp, f"{len(sig_out_exp)} expected outputs never came out"
 
     
     # global dut_iq
@@ -338,34 +289,15 @@ async def test_a(dut):
 """the code below should largely remain unchanged in structure, though the specific files and things
 specified should get updated for different simulations.
 """
-def axis_runner():
-    """Simulate the counter using the Python runner."""
-    hdl_toplevel_lang = os.getenv("HDL_TOPLEVEL_LANG", "verilog")
-    sim = os.getenv("SIM", "icarus")
+def axis_runner(build_dir="sim_build"):
+    """Simulate cordic_rotate using the shared runner (sim_runner.py)."""
     proj_path = Path(__file__).resolve().parent.parent
-    sys.path.append(str(proj_path / "sim" / "model"))
     sources = [proj_path / "hdl" / "cordic_rotate.sv"] #grow/modify this as needed.
     hdl_toplevel = "cordic_rotate"
     build_test_args = ["-Wall"]#,"COCOTB_RESOLVE_X=ZEROS"]
     parameters = {}
-    sys.path.append(str(proj_path / "sim"))
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel=hdl_toplevel,
-        always=True,
-        build_args=build_test_args,
-        parameters=parameters,
-        timescale = ('1ns','1ps'),
-        waves=True
-    )
-    run_test_args = []
-    runner.test(
-        hdl_toplevel=hdl_toplevel,
-        test_module=test_file,
-        test_args=run_test_args,
-        waves=True
-    )
- 
+    return sim_runner.run(test_file, sources, hdl_toplevel, timescale=('1ns','1ps'), build_args=build_test_args,
+                          parameters=parameters, build_dir=build_dir)
+
 if __name__ == "__main__":
     axis_runner()
\ No newline at end of file
@@ -8,6 +8,7 @@ import sys
 import math
 import logging
 from pathlib import Path
+import sim_runner
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.utils import get_sim_time as gst
@@ -16,24 +17,28 @@ if VICOCO:
 else:
     from cocotb.runner import get_runner
 from cocotb_bus.bus import Bus
-if MATPLOTLIB:
-    import matplotlib.pyplot as plt
-    from matplotlib.animation import FuncAnimation, PillowWriter
 from cocotb_bus.drivers import BusDriver
 from cocotb_bus.monitors import Monitor
 from cocotb_bus.monitors import BusMonitor
 from cocotb_bus.scoreboard import Scoreboard
 import numpy as np
+import axis_profile
+import costas_model
+import artifacts
+import render
+import cordic
+from iq_codec import pack_complex, unpack_complex, unpack_iq, to_signed, COSTAS_INPUT_SCALE, COSTAS_OUTPUT_SCALE
+from axis_stream import AXISRecorder
 from cocotb.triggers import Timer, ClockCycles, RisingEdge, FallingEdge, ReadOnly
 
 
-GAIN = 1 << 10
+GAIN = COSTAS_OUTPUT_SCALE
 
-# global data recording
-dut_iq = []
-dut_error = []
-dut_freq = []
-dut_phase = []
+# global data recording, filled from the m00 recorder at the end of test_a
+dut_iq = np.array([])
+dut_error = np.array([])
+dut_freq = np.array([])
+dut_phase = np.array([])
 
 def generate_bpsk_with_freq_offset(
     num_samples: int,
@@ -43,7 +48,7 @@ def generate_bpsk_with_freq_offset(
     noise_std: float = 0.0,
     seed: int | None = None,
 ):
-    rng = np.random.default_rng(0)
+    rng = np.random.default_rng(seed)
 
     num_symbols = int(np.ceil(num_samples / samples_per_symbol))
     symbols = rng.choice([-1.0, +1.0], size=num_symbols)
@@ -71,53 +76,13 @@ samples = generate_bpsk_with_freq_offset(
     samples_per_symbol=1,
     freq_offset_hz=500,   # simulate a 200 Hz offset
     fs=sample_rate,
-    noise_std=0.05
+    noise_std=0.05,
+    seed=0
 )
  
 #cheap way to get the name of current file for runner:
 test_file = os.path.basename(__file__).replace(".py","")
             
-def format_input(x: int, y: int) -> int:
-    x_16 = x & 0xFFFF
-    y_16 = y & 0xFFFF
-    return (y_16 << 16) | x_16
-
-def format_costas_sample_data(iq: np.complex64):
-    x = int(np.clip(iq.real * 1000, -32768, 32767))
-    y = int(np.clip(iq.imag * 1000, -32768, 32767))
-
-    # convert to 16-bit unsigned containers
-    x &= 0xFFFF
-    y &= 0xFFFF
-
-    # print(hex(x), hex(y))
-
-    return (y << 16) | x
-
-def twos_to_int(x):
-    x &= 0xFFFF
-    if x & 0x8000:
-        return x - 0x10000    
-    else:
-        return x
-    
-def twos_to_int32(x):
-    x &= 0xFFFFFFFF          
-    if x & 0x80000000:        
-        return x - 0x100000000 
-    else:
-        return x
-
-def decode_costas_data(val: int):
-    return complex(twos_to_int(val) / GAIN, twos_to_int(val >> 16) / GAIN)
-
-def parse_input(value: int) -> tuple[int, int]:
-    x_16 = value & 0xFFFF
-    y_16 = (value >> 16) & 0xFFFF
-    x = x_16 - 0x10000 if x_16 & 0x8000 else x_16
-    y = y_16 - 0x10000 if y_16 & 0x8000 else y_16
-    return x, y
-
 class AXIS_Monitor(BusMonitor):
     """
     monitors axi streaming bus
@@ -130,6 +95,7 @@ class AXIS_Monitor(BusMonitor):
         self.transactions = 0
         self.dut = dut
         self.name = name
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
     async def _monitor_recv(self):
         """
         Monitor receiver
@@ -137,33 +103,23 @@ class AXIS_Monitor(BusMonitor):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
         while True:
             #await rising_edge #can either wait for just edge...
             #or you can also wait for falling edge/read_only (see note in lab)
-            await falling_edge #sometimes see in AXI shit
-            await read_only  #readonly (the postline)
+            await wait(falling_edge) #sometimes see in AXI shit
+            await wait(read_only)  #readonly (the postline)
             valid = self.bus.axis_tvalid.value
             ready = self.bus.axis_tready.value
             last = self.bus.axis_tlast.value
             data = self.bus.axis_tdata.value #.signed_integer
 
             if valid and ready:
-
-                if self.name == 'm00':
-                    # print(self.dut.error.value)
-                    print(decode_costas_data(int(data)).imag)
-                    if not VICOCO:
-                        dut_error.append(twos_to_int32(int(self.dut.error.value)) / (GAIN * GAIN))
-                        # dut_error.append(twos_to_int32(int(self.dut.beta_error.value)))
-                        dut_freq.append(twos_to_int32(int(self.dut.new_freq.value)) / (GAIN * GAIN))
-                        dut_phase.append(int(self.dut.new_phase.value) * 2 * np.pi / (2 ** 16))
-                        dut_iq.append(decode_costas_data(int(data)))
-                        pass
                 self.transactions+=1
-                thing = dict(data=data.signed_integer,last=last,
-                             name=self.name,count=self.transactions)
-                # self.dut._log.info(f"{self.name}: {thing}")
-                self._recv(data.signed_integer)
+                self.profile.handshake(len(self._recvQ))
+                self.profile.timed(self._recv, data.signed_integer)
+            elif valid:
+                self.profile.stall()
 
 
 class AXIS_Driver(BusDriver):
@@ -172,6 +128,7 @@ class AXIS_Driver(BusDriver):
         BusDriver.__init__(self, dut, name, clk)
         self.clock = clk
         self.dut = dut
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
 
 class S_AXIS_Driver(BusDriver):
     def __init__(self, dut, name, clk):
@@ -182,16 +139,19 @@ class S_AXIS_Driver(BusDriver):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
+        self.profile.begin(len(self._sendQ))
         if value.get("type") == "pause":
-            await falling_edge
+            await wait(falling_edge)
             self.bus.axis_tready.value = 0 #set to 0 and be done.
             for i in range(value.get("duration",1)):
-                await rising_edge
+                await wait(rising_edge)
         else: #read command
-            await falling_edge
+            await wait(falling_edge)
             self.bus.axis_tready.value = 1
             for i in range(value.get("duration",1)):
-                await rising_edge
+                await wait(rising_edge)
+        self.profile.end(value.get("type"))
 
 class M_AXIS_Driver(AXIS_Driver):
     """AXI-Stream Master Driver (source)"""
@@ -205,15 +165,18 @@ class M_AXIS_Driver(AXIS_Driver):
 
     async def _driver_send(self, value, sync=True):
         """Send transactions respecting AXIS handshake (tvalid/tready)."""
+        wait = self.profile.wait
+        self.profile.begin(len(self._sendQ))
         if value.get("type") == "pause":
-            await FallingEdge(self.clock)
+            await wait(FallingEdge(self.clock))
             self.bus.axis_tvalid.value = 0
             self.bus.axis_tlast.value = 0
             for _ in range(value.get("duration", 1)):
-                await RisingEdge(self.clock)
+                await wait(RisingEdge(self.clock))
+            self.profile.end("pause")
             return
 
-        await FallingEdge(self.clock)
+        await wait(FallingEdge(self.clock))
         arr = value["contents"]["data"] if value.get("type") != "write_single" else [value["contents"]["data"]]
         for i, data_word in enumerate(arr):
             self.bus.axis_tdata.value = int(data_word)
@@ -222,44 +185,27 @@ class M_AXIS_Driver(AXIS_Driver):
 
             # Wait for handshake (tready == 1)
             while True:
-                await RisingEdge(self.clock)
-                await ReadOnly()
+                await wait(RisingEdge(self.clock))
+                await wait(ReadOnly())
                 if self.bus.axis_tready.value:
                     break
+                self.profile.stall()
 
         # Deassert tvalid after sending all data
-        await FallingEdge(self.clock)
+        await wait(FallingEdge(self.clock))
         self.bus.axis_tvalid.value = 0
         self.bus.axis_tlast.value = 0
+        self.profile.end(value.get("type"))
 
 
-cordic_angles = [180/3.14159*math.atan(2**(-i)) for i in range(17)]
-
 sig_in = [] #just for convenience
 sig_out_exp = [] #contains list of expected outputs (Growing)
 sig_out_act = [] #contains list of expected outputs (Growing)
 def cordic_model(val):
     sig_in.append(val)
-    
-    x, y = parse_input(val)
-    z = 0
-    invert = x < 0
-    if invert:
-        x = -x
-        y = -y
-    for i in range(16):
-        if y > 0:
-            xn = x + 1/(2**i)*y
-            yn = y - 1/(2**i)*x
-            zn = z - cordic_angles[i]
-        else: 
-            xn = x - 1/(2**i)*y
-            yn = y + 1/(2**i)*x
-            zn = z + cordic_angles[i]
-        x, y, z = xn, yn, zn
-    if invert:
-        z = (z + 180) % 360
-    sig_out_exp.append((z, x / 1.646))
+    x, y = unpack_iq(val)
+    z, magnitude = cordic.vector(x, y)
+    sig_out_exp.append((float(z), float(magnitude)))
 
 
 class CordicScoreboard(Scoreboard):
@@ -295,6 +241,8 @@ async def test_a(dut):
 
     inm = AXIS_Monitor(dut,'s00',dut.s00_axis_aclk,callback=cordic_model)
     outm = AXIS_Monitor(dut,'m00',dut.s00_axis_aclk,callback=lambda x: sig_out_act.append(x))
+    probes = {} if VICOCO else {'error': dut.error, 'new_freq': dut.new_freq, 'new_phase': dut.new_phase}
+    outrec = AXISRecorder(dut,'m00',dut.s00_axis_aclk,probes=probes) # m00 data and loop state, one row per output
     ind = M_AXIS_Driver(dut,'s00',dut.s00_axis_aclk) #M driver for S port
     outd = S_AXIS_Driver(dut,'m00',dut.s00_axis_aclk) #S driver for M port
 
@@ -306,8 +254,9 @@ async def test_a(dut):
 
     #feed the driver on the M Side:
 
+    sample_words = pack_complex(samples, COSTAS_INPUT_SCALE)
     for i in range(len(samples)):
-        ind.append({'type':'write_single', "contents":{"data": format_costas_sample_data(samples[i]),"last":0}})
+        ind.append({'type':'write_single', "contents":{"data": int(sample_words[i]),"last":0}})
         ind.append({'type':'pause', "duration": 16})
     
     #feed the driver on the S Side:
@@ -315,91 +264,46 @@ async def test_a(dut):
     outd.append({'type':'read', "duration":5000})
 
     await ClockCycles(dut.s00_axis_aclk, 5000)
+    axis_profile.report(test_file, clock_ns=10) # SIM_PROFILE=1 only
     #if transaction counts on input and output don't match, raise an issue!
 
-    global dut_iq
-    dut_iq = np.array(dut_iq)
-    global dut_freq
-    dut_freq = np.array(dut_freq)
-    global dut_phase
-    dut_phase = np.array(dut_phase)
-    global dut_error
-    dut_error = np.array(dut_error)
+    global dut_iq, dut_error, dut_freq, dut_phase
+    dut_iq = unpack_complex(outrec.tdata.astype(np.uint32), GAIN)
+    if not VICOCO:
+        dut_error = to_signed(outrec.probe('error'), 32) / (GAIN * GAIN)
+        dut_freq = to_signed(outrec.probe('new_freq'), 32) / (GAIN * GAIN)
+        dut_phase = outrec.probe('new_phase') * 2 * np.pi / (2 ** 16)
 
     for i in range(5):
         print(f"original {samples[i]:.6f} rot {dut_iq[i]:.6f}, error {dut_error[i]:.6f}, freq {dut_freq[i]:.6f}, phase {dut_phase[i]:.6f}")
 
-    if MATPLOTLIB:
-        fig, ((ax_iq, ax_error), (ax_freq, ax_phase)) = plt.subplots(2, 2, figsize=(10, 8))
-        ax_iq.set_xlim(-1.5, 1.5)
-        ax_iq.set_ylim(-1.5, 1.5)
-        ax_iq.set_xlabel("I")
-        ax_iq.set_ylabel("Q")
-        ax_iq.set_title("IQ Plot")
-        # scatter = ax_iq.scatter(dut_iq.real, dut_iq.imag)
-        scatter = ax_iq.scatter([], [])
-
-        ax_error.set_title("Error")
-        ax_error.set_xlabel("Sample Index")
-        ax_error.set_ylabel("err")
-        ax_error.plot(np.arange(len(dut_error)), dut_error)
-
-        ax_freq.set_title("Frequency")
-        ax_freq.set_xlabel("Sample Index")
-        ax_freq.set_ylabel("Hz")
-        ax_freq.plot(np.arange(len(dut_freq)), dut_freq)
-
-        ax_phase.set_title("Phase")
-        ax_phase.set_xlabel("Sample Index")
-        ax_phase.set_ylabel("Phase (radians)")
-        ax_phase.plot(np.arange(len(dut_phase)), dut_phase)
+    if not VICOCO:
+        # Bit-exact check against costas_model. The driver sends one sample every 18 clocks (write_single + pause 16).
+        model = costas_model.costas_fixed(*unpack_iq(sample_words), valid_period=18)
+        n = len(dut_iq)
+        assert np.array_equal(dut_iq, model.x[0, :n] / GAIN + 1j * (model.y[0, :n] / GAIN)), "IQ output does not match costas_model"
+        assert np.array_equal(dut_error, model.error[0, :n] / (GAIN * GAIN)), "error does not match costas_model"
+        assert np.array_equal(dut_freq, model.freq[0, :n] / (GAIN * GAIN)), "new_freq does not match costas_model"
+        assert np.array_equal(dut_phase, (model.phase[0, :n].astype(np.int64) & 0xFFFF) * 2 * np.pi / (2 ** 16)), "new_phase does not match costas_model"
 
-        # update animation frame
-        def update(frame):
-            # update IQ scatter (sliding window)
-            window = dut_iq[frame:(frame+1)]
-            scatter.set_offsets(np.column_stack((window.real, window.imag)))
-
-            return scatter
-
-        anim = FuncAnimation(fig, update, frames=250, interval=30, blit=False)
-        plt.show()
+    path = artifacts.save(test_file, "costas", samples=samples, dut_iq=dut_iq, dut_error=dut_error,
+                          dut_freq=dut_freq, dut_phase=dut_phase)
+    if MATPLOTLIB and not artifacts.HEADLESS:
+        render.render(path, show=True)
 
 
 """the code below should largely remain unchanged in structure, though the specific files and things
 specified should get updated for different simulations.
 """
-def axis_runner():
-    """Simulate the counter using the Python runner."""
-    hdl_toplevel_lang = os.getenv("HDL_TOPLEVEL_LANG", "verilog")
-    if VICOCO:
-        sim = os.getenv("SIM", "vivado")
-    else:
-        sim = os.getenv("SIM", "icarus")
+def axis_runner(build_dir="sim_build"):
+    """Simulate costas using the shared runner (sim_runner.py)."""
     proj_path = Path(__file__).resolve().parent.parent
-    sys.path.append(str(proj_path / "sim" / "model"))
     sources = [proj_path / "hdl" / "costas.sv", proj_path / "hdl" / "costas_wrapper.v"] #grow/modify this as needed.
     hdl_toplevel = "costas"
     build_test_args = ["-Wall"]#,"COCOTB_RESOLVE_X=ZEROS"]
     parameters = {}
-    sys.path.append(str(proj_path / "sim"))
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel=hdl_toplevel,
-        always=True,
-        build_args=build_test_args,
-        parameters=parameters,
-        timescale = ('1ns','1ps'),
-        waves=True
-    )
-    run_test_args = []
-    runner.test(
-        hdl_toplevel=hdl_toplevel,
-        test_module=test_file,
-        test_args=run_test_args,
-        waves=True
-    )
- 
+    return sim_runner.run(test_file, sources, hdl_toplevel, timescale=('1ns','1ps'), build_args=build_test_args,
+                          parameters=parameters, build_dir=build_dir, vicoco=VICOCO)
+
 if __name__ == "__main__":
     axis_runner()
\ No newline at end of file
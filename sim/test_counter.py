@@ -4,6 +4,7 @@ import random
 import sys
 import logging
 from pathlib import Path
+import sim_runner
 from cocotb.triggers import Timer
 from cocotb.utils import get_sim_time as gst
 from cocotb.runner import get_runner
@@ -48,34 +49,15 @@ async def first_test(dut):
 """the code below should largely remain unchanged in structure, though the specific files and things
 specified should get updated for different simulations.
 """
-def counter_runner():
-    """Simulate the counter using the Python runner."""
-    hdl_toplevel_lang = os.getenv("HDL_TOPLEVEL_LANG", "verilog")
-    sim = os.getenv("SIM", "icarus")
+def counter_runner(build_dir="sim_build"):
+    """Simulate the counter using the shared runner (sim_runner.py)."""
     proj_path = Path(__file__).resolve().parent.parent
-    sys.path.append(str(proj_path / "sim" / "model"))
     sources = [proj_path / "hdl" / "counter.sv"] #grow/modify this as needed.
     hdl_toplevel = "counter"
     build_test_args = ["-Wall"]#,"COCOTB_RESOLVE_X=ZEROS"]
     parameters = {}
-    sys.path.append(str(proj_path / "sim"))
-    runner = get_runner(sim)
-    runner.build(
-        sources=sources,
-        hdl_toplevel=hdl_toplevel,
-        always=True,
-        build_args=build_test_args,
-        parameters=parameters,
-        timescale = ('1ns','1ps'),
-        waves=True
-    )
-    run_test_args = []
-    runner.test(
-        hdl_toplevel=hdl_toplevel,
-        test_module=test_file,
-        test_args=run_test_args,
-        waves=True
-    )
- 
+    return sim_runner.run(test_file, sources, hdl_toplevel, timescale=('1ns','1ps'), build_args=build_test_args,
+                          parameters=parameters, build_dir=build_dir)
+
 if __name__ == "__main__":
     counter_runner()
\ No newline at end of file
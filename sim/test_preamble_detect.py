@@ -9,6 +9,7 @@ from math import log
 import numpy
 import logging
 from pathlib import Path
+import sim_runner
 from cocotb.clock import Clock
 from cocotb.triggers import Timer, ClockCycles, RisingEdge, FallingEdge, ReadOnly,with_timeout
 from cocotb.utils import get_sim_time as gst
@@ -21,7 +22,11 @@ from cocotb_bus.monitors import Monitor
 from cocotb_bus.monitors import BusMonitor
 from cocotb_bus.scoreboard import Scoreboard
 import numpy as np
-import matplotlib.pyplot as plt
+from iq_codec import to_signed
+import axis_profile
+from axis_stream import AXISRecorder
+import artifacts
+import render
 
 test_file = os.path.basename(__file__).replace(".py","")
 
@@ -43,6 +48,7 @@ class AXISMonitor(BusMonitor):
         BusMonitor.__init__(self, dut, name, clk, callback=callback)
         self.clock = clk
         self.transactions = 0
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
     async def _monitor_recv(self):
         """
         Monitor receiver
@@ -50,25 +56,28 @@ class AXISMonitor(BusMonitor):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
         while True:
-            await rising_edge
-            await falling_edge #sometimes see in AXI shit
-            await read_only  #readonly (the postline)
+            await wait(rising_edge)
+            await wait(falling_edge) #sometimes see in AXI shit
+            await wait(read_only)  #readonly (the postline)
             valid = self.bus.axis_tvalid.value
             ready = self.bus.axis_tready.value
             last = self.bus.axis_tlast.value
             data = self.bus.axis_tdata.value #.signed_integer
             if valid and ready:
                 self.transactions+=1
-                thing = dict(data=data.signed_integer,last=last,name=self.name,count=self.transactions,time=gst())
-                #print(f"{self.name}: {thing}")
-                self._recv(data)
+                self.profile.handshake(len(self._recvQ))
+                self.profile.timed(self._recv, data)
+            elif valid:
+                self.profile.stall()
 
 class AXISDriver(BusDriver):
     def __init__(self, dut, name, clk, role="M"):
         self._signals = ['axis_tvalid', 'axis_tready', 'axis_tlast', 'axis_tdata','axis_tstrb']
         BusDriver.__init__(self, dut, name, clk)
         self.clock = clk
+        self.profile = axis_profile.probe(name, self) # no-op unless SIM_PROFILE=1
         if role=='M':
             self.role = role
             self.bus.axis_tdata.value = 0
@@ -85,26 +94,29 @@ class AXISDriver(BusDriver):
         rising_edge = RisingEdge(self.clock) # make these coroutines once and reuse
         falling_edge = FallingEdge(self.clock)
         read_only = ReadOnly() #This is
+        wait = self.profile.wait
+        self.profile.begin(len(self._sendQ))
         if self.role == 'M':
             if value.get("type") == "write_single":
-                await falling_edge #wait until after a rising edge has passed.
+                await wait(falling_edge) #wait until after a rising edge has passed.
                 self.bus.axis_tdata.value = value.get('contents').get('data')
                 self.bus.axis_tstrb.value = 0xF
                 self.bus.axis_tlast.value = value.get('contents').get('last')
                 self.bus.axis_tvalid.value = 1 #set valid to be 1
-                await read_only
+                await wait(read_only)
                 if self.bus.axis_tready.value == 0: #ifnot there...
-                    await RisingEdge(self.bus.axis_tready) #wait until it does go high
-                await rising_edge
+                    self.profile.stall()
+                    await wait(RisingEdge(self.bus.axis_tready)) #wait until it does go high
+                await wait(rising_edge)
                 #self.bus.axis_tvalid.value = 0 #set to 0 and be done.
             elif value.get("type") == "pause":
-                await falling_edge
+                await wait(falling_edge)
                 self.bus.axis_tvalid.value = 0 #set to 0 and be done.
-                await ClockCycles(self.clock,value.get("duration",1))
+                await wait(ClockCycles(self.clock,value.get("duration",1)))
             elif value.get("type") == "write_burst":
                 data = value.get("contents").get("data")
                 for i in range(len(data)):
-                    await falling_edge
+                    await wait(falling_edge)
                     self.bus.axis_tdata.value = int(data[i])
                     if i == len(data)-1:
                         self.bus.axis_tlast.value = 1
@@ -112,34 +124,38 @@ class AXISDriver(BusDriver):
                         self.bus.axis_tlast.value = 0
                     self.bus.axis_tvalid.value = 1
                     if self.bus.axis_tready.value == 0:
-                        await RisingEdge(self.bus.axis_tready)
-                    await rising_edge
+                        self.profile.stall()
+                        await wait(RisingEdge(self.bus.axis_tready))
+                    await wait(rising_edge)
                 #self.bus.axis_tvalid.value = 0
                 #self.bus.axis_tlast.value = 0
             else:
                 pass
         elif self.role == 'S':
             if value.get("type") == "pause":
-                await falling_edge
+                await wait(falling_edge)
                 self.bus.axis_tready.value = 0 #set to 0 and be done.
-                await ClockCycles(self.clock,value.get("duration",1))
+                await wait(ClockCycles(self.clock,value.get("duration",1)))
             elif value.get("type") == "read_single":
-                await falling_edge #wait until after a rising edge has passed.
+                await wait(falling_edge) #wait until after a rising edge has passed.
                 self.bus.axis_tready.value = 1 #set valid to be 1
-                await read_only
+                await wait(read_only)
                 if self.bus.axis_tvalid.value == 0: #ifnot there...
-                    await RisingEdge(self.bus.axis_tvalid) #wait until it does go high
-                await rising_edge
+                    self.profile.stall()
+                    await wait(RisingEdge(self.bus.axis_tvalid)) #wait until it does go high
+                await wait(rising_edge)
                 self.bus.axis_tready.value = 0 #set to 0 and be done.
             elif value.get("type") == "read_burst":
                 for i in range(value.get("duration",1)):
-                    await falling_edge #wait until after a rising edge has passed.
+                    await wait(falling_edge) #wait until after a rising edge has passed.
                     self.bus.axis_tready.value = 1 #set valid to be 1
-                    await read_only
+                    await wait(read_only)
                     if self.bus.axis_tvalid.value == 0: #ifnot there...
-                        await RisingEdge(self.bus.axis_tvalid) #wait until it does go high
-                    await rising_edge
+                        self.profile.stall()
+                        await wait(RisingEdge(self.bus.axis_tvalid)) #wait until it does go high
+                    await wait(rising_edge)
                 self.bus.axis_tready.value = 0 #set to 0 and be done.
+        self.profile.end(value.get("type"))
 
 async def reset(clk,rst, cycles_held = 3,polarity=1):
     rst.value = polarity
@@ -154,17 +170,11 @@ async def reset(clk,rst, cycles_held = 3,polarity=1):
 {"type":"read_burst", "duration":10}
 '''
 
-def uint32_to_int32(x):
-    x = x & 0xFFFFFFFF  # ensure 32-bit
-    return x if x < 0x80000000 else x - 0x100000000
-
 @cocotb.test()
 async def test_a(dut):
     """cocotb test for AXIS FIR15"""
-    filter_out = []
-
     inm = AXISMonitor(dut,'s00',dut.s00_axis_aclk)
-    outm = AXISMonitor(dut,'m00',dut.s00_axis_aclk, callback = lambda x: filter_out.append(uint32_to_int32(x.integer)))
+    outrec = AXISRecorder(dut,'m00',dut.s00_axis_aclk, capacity=1 << 16) # one row per filter output
     ind = AXISDriver(dut,'s00',dut.s00_axis_aclk,"M") #M driver for S port
     outd = AXISDriver(dut,'m00',dut.s00_axis_aclk,"S") #S driver for M port
    
@@ -203,9 +213,7 @@ async def test_a(dut):
     await reset(dut.s00_axis_aclk, dut.s00_axis_aresetn,2,0)
 
     real_data = np.load(proj_path / "sim" / "real_data_32.npy")
-    packed_data = np.zeros((len(real_data),), dtype = np.uint32)
-    for i in range(len(real_data)):
-        packed_data[i] = real_data[i].astype(np.int32)
+    packed_data = real_data.astype(np.int32).view(np.uint32)
 
     # Write the example ADC data.
     data = {'type':'write_burst', "contents": {"data": packed_data}}
@@ -219,45 +227,22 @@ async def test_a(dut):
     outd.append(pause)
 
     await ClockCycles(dut.s00_axis_aclk, len(real_data) + len(preamble) + 100)
+    axis_profile.report(test_file, clock_ns=15.626) # SIM_PROFILE=1 only
+    filter_out = to_signed(outrec.tdata, 32)
 
-    plt.figure()
-    plt.plot(filter_out, 'o-')
-    plt.title("Filtered Output with Preamble Detection")
-    plt.xlabel("Sample Index")
-    plt.ylabel("Filtered Value")
-    plt.grid()
-    plt.show()
+    path = artifacts.save(test_file, "filter_output", filter_output=filter_out)
+    if not artifacts.HEADLESS:
+        render.render(path, show=True)
 
-def adsb_runner():
-    """Simulate the ADSB decoder using the Python runner."""
-    hdl_toplevel_lang = os.getenv("HDL_TOPLEVEL_LANG", "verilog")
-    sim = os.getenv("SIM", "icarus")
-    #sim = os.getenv("SIM", "vivado")
-    sys.path.append(str(proj_path / "sim" / "model"))
-    sys.path.append(str(proj_path / "hdl" ))
+def adsb_runner(build_dir="sim_build"):
+    """Simulate the ADSB decoder using the shared runner (sim_runner.py)."""
     sources = [proj_path / "hdl" / "axis_fir.sv", proj_path / "hdl" / "preamble_detector.sv", proj_path / "hdl" / "bpsk_decoder.sv", proj_path / "hdl" / "sample_decoder.sv", proj_path / "hdl" / "cordic.sv"]
-    #sources = [proj_path / "hdl" / "j_math.sv"]
-    build_test_args = ["-Wall"]
-    parameters = {} #!!!
-    sys.path.append(str(proj_path / "sim"))
-    runner = get_runner(sim)
     hdl_toplevel = "axis_fir"
-    runner.build(
-        sources=sources,
-        hdl_toplevel=hdl_toplevel,
-        always=True,
-        build_args=build_test_args,
-        parameters=parameters,
-        timescale = ('1ps','1fs'),
-        waves=True
-    )
-    run_test_args = []
-    runner.test(
-        hdl_toplevel=hdl_toplevel,
-        test_module=test_file,
-        test_args=run_test_args,
-        waves=True
-    )
+    build_test_args = ["-Wall"]
+    parameters = {}
+    return sim_runner.run(test_file, sources, hdl_toplevel, timescale=('1ps','1fs'), build_args=build_test_args,
+                          parameters=parameters, build_dir=build_dir)
+
 if __name__ == "__main__":    
     # real_data = np.load("real_data_32.npy")
     adsb_runner()
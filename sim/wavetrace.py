@@ -0,0 +1,209 @@
+"""
+Selective waveform tracing: only some scopes, only some stretches of the run.
+
+waves=True dumps every signal of the design for the whole run, 512 axis_fir
+accumulators included. A TraceConfig narrows that down to
+
+    scopes      hierarchical names below the toplevel, each with a depth
+                ("my_bpsk_decoder.my_sample_decoder:1"); "" is the toplevel itself
+    windows     [start, stop) ranges of a counter; outside them nothing is dumped
+    count       what the counter counts: clock cycles (None) or the handshakes
+                of an AXIS port ("s00", i.e. input samples)
+
+sim_runner builds it into the design as a second top module (Icarus), which
+calls $dumpvars on the scopes and $dumpon/$dumpoff as the counter crosses the
+window edges, writing <build_dir>/<toplevel>.fst like the full dump does. Under
+Verilator the scopes go into a configuration file with tracing_on/tracing_off
+instead. Verilator accepts $dumpon/$dumpoff but does nothing on them, so windows
+are Icarus only and write() refuses them for Verilator.
+
+After the run has_changes() tells whether the dump holds anything at all: a
+scope that matches nothing or windows past the end of the input leave an FST
+with no value changes, and sim_runner fails the run on it.
+
+Counting input samples makes windows from the software model exact. around()
+turns model positions into windows, e.g. +-64 samples around every preamble
+bpsk_model finds:
+
+    trace = TraceConfig(scopes=("my_bpsk_decoder:1",), windows=around(result.position, 64, 64), count="s00")
+
+From the environment (see from_env), for any bench:
+
+    SIM_TRACE_SCOPES="my_bpsk_decoder.my_sample_decoder,my_bpsk_decoder.my_preamble_detector"
+    SIM_TRACE_WINDOWS="1000:2000,50000:51000"   SIM_TRACE_COUNT=s00
+
+test_bpsk_decode does the around() above with SIM_TRACE_TRIGGERS=<samples>.
+"""
+import os
+import struct
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+
+MODULE = "wave_trace" # name of the generated Icarus dump module
+VERILATOR_CONFIG = "wave_trace.vlt"
+
+class TraceConfig(NamedTuple):
+    scopes: tuple = ("",) # (scope, depth) pairs or "scope[:depth]" strings, depth 0 = everything below
+    windows: tuple = () # [start, stop) pairs; empty = the whole run
+    count: str | None = None # AXIS port whose handshakes are counted, None = clock cycles
+    clock: str = "s00_axis_aclk"
+
+def _scope(scope) -> tuple:
+    if isinstance(scope, str):
+        name, _, depth = scope.partition(":")
+        return name.strip(), int(depth or 0)
+    name, depth = scope
+    return name, int(depth)
+
+def around(points, before: int, after: int) -> tuple:
+    """Windows [p - before, p + after] around every point, overlapping ones merged."""
+    return merge((max(p - before, 0), p + after + 1) for p in np.asarray(points, dtype=np.int64).tolist())
+
+def merge(windows) -> tuple:
+    """Sorted, non-overlapping windows."""
+    merged = []
+    for start, stop in sorted((int(a), int(b)) for a, b in windows):
+        if stop <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return tuple(merged)
+
+def from_env() -> TraceConfig | None:
+    """The TraceConfig from SIM_TRACE_SCOPES / SIM_TRACE_WINDOWS / SIM_TRACE_COUNT, None if neither of the first two is set."""
+    scopes = os.getenv("SIM_TRACE_SCOPES")
+    windows = os.getenv("SIM_TRACE_WINDOWS")
+    if scopes is None and windows is None:
+        return None
+    config = TraceConfig(count=os.getenv("SIM_TRACE_COUNT") or None)
+    if scopes:
+        config = config._replace(scopes=tuple(s for s in scopes.split(",") if s.strip()))
+    if windows:
+        pairs = [w.split(":") for w in windows.split(",") if w.strip()]
+        config = config._replace(windows=tuple((int(a), int(b)) for a, b in pairs))
+    return config
+
+def dump_module(config: TraceConfig, hdl_toplevel: str, dumpfile) -> str:
+    """Verilog for the Icarus dump module of config."""
+    top = hdl_toplevel
+    windows = merge(config.windows)
+    lines = [f"module {MODULE}();"]
+    if windows:
+        lines.append("    reg [63:0] count = 0;")
+        if config.count:
+            port = f"{top}.{config.count}_axis"
+            # !== so a tready nobody drives (X) doesn't stop the count
+            lines.append(f"    always @(posedge {top}.{config.clock}) if ({port}_tvalid && ({port}_tready !== 1'b0)) count <= count + 1;")
+        else:
+            lines.append(f"    always @(posedge {top}.{config.clock}) count <= count + 1;")
+    lines += ["    initial begin", f'        $dumpfile("{Path(dumpfile).as_posix()}");']
+    for scope in config.scopes:
+        name, depth = _scope(scope)
+        lines.append(f"        $dumpvars({depth}, {top}{'.' + name if name else ''});")
+    if windows and windows[0][0] > 0:
+        lines.append("        $dumpoff;")
+    lines.append("    end")
+    if windows:
+        lines += ["    always @(count) begin", "        case (count)"]
+        for start, stop in windows:
+            if start > 0:
+                lines.append(f"            64'd{start}: $dumpon;")
+            lines.append(f"            64'd{stop}: $dumpoff;")
+        lines += ["            default: ;", "        endcase", "    end"]
+    lines.append("endmodule")
+    return "\n".join(lines) + "\n"
+
+def verilator_config(config: TraceConfig, hdl_toplevel: str) -> str:
+    """Verilator configuration that traces only the scopes of config."""
+    lines = ["`verilator_config", 'tracing_off -scope "*"']
+    for scope in config.scopes:
+        name, depth = _scope(scope)
+        path = f"*{hdl_toplevel}{'.' + name if name else ''}"
+        lines.append(f'tracing_on -scope "{path}" -levels {depth}' if depth else f'tracing_on -scope "{path}*"')
+    return "\n".join(lines) + "\n"
+
+def dump_path(hdl_toplevel: str, build_dir) -> Path:
+    """Where the trace of hdl_toplevel ends up, under either simulator."""
+    return (Path(build_dir) / f"{hdl_toplevel}.fst").resolve()
+
+def write(config: TraceConfig, sim: str, hdl_toplevel: str, build_dir) -> tuple:
+    """
+    Write the files for config into build_dir. Returns (sources, build_args,
+    plusargs) to add to the build and the test run.
+    """
+    build_dir = Path(build_dir)
+    build_dir.mkdir(parents=True, exist_ok=True)
+    if sim == "icarus":
+        path = build_dir / f"{MODULE}.v"
+        path.write_text(dump_module(config, hdl_toplevel, dump_path(hdl_toplevel, build_dir)))
+        return [path], ["-s", MODULE], ["-fst"]
+    if sim == "verilator":
+        if config.windows:
+            raise ValueError("trace windows need SIM=icarus, Verilator ignores $dumpon/$dumpoff")
+        path = build_dir / VERILATOR_CONFIG
+        path.write_text(verilator_config(config, hdl_toplevel))
+        # sim_runner turns waves on for --trace-fst, cocotb's main writes the file
+        return [], [str(path.resolve())], ["--trace-file", str(dump_path(hdl_toplevel, build_dir))]
+    raise ValueError(f"selective tracing is not supported with SIM={sim}")
+
+# FST block types (fstapi.h)
+_FST_HDR = 0
+_FST_VCDATA = (1, 5, 8) # value change blocks, plain and the two alias variants
+_FST_BLACKOUT = 2
+_FST_ZWRAPPER = 254
+
+def _varint(data: bytes, i: int) -> tuple:
+    value = shift = 0
+    while True:
+        b = data[i]
+        i += 1
+        value |= (b & 0x7f) << shift
+        shift += 7
+        if not b & 0x80:
+            return value, i
+
+def _dumped_time(blackout: bytes, end: int) -> int:
+    """Time the dump was on, from a blackout block ($dumpon/$dumpoff times) and the end time."""
+    count, i = _varint(blackout, 0)
+    on, since, total, time = True, 0, 0, 0
+    for _ in range(count):
+        active = blackout[i]
+        delta, i = _varint(blackout, i + 1)
+        time += delta
+        if on and not active:
+            total += time - since
+        elif active and not on:
+            since = time
+        on = bool(active)
+    return total + (end - since if on else 0)
+
+def has_changes(path) -> bool:
+    """
+    Whether the FST at path has at least one variable and dumps it over some
+    stretch of time, i.e. isn't empty for a scope or window that matched nothing.
+    """
+    data = Path(path).read_bytes()
+    if not data or data[0] == _FST_ZWRAPPER:
+        raise ValueError(f"{path} is not a plain FST file")
+    end = variables = 0
+    value_changes = False
+    blackout = None
+    i = 0
+    while i + 9 <= len(data):
+        kind, length = data[i], struct.unpack(">Q", data[i + 1:i + 9])[0]
+        block = data[i + 9:i + 1 + length]
+        if kind == _FST_HDR:
+            end = struct.unpack(">Q", block[8:16])[0]
+            variables = struct.unpack(">Q", block[40:48])[0]
+        elif kind in _FST_VCDATA:
+            block_start, block_end = struct.unpack(">QQ", block[:16])
+            value_changes = value_changes or block_end > block_start
+        elif kind == _FST_BLACKOUT:
+            blackout = block
+        i += 1 + length
+    if not variables or not value_changes:
+        return False
+    return blackout is None or _dumped_time(blackout, end) > 0